@@ -2,191 +2,2685 @@ import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
-from matplotlib.patches import Rectangle, Patch
-from pykml import parser
+from matplotlib.patches import Patch, Polygon as MplPolygon
+from matplotlib.collections import PolyCollection
+from lxml import etree
+import numpy as np
 import math
+import time
+import io
+import os
+import json
+import hashlib
+import bisect
+import queue
+import zipfile
+import tempfile
+import argparse
+import copyreg
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import NamedTuple
+from collections import OrderedDict
+from types import MappingProxyType
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.util import Finalize
 
-# --- Clase KMLProcessor ---
-class KMLProcessor:
-    def __init__(self):
-        self.bounding_box = None
-        self.original_bounding_box = None
-        self.inner_area = None
-        self.outer_base_units = []
-        self.inner_base_units = []
-        self.corridor_units = []
-        self.stair_units = []
-        self.central_area = None
-        self.offset_value = 0
-        self.base_width_value = 0
-        self.base_length_value = 0
-        self.corridor_width_value = 0
-        self.epsilon = 1e-9
+# --- Lectura KML ---
+PARSER_VERSION = 1  # Subir al cambiar lo que se extrae del KML: invalida la caché de parcelas
+KML_NAMESPACES = ('http://www.opengis.net/kml/2.2', 'http://earth.google.com/kml/2.2')
+
+def kml_namespace(root):
+    # El espacio de nombres se toma de la etiqueta raíz: '{ns}kml' -> 'ns', '' si no declara ninguno
+    return root.tag[1:root.tag.index('}')] if root.tag.startswith('{') else ''
+
+def kml_tag(ns, name): return f'{{{ns}}}{name}' if ns else name
 
-    def load_kml(self, file_path):
+def parse_kml_document(source):
+    # Una sola lectura del documento; huge_tree para exportaciones catastrales grandes
+    root = etree.parse(source, etree.XMLParser(huge_tree=True, remove_comments=True)).getroot()
+    return root, kml_namespace(root)
+
+@contextmanager
+def open_kml_source(file_path):
+    # Un KMZ es un zip: se abre su doc.kml (o el primer .kml) como flujo, descomprimiendo por bloques a medida
+    # que el parser lee, sin pasar por archivos temporales
+    if not zipfile.is_zipfile(file_path):
+        with open(file_path, 'rb') as f: yield f
+        return
+    with zipfile.ZipFile(file_path) as archive:
+        names = [n for n in archive.namelist() if n.lower().endswith('.kml')]
+        if not names: raise ValueError("El KMZ no contiene ningún documento .kml")
+        with archive.open('doc.kml' if 'doc.kml' in names else names[0]) as f: yield f
+
+def find_ring_coordinates(polygon, ns):
+    coordinates = polygon.find('/'.join(kml_tag(ns, t) for t in ('outerBoundaryIs', 'LinearRing', 'coordinates')))
+    if coordinates is None or not coordinates.text: coordinates = polygon.find('.//' + kml_tag(ns, 'coordinates'))
+    return coordinates
+
+def find_first_polygon(root, ns):
+    # Si el documento mezcla espacios de nombres se recurre al comodín de lxml
+    for tag in (kml_tag(ns, 'Polygon'), '{*}Polygon'):
+        for polygon in root.iter(tag): return polygon, find_ring_coordinates(polygon, kml_namespace(polygon))
+    return None, None
+
+def parse_coordinates_py(text):
+    coords = []
+    for pair in text.strip().split():
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                try:
-                    doc = parser.parse(f).getroot().find('.//{http://www.opengis.net/kml/2.2}Document')
-                    if doc is None: f.seek(0); doc = parser.parse(f).getroot().find('.//{http://earth.google.com/kml/2.2}Document')
-                    if doc is None: f.seek(0); doc = parser.parse(f).getroot()
-                except Exception as parse_err: return False, f"Error KML Parse: {str(parse_err)}"
-                polygon = None
-                for p in doc.iterfind('.//{http://www.opengis.net/kml/2.2}Polygon'): polygon = p; break
-                if polygon is None:
-                    for p in doc.iterfind('.//{http://earth.google.com/kml/2.2}Polygon'): polygon = p; break
-                if polygon is None: return False, "No se encontró polígono"
-                coordinates = None; coord_paths = [ './/{http://www.opengis.net/kml/2.2}outerBoundaryIs/{http://www.opengis.net/kml/2.2}LinearRing/{http://www.opengis.net/kml/2.2}coordinates', './/{http://www.opengis.net/kml/2.2}coordinates', './/{http://earth.google.com/kml/2.2}outerBoundaryIs/{http://earth.google.com/kml/2.2}LinearRing/{http://earth.google.com/kml/2.2}coordinates', './/{http://earth.google.com/kml/2.2}coordinates']
-                for path in coord_paths:
-                    coordinates = polygon.find(path)
-                    if coordinates is not None and coordinates.text: break
-                if coordinates is None or not coordinates.text: return False, "No se encontraron coordenadas"
-                coords_text = coordinates.text.strip(); coords_pairs = coords_text.split(); coords = []
-                for pair in coords_pairs:
-                    try:
-                        parts = pair.split(',')
-                        if len(parts) >= 2: coords.append((float(parts[0]), float(parts[1])))
-                    except ValueError: pass
-                if not coords or len(coords) < 3: return False, "Coords insuficientes."
-                x_coords, y_coords = [c[0] for c in coords], [c[1] for c in coords]
-                self.bounding_box = {'min_x': min(x_coords), 'max_x': max(x_coords), 'min_y': min(y_coords), 'max_y': max(y_coords), 'width': max(x_coords) - min(x_coords), 'height': max(y_coords) - min(y_coords)}
-                self.original_bounding_box = self.bounding_box.copy()
-                self.inner_area = None; self.outer_base_units = []; self.inner_base_units = []; self.corridor_units = []; self.stair_units = []; self.central_area = None
-                return True, "KML cargado"
-        except FileNotFoundError: return False, f"Error: Archivo no encontrado '{file_path}'"
-        except Exception as e: return False, f"Error inesperado KML: {str(e)}"
+            parts = pair.split(',')
+            if len(parts) >= 2: coords.append((float(parts[0]), float(parts[1])))
+        except ValueError: pass
+    return coords
 
-    def calculate_inner_area(self, offset):
-        if not self.bounding_box: return False, "Cargue KML"
-        if offset < 0: return False, "Offset >= 0"
-        self.offset_value = offset
-        inner_width = self.bounding_box['width'] - 2 * offset; inner_height = self.bounding_box['height'] - 2 * offset
-        if inner_width <= 0 or inner_height <= 0: self.inner_area = None; return False, "Offset grande, área interna inválida."
-        self.inner_area = {'min_x': self.bounding_box['min_x'] + offset, 'max_x': self.bounding_box['max_x'] - offset, 'min_y': self.bounding_box['min_y'] + offset, 'max_y': self.bounding_box['max_y'] - offset, 'width': inner_width, 'height': inner_height}
-        return True, "Área interna calculada"
-
-    def calculate_units(self, base_width, base_length, corridor_width, stair_size, layout_type="cuadrada"):
-        if not self.inner_area: return False, "Calcule área interna"
-        if not all(d > 0 for d in [base_width, base_length, corridor_width]) or stair_size < 0:
-            return False, "Dimensiones deben ser > 0 (stair_size >= 0)."
-        self.base_width_value, self.base_length_value, self.corridor_width_value = base_width, base_length, corridor_width
-        self.outer_base_units, self.inner_base_units, self.corridor_units, self.stair_units, self.central_area = [], [], [], [], None
+def _load_pairs(tuples): return np.loadtxt(tuples, delimiter=',', usecols=(0, 1), ndmin=2, dtype=np.float64, comments=None)  # '#' no es comentario en KML
+
+def _parse_valid_tuples(tuples, small=64):
+    # Tramo con alguna tupla mal formada: se parte en dos y cada mitad vuelve a intentarse en bloque, así que solo se
+    # recorre en Python (parse_coordinates_py) lo que queda alrededor de las tuplas malas, en tramos de `small`
+    if len(tuples) <= small: return np.asarray(parse_coordinates_py(' '.join(tuples)), dtype=np.float64).reshape(-1, 2)
+    half = len(tuples) // 2; parts = []
+    for part in (tuples[:half], tuples[half:]):
+        try: parts.append(_load_pairs(part))
+        except ValueError: parts.append(_parse_valid_tuples(part, small))
+    return np.concatenate(parts)
+
+def parse_coordinates(text):
+    # Conversión en bloque a un arreglo float64 (N, 2) con los dos primeros campos de cada tupla: la altitud es
+    # opcional tupla a tupla ("0,0,0 10,0" vale). Si alguna tupla está mal formada se descarta, y el resto se sigue
+    # convirtiendo en bloque (ver _parse_valid_tuples)
+    tuples = text.split()
+    if not tuples: return np.empty((0, 2))
+    try: return _load_pairs(tuples)
+    except ValueError: return _parse_valid_tuples(tuples)
+
+def bounding_box_of(coords):
+    if isinstance(coords, np.ndarray):
+        (min_x, min_y), (max_x, max_y) = coords[:, :2].min(axis=0), coords[:, :2].max(axis=0)
+        return {'min_x': float(min_x), 'max_x': float(max_x), 'min_y': float(min_y), 'max_y': float(max_y), 'width': float(max_x - min_x), 'height': float(max_y - min_y)}
+    x_coords, y_coords = [c[0] for c in coords], [c[1] for c in coords]
+    return {'min_x': min(x_coords), 'max_x': max(x_coords), 'min_y': min(y_coords), 'max_y': max(y_coords), 'width': max(x_coords) - min(x_coords), 'height': max(y_coords) - min(y_coords)}
+
+def parcels_from_placemark(placemark, index):
+    # Un Placemark puede traer varios polígonos (MultiGeometry): cada uno es una parcela con su propio id
+    base_id, name = placemark.get('id') or f"P{index}", placemark.findtext('{*}name')
+    polygons = list(placemark.iter('{*}Polygon'))
+    for part, polygon in enumerate(polygons):
+        coordinates = find_ring_coordinates(polygon, kml_namespace(polygon))
+        if coordinates is None or not coordinates.text: continue
+        coords = parse_coordinates(coordinates.text)
+        if len(coords) < 3: continue
+        yield {'id': base_id if len(polygons) == 1 else f"{base_id}#{part}", 'name': name, 'part': part, 'coords': coords, 'bounding_box': bounding_box_of(coords)}
+
+def iter_kml_parcels(source):
+    # Lectura por eventos: cada Placemark se entrega al cerrarse y luego se libera junto con sus hermanos ya leídos,
+    # así la memoria no crece con el tamaño del archivo y la primera parcela está disponible sin leerlo entero
+    context = etree.iterparse(source, events=('end',), tag='{*}Placemark', huge_tree=True, remove_comments=True)
+    try:
+        for index, (_, placemark) in enumerate(context):
+            parcels = list(parcels_from_placemark(placemark, index))
+            placemark.clear(keep_tail=False)
+            while placemark.getprevious() is not None: del placemark.getparent()[0]
+            yield from parcels
+    finally: del context
+
+# --- Catálogo de parcelas ---
+class ParcelCatalog:
+    def __init__(self, parcels=()):
+        self._parcels = {}; self._bbox_array = None
+        for parcel in parcels: self.add(parcel)
+
+    @classmethod
+    def from_kml(cls, source): return cls(iter_kml_parcels(source))
+
+    def add(self, parcel):
+        parcel_id, n = parcel['id'], 1
+        while parcel_id in self._parcels: parcel_id = f"{parcel['id']}~{n}"; n += 1
+        if parcel_id != parcel['id']: parcel = dict(parcel, id=parcel_id)
+        self._parcels[parcel_id] = parcel; self._bbox_array = None
+        return parcel_id
+
+    def __getitem__(self, parcel_id): return self._parcels[parcel_id]
+    def __contains__(self, parcel_id): return parcel_id in self._parcels
+    def __len__(self): return len(self._parcels)
+    def __iter__(self): return iter(self._parcels.values())
+    def ids(self): return list(self._parcels)
+
+    def project(self, method='utm'):
+        project_parcels(self._parcels.values(), method); self._bbox_array = None
+        return self
+
+    def batches(self, size):
+        batch = []
+        for parcel in self._parcels.values():
+            batch.append(parcel)
+            if len(batch) == size: yield batch; batch = []
+        if batch: yield batch
+
+    def bounding_boxes(self):
+        # (N, 4) con [min_x, min_y, max_x, max_y] en el orden de ids(); se recalcula solo si cambia el catálogo
+        if self._bbox_array is None:
+            self._bbox_array = np.array([[bb['min_x'], bb['min_y'], bb['max_x'], bb['max_y']] for bb in (p['bounding_box'] for p in self._parcels.values())], dtype=np.float64).reshape(-1, 4)
+        return self._bbox_array
+
+def _synthetic_kml(num_vertices, ns=KML_NAMESPACES[0]):
+    ring = ' '.join(f'{500 * math.cos(2 * math.pi * i / num_vertices):.6f},{250 * math.sin(2 * math.pi * i / num_vertices):.6f},0' for i in range(num_vertices))
+    return (f'<?xml version="1.0" encoding="UTF-8"?><kml xmlns="{ns}"><Document><Placemark><name>Bench</name><Polygon><outerBoundaryIs>'
+            f'<LinearRing><coordinates>{ring}</coordinates></LinearRing></outerBoundaryIs></Polygon></Placemark></Document></kml>').encode('utf-8')
+
+def benchmark_kml_parse(sizes=(1_000, 10_000, 100_000, 500_000), repeats=3):
+    # Tiempo de lectura (parseo + búsqueda de polígono y coordenadas) frente al tamaño del archivo
+    rows = []
+    for n in sizes:
+        data = _synthetic_kml(n); best = float('inf')
+        for _ in range(repeats):
+            t0 = time.perf_counter(); root, ns = parse_kml_document(io.BytesIO(data)); find_first_polygon(root, ns); best = min(best, time.perf_counter() - t0)
+        rows.append({'vertices': n, 'bytes': len(data), 'seconds': best, 'mb_per_s': len(data) / 1e6 / best if best > 0 else float('inf')})
+    return rows
+
+# --- Caché de parcelas en disco ---
+_STATS_LOCK = threading.Lock()  # contadores de ParseCache entre hilos del mismo proceso (la caché se pasa a procesos)
+_PENDING_STATS = {'pid': None, 'counts': {}}  # aciertos y fallos de este proceso aún sin escribir, por directorio
+
+def flush_parse_cache_stats(cache_dir=None):
+    # Escribe los contadores pendientes de este proceso (de un directorio o de todos). Solo los del pid que los contó:
+    # un hijo de fork hereda el diccionario del padre, pero no sus aciertos
+    with _STATS_LOCK:
+        if _PENDING_STATS['pid'] != os.getpid(): return
+        counts = _PENDING_STATS['counts']
+        pending = {d: counts.pop(d) for d in ([cache_dir] if cache_dir is not None else list(counts)) if d in counts}
+    for directory, values in pending.items():
+        try: _write_stats(directory, values)
+        except OSError: pass  # como al guardar entradas: la estadística no hace fallar nada
+
+def _write_stats(cache_dir, counts):
+    # Solo este proceso escribe su archivo; se reemplaza de forma atómica para que un lector nunca lo vea a medias
+    path = os.path.join(cache_dir, f'stats-{os.getpid()}.json')
+    with _STATS_LOCK:
+        stats = ParseCache._read_stats(path)
+        for field, value in counts.items(): stats[field] = stats.get(field, 0) + value
+        with open(path + '.tmp', 'w') as f: json.dump(stats, f)
+        os.replace(path + '.tmp', path)
+
+def _process_alive(pid):
+    # Si el proceso `pid` sigue en marcha. La señal 0 solo comprueba que existe; en Windows os.kill lo terminaría,
+    # así que se pregunta su código de salida
+    if pid == os.getpid(): return True
+    if os.name == 'nt':
+        import ctypes
+        kernel32 = ctypes.windll.kernel32; handle = kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle: return False
+        code = ctypes.c_ulong()
+        try: return bool(kernel32.GetExitCodeProcess(handle, ctypes.byref(code))) and code.value == 259  # STILL_ACTIVE
+        finally: kernel32.CloseHandle(handle)
+    try: os.kill(pid, 0)
+    except ProcessLookupError: return False
+    except PermissionError: return True
+    return True
+
+class ParseCache:
+    # Entradas .npz indexadas por hash del contenido + versión del parser; LRU por fecha de modificación,
+    # que se renueva en cada acierto. Los aciertos y fallos se cuentan en memoria (get no escribe nada más que la
+    # fecha de la entrada) y se vuelcan a un stats-<pid>.json por proceso con flush()/close(), al consultar stats() o
+    # al terminar el proceso, también en los procesos de ingest_folder, que comparten el directorio. stats() los suma
+    # para poder consultarlos después; los de procesos que ya terminaron se pasan al del proceso que consulta o
+    # desaloja, así no quedan más archivos que procesos vivos.
+    # Escribir en la caché nunca hace fallar una carga: si no se puede, la entrada simplemente no queda guardada
+    def __init__(self, cache_dir=None, max_bytes=256 * 2**20):
+        self.cache_dir = cache_dir or os.environ.get('VIVIENDAS_CACHE_DIR') or os.path.join(os.path.expanduser('~'), '.cache', 'viviendas_kml')
+        self.max_bytes = max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def key(self, file_path):
+        digest = hashlib.blake2b(digest_size=20)
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''): digest.update(chunk)
+        return f"{digest.hexdigest()}-v{PARSER_VERSION}"
+
+    def _path(self, key): return os.path.join(self.cache_dir, key + '.npz')
+
+    def _stats_files(self): return [name for name in os.listdir(self.cache_dir) if name.startswith('stats') and name.endswith('.json')]
+
+    def _count(self, field):
+        with _STATS_LOCK:
+            if _PENDING_STATS['pid'] != os.getpid():
+                # Primer conteo del proceso: se vuelca al salir (Finalize corre también en los hijos de multiprocessing,
+                # que terminan sin pasar por atexit)
+                _PENDING_STATS.update(pid=os.getpid(), counts={}); Finalize(None, flush_parse_cache_stats, exitpriority=0)
+            counts = _PENDING_STATS['counts'].setdefault(self.cache_dir, {})
+            counts[field] = counts.get(field, 0) + 1
+
+    def flush(self): flush_parse_cache_stats(self.cache_dir)
+
+    def close(self): self.flush()
+
+    def _add(self, counts): _write_stats(self.cache_dir, counts)
+
+    @staticmethod
+    def _read_stats(path):
+        try:
+            with open(path) as f: return {'hits': 0, 'misses': 0, **json.load(f)}
+        except (FileNotFoundError, ValueError): return {'hits': 0, 'misses': 0}
+
+    def _fold_finished(self):
+        # Los contadores de procesos que ya terminaron se suman a los de este. Cada archivo se reclama primero
+        # renombrándolo (solo un proceso lo consigue) y nadie más lo escribe, porque su dueño ya no existe
+        for name in self._stats_files():
+            try: pid = int(name[len('stats-'):-len('.json')])
+            except ValueError: continue
+            if _process_alive(pid): continue
+            path = os.path.join(self.cache_dir, name); claimed = f"{path}.{os.getpid()}.claim"
+            try: os.replace(path, claimed)
+            except FileNotFoundError: continue
+            self._add(self._read_stats(claimed)); os.remove(claimed)
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                coords, offsets, bboxes = data['coords'], data['offsets'], data['bboxes']
+                ids, names, parts = data['ids'].tolist(), data['names'].tolist(), data['parts'].tolist()
+        except (FileNotFoundError, OSError, KeyError, ValueError): self._count('misses'); return None
+        # Otro proceso puede haberla desalojado después de leerla: los datos ya están en memoria y sigue siendo acierto
+        try: os.utime(path)
+        except FileNotFoundError: pass
+        self._count('hits')
+        catalog = ParcelCatalog()
+        for i, parcel_id in enumerate(ids):
+            min_x, min_y, max_x, max_y = map(float, bboxes[i])
+            catalog.add({'id': parcel_id, 'name': names[i] or None, 'part': parts[i], 'coords': coords[offsets[i]:offsets[i + 1]],
+                         'bounding_box': {'min_x': min_x, 'max_x': max_x, 'min_y': min_y, 'max_y': max_y, 'width': max_x - min_x, 'height': max_y - min_y}})
+        return catalog
+
+    def put(self, key, catalog):
+        # Cada escritor usa su propio temporal (varios procesos pueden guardar a la vez el mismo contenido) y la entrada
+        # aparece de golpe con os.replace. Devuelve False si no se pudo guardar
+        parcels = list(catalog)
+        offsets = np.cumsum([0] + [len(p['coords']) for p in parcels])
+        coords = np.concatenate([p['coords'] for p in parcels]) if parcels else np.empty((0, 2))
+        if coords.nbytes > self.max_bytes: return False  # No cabe: guardarla solo desalojaría entradas útiles
+        tmp_path = None
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, prefix=key + '.', suffix='.tmp.npz')
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, coords=coords, offsets=offsets, bboxes=catalog.bounding_boxes(), ids=np.array([p['id'] for p in parcels], dtype=str),
+                         names=np.array([p['name'] or '' for p in parcels], dtype=str), parts=np.array([p.get('part', 0) for p in parcels], dtype=np.int32))
+            os.replace(tmp_path, self._path(key))
+        except OSError:
+            if tmp_path is not None and os.path.exists(tmp_path): os.remove(tmp_path)
+            return False
+        self.evict()
+        return True
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.npz') and not name.endswith('.tmp.npz'):
+                try: st = os.stat(os.path.join(self.cache_dir, name))
+                except FileNotFoundError: continue  # desalojada por otro proceso mientras se listaba
+                entries.append((st.st_mtime, st.st_size, name))
+        return sorted(entries)
+
+    def evict(self):
+        entries = self._entries(); total = sum(size for _, size, _ in entries)
+        for _, size, name in entries:
+            if total <= self.max_bytes: break
+            try: os.remove(os.path.join(self.cache_dir, name))
+            except FileNotFoundError: pass
+            total -= size
+        self._fold_finished()
+
+    def clear(self):
+        with _STATS_LOCK:
+            if _PENDING_STATS['pid'] == os.getpid(): _PENDING_STATS['counts'].pop(self.cache_dir, None)
+        for _, _, name in self._entries(): os.remove(os.path.join(self.cache_dir, name))
+        # También los temporales y reclamos que dejó un proceso interrumpido
+        for name in self._stats_files() + [name for name in os.listdir(self.cache_dir) if name.endswith(('.tmp', '.tmp.npz', '.claim'))]:
+            try: os.remove(os.path.join(self.cache_dir, name))
+            except FileNotFoundError: pass
+
+    def stats(self):
+        self.flush(); self._fold_finished()
+        stats, entries = {'hits': 0, 'misses': 0}, self._entries()
+        for name in self._stats_files():
+            for field, value in self._read_stats(os.path.join(self.cache_dir, name)).items(): stats[field] = stats.get(field, 0) + value
+        lookups = stats['hits'] + stats['misses']
+        return {**stats, 'hit_rate': stats['hits'] / lookups if lookups else 0.0, 'entries': len(entries), 'bytes': sum(size for _, size, _ in entries), 'max_bytes': self.max_bytes}
+
+def load_parcel_catalog(file_path, cache=None):
+    # Con caché, una carga repetida del mismo contenido no toca el XML
+    key = cache.key(file_path) if cache is not None else None
+    if key is not None and (catalog := cache.get(key)) is not None: return catalog
+    with open_kml_source(file_path) as f: catalog = ParcelCatalog.from_kml(f)
+    if key is not None and len(catalog): cache.put(key, catalog)
+    return catalog
+
+# --- Proyección métrica ---
+WGS84_A, WGS84_F, UTM_K0 = 6378137.0, 1 / 298.257223563, 0.9996
+
+def is_geographic(coords):
+    # lon/lat: dentro de rango y con extensión menor a 1° (un lote no mide ~100 km, y uno en metros supera 1 unidad)
+    if len(coords) == 0: return False
+    lo, hi = coords.min(axis=0), coords.max(axis=0)
+    return bool(lo[0] >= -180 and hi[0] <= 180 and lo[1] >= -90 and hi[1] <= 90 and (hi - lo).max() < 1.0)
+
+def utm_zone(lon, lat): return int((lon + 180) // 6) % 60 + 1, lat < 0
+
+@lru_cache(maxsize=None)
+def _utm_zone_constants(zone, south):
+    # Serie de Krüger (orden n^3): precisión milimétrica dentro de la zona. Se calcula una vez por zona
+    n = WGS84_F / (2 - WGS84_F)
+    big_a = WGS84_A / (1 + n) * (1 + n**2 / 4 + n**4 / 64)
+    alpha = np.array([n / 2 - 2 * n**2 / 3 + 5 * n**3 / 16, 13 * n**2 / 48 - 3 * n**3 / 5, 61 * n**3 / 240])
+    return {'lon0': math.radians(zone * 6 - 183), 'k0_a': UTM_K0 * big_a, 'alpha': alpha, 'c': 2 * math.sqrt(n) / (1 + n),
+            'false_northing': 10_000_000.0 if south else 0.0, 'epsg': (32700 if south else 32600) + zone}
+
+def project_utm(lonlat, zone, south):
+    k = _utm_zone_constants(zone, south)
+    lon, lat = np.radians(lonlat[:, 0]) - k['lon0'], np.radians(lonlat[:, 1])
+    sin_lat = np.sin(lat)
+    t = np.sinh(np.arctanh(sin_lat) - k['c'] * np.arctanh(k['c'] * sin_lat))
+    xi, eta = np.arctan2(t, np.cos(lon)), np.arctanh(np.sin(lon) / np.sqrt(1 + t * t))
+    j2 = 2 * np.arange(1, 4)[:, None]
+    easting = 500_000.0 + k['k0_a'] * (eta + (k['alpha'][:, None] * np.cos(j2 * xi) * np.sinh(j2 * eta)).sum(axis=0))
+    northing = k['false_northing'] + k['k0_a'] * (xi + (k['alpha'][:, None] * np.sin(j2 * xi) * np.cosh(j2 * eta)).sum(axis=0))
+    return np.column_stack((easting, northing))
+
+@lru_cache(maxsize=4096)
+def _equirectangular_scale(lat0):
+    # Metros por grado con los radios de curvatura del elipsoide en la latitud de origen
+    e2 = WGS84_F * (2 - WGS84_F); w = 1 - e2 * math.sin(math.radians(lat0)) ** 2
+    return WGS84_A / math.sqrt(w) * math.cos(math.radians(lat0)) * math.pi / 180, WGS84_A * (1 - e2) / w**1.5 * math.pi / 180
+
+def project_equirectangular(lonlat, lon0, lat0):
+    # Plano local tangente: basta para lotes de unos pocos km alrededor del origen
+    sx, sy = _equirectangular_scale(round(lat0, 4))
+    return np.column_stack(((lonlat[:, 0] - lon0) * sx, (lonlat[:, 1] - lat0) * sy))
+
+LOCAL_CELL_DEGREES = 0.01  # celda (~1 km) que comparte origen con 'local': a < 1 km del origen, error de escala < 1e-4
+
+def project_parcels(parcels, method='utm'):
+    # Pasa a metros las parcelas en lon/lat, agrupadas para proyectar cada grupo con una sola llamada vectorizada:
+    # con 'utm', por zona; con 'local', por celda de LOCAL_CELL_DEGREES del centro de la parcela, con origen en el
+    # centro de la celda (un catálogo con varios municipios no se proyecta alrededor de un origen lejano, y una
+    # parcela da las mismas coordenadas sola o en su catálogo). Las coordenadas originales quedan en
+    # parcel['lonlat'] para poder exportar de vuelta a KML.
+    groups = {}
+    for parcel in parcels:
+        if 'lonlat' in parcel or not is_geographic(parcel['coords']): continue
+        bb = parcel['bounding_box']; center = ((bb['min_x'] + bb['max_x']) / 2, (bb['min_y'] + bb['max_y']) / 2)
+        groups.setdefault(utm_zone(*center) if method == 'utm' else tuple(round(c / LOCAL_CELL_DEGREES) for c in center), []).append(parcel)
+    for key, members in groups.items():
+        lonlat = np.concatenate([p['coords'] for p in members]); offsets = np.cumsum([0] + [len(p['coords']) for p in members])
+        if method == 'utm': xy, crs = project_utm(lonlat, *key), f"EPSG:{_utm_zone_constants(*key)['epsg']}"
+        else:
+            lon0, lat0 = (c * LOCAL_CELL_DEGREES for c in key)
+            xy, crs = project_equirectangular(lonlat, lon0, lat0), f"LOCAL:{lat0:.6f},{lon0:.6f}"
+        for i, parcel in enumerate(members):
+            parcel['lonlat'], parcel['coords'] = parcel['coords'], xy[offsets[i]:offsets[i + 1]]
+            parcel['bounding_box'], parcel['crs'] = bounding_box_of(parcel['coords']), crs
+            for derived in ('diagnostics', 'repaired', 'simplified'): parcel.pop(derived, None)  # eran de las coordenadas en lon/lat
+    return parcels
+
+# --- Geometría de polígonos ---
+def clean_ring(coords, tol=1e-9):
+    # Quita el punto de cierre, vértices repetidos y colineales; devuelve el anillo en sentido antihorario
+    ring = np.asarray(coords, dtype=np.float64)[:, :2]
+    if len(ring) > 1 and np.allclose(ring[0], ring[-1], atol=tol): ring = ring[:-1]
+    ring = ring[np.any(np.abs(ring - np.roll(ring, 1, axis=0)) > tol, axis=1)] if len(ring) > 1 else ring
+    while len(ring) >= 3:
+        prev_edge, next_edge = ring - np.roll(ring, 1, axis=0), np.roll(ring, -1, axis=0) - ring
+        scale = np.hypot(*prev_edge.T) * np.hypot(*next_edge.T)
+        keep = np.abs(prev_edge[:, 0] * next_edge[:, 1] - prev_edge[:, 1] * next_edge[:, 0]) > tol * np.maximum(scale, tol)
+        if keep.all(): break
+        # Quitar un pico deja sus dos vecinos repetidos: se deduplican antes de la siguiente pasada
+        ring = ring[keep]; ring = ring[np.any(np.abs(ring - np.roll(ring, 1, axis=0)) > tol, axis=1)]
+    if len(ring) >= 3 and signed_area(ring) < 0: ring = ring[::-1].copy()
+    return ring
+
+def signed_area(ring):
+    x, y = ring[:, 0], ring[:, 1]
+    return 0.5 * float(np.dot(x, np.roll(y, -1)) - np.dot(np.roll(x, -1), y))
+
+def _box_pairs(boxes, others=None, chunk=1 << 20):
+    # Pares (i, j) de cajas [xmin, ymin, xmax, ymax] que se solapan; sin `others`, los pares i < j de `boxes` entre sí.
+    # Las cajas se reparten en franjas horizontales (del alto medio de una caja) y en cada franja se barre por x
+    # (sweep-and-prune): cada caja se compara con las que empiezan dentro de su intervalo x, en tandas de como mucho
+    # ~chunk candidatos, así ni la memoria ni el tiempo crecen con los solapes en x de cajas lejanas en y (lados largos
+    # de un lote denso). Cada par sale solo en la franja donde empieza su solape en y. Generador de tandas (i, j)
+    single = others is None; others = boxes if single else others
+    both = boxes if single else np.concatenate((boxes, others))
+    if not len(boxes) or not len(others): return
+    x0, y0 = both[:, 0].min(), both[:, 1].min()
+    extent = max(float(both[:, 3].max() - y0), 1e-300)
+    # Con el alto medio cada caja cae en pocas franjas: en total no más del doble de cajas
+    height = max(float(np.mean(both[:, 3] - both[:, 1])), extent / 4096)
+    width = 2.0 * float(both[:, 2].max() - x0) + 1.0
+    band_of = lambda y: np.minimum(np.floor((y - y0) / height), 4096).astype(np.int64)
+    def banded(box):
+        low = band_of(box[:, 1]); count = band_of(box[:, 3]) - low + 1
+        index = np.repeat(np.arange(len(box)), count)
+        band = np.repeat(low, count) + np.arange(int(count.sum())) - np.repeat(np.cumsum(count) - count, count)
+        return index, band, box[index, 0] - x0 + band * width, box[index, 2] - x0 + band * width
+    row_sets = [banded(boxes)] if single else [banded(boxes), banded(others)]
+    passes = [(0, 0, False)] if single else [(0, 1, False), (1, 0, True)]
+    for r, c, swap in passes:
+        (rows, band, row_lo, row_hi), (cols, _, col_lo, _) = row_sets[r], row_sets[c]
+        rows_box, cols_box = (boxes, others) if r == 0 else (others, boxes)
+        order = np.argsort(col_lo, kind='stable'); xmin = col_lo[order]
+        if single: low = np.empty(len(order), np.intp); low[order] = np.arange(1, len(order) + 1)
+        # En la pasada inversa solo las que empiezan estrictamente después: los empates ya salieron en la primera
+        else: low = np.searchsorted(xmin, row_lo, side='right' if swap else 'left')
+        counts = np.maximum(np.searchsorted(xmin, row_hi, side='right') - low, 0); total = np.cumsum(counts)
+        begin = 0
+        while begin < len(counts):
+            end = max(int(np.searchsorted(total, total[begin] - counts[begin] + chunk, side='right')), begin + 1)
+            k = counts[begin:end]
+            slot = np.repeat(np.arange(begin, end), k)
+            other = order[np.arange(int(k.sum())) - np.repeat(np.cumsum(k) - k, k) + np.repeat(low[begin:end], k)]
+            i, j = rows[slot], cols[other]
+            keep = (rows_box[i, 1] <= cols_box[j, 3]) & (cols_box[j, 1] <= rows_box[i, 3])
+            keep &= band_of(np.maximum(rows_box[i, 1], cols_box[j, 1])) == band[slot]
+            yield (j[keep], i[keep]) if swap else (i[keep], j[keep])
+            begin = end
+
+def _segment_boxes(starts, ends): return np.column_stack((np.minimum(starts, ends), np.maximum(starts, ends)))
+
+def _sweep_candidates(starts, ends, closed=True):
+    # Pares i < j de segmentos no consecutivos cuyas cajas se solapan (ver _box_pairs); O(n log n + candidatos)
+    n = len(starts)
+    if n < 2: return np.empty(0, int), np.empty(0, int)
+    found = [(np.minimum(a, b), np.maximum(a, b)) for a, b in _box_pairs(_segment_boxes(starts, ends))]
+    i, j = np.concatenate([a for a, _ in found]), np.concatenate([b for _, b in found])
+    keep = (j - i != 1) & ~(closed & (i == 0) & (j == n - 1))
+    return i[keep], j[keep]
+
+def segment_intersections(starts, ends, closed=True, tol=1e-12):
+    # Cruces propios (interiores a ambos segmentos) entre segmentos no consecutivos: (i, j, t_i, t_j) con i < j
+    i, j = _sweep_candidates(starts, ends, closed)
+    r, w, qp = ends[i] - starts[i], ends[j] - starts[j], starts[j] - starts[i]
+    denom = r[:, 0] * w[:, 1] - r[:, 1] * w[:, 0]
+    ok = np.abs(denom) > tol * np.maximum(np.hypot(*r.T) * np.hypot(*w.T), tol)
+    safe = np.where(ok, denom, 1.0)
+    t_i, t_j = (qp[:, 0] * w[:, 1] - qp[:, 1] * w[:, 0]) / safe, (qp[:, 0] * r[:, 1] - qp[:, 1] * r[:, 0]) / safe
+    hit = ok & (t_i > tol) & (t_i < 1 - tol) & (t_j > tol) & (t_j < 1 - tol)
+    return i[hit], j[hit], t_i[hit], t_j[hit]
+
+def _uncross(ring):
+    # Deshace cada cruce del anillo (al llegar a un cruce se sigue por la otra rama). Devuelve los puntos (vértices y
+    # cruces), los dos segmentos del anillo que definen cada punto y los lazos como listas de índices a esos puntos
+    n = len(ring); starts, ends = ring, np.roll(ring, -1, axis=0)
+    i, j, t_i, t_j = segment_intersections(starts, ends)
+    k = len(i)
+    cross_points = starts[i] + t_i[:, None] * (ends[i] - starts[i])
+    seg = np.concatenate([np.arange(n), i, j]); param = np.concatenate([np.zeros(n), t_i, t_j])
+    order = np.lexsort((param, seg))
+    points = np.concatenate([ring, cross_points, cross_points])[order]
+    segments = np.concatenate([np.column_stack(((np.arange(n) - 1) % n, np.arange(n))), np.column_stack((i, j)), np.column_stack((i, j))])[order]
+    position = np.empty(len(order), int); position[order] = np.arange(len(order))
+    m = len(order); nxt = (np.arange(m) + 1) % m
+    pa, pb = position[n:n + k], position[n + k:]
+    nxt[pa], nxt[pb] = (pb + 1) % m, (pa + 1) % m
+    loops, visited, nxt = [], bytearray(m), nxt.tolist()
+    for startpos in range(m):
+        if visited[startpos]: continue
+        loop, p = [], startpos
+        while not visited[p]: visited[p] = 1; loop.append(p); p = nxt[p]
+        if len(loop) >= 3: loops.append(np.array(loop))
+    return points, segments, loops
+
+def winding_number(points, ring, chunk=256):
+    # Número de vueltas de un anillo (no necesariamente simple) alrededor de cada punto: cruces con signo del rayo.
+    # Los puntos se procesan por franjas horizontales y cada franja solo mira los segmentos que la atraviesan
+    x0, y0, x1, y1 = ring[:, 0], ring[:, 1], np.roll(ring[:, 0], -1), np.roll(ring[:, 1], -1)
+    low, high = np.minimum(y0, y1), np.maximum(y0, y1)
+    order = np.argsort(points[:, 1], kind='stable'); result = np.zeros(len(points), dtype=np.int64)
+    for begin in range(0, len(points), chunk):
+        index = order[begin:begin + chunk]; px, py = points[index, 0:1], points[index, 1:2]
+        band = np.flatnonzero((high > py[0, 0]) & (low <= py[-1, 0]))
+        sx0, sy0, sx1, sy1 = x0[band], y0[band], x1[band], y1[band]
+        up, down = (sy0 <= py) & (sy1 > py), (sy0 > py) & (sy1 <= py)
+        side = (sx1 - sx0) * (py - sy0) - (px - sx0) * (sy1 - sy0)
+        result[index] = np.count_nonzero(up & (side > 0), axis=1) - np.count_nonzero(down & (side < 0), axis=1)
+    return result
+
+def point_segment_distances(points, starts, ends):
+    # (P, E) distancias de cada punto a cada segmento
+    d = ends - starts; length2 = np.maximum((d * d).sum(axis=1), 1e-300)
+    rel = points[:, None, :] - starts[None, :, :]
+    t = np.clip((rel * d[None]).sum(axis=2) / length2, 0.0, 1.0)
+    return np.hypot(*(rel - t[..., None] * d[None]).transpose(2, 0, 1))
+
+def _pair_segment_distances(a0, a1, b0, b1):
+    # Distancia entre los segmentos a0a1 y b0b1 de cada par (0 si se cortan)
+    side = lambda o, p, q: (p[:, 0] - o[:, 0]) * (q[:, 1] - o[:, 1]) - (p[:, 1] - o[:, 1]) * (q[:, 0] - o[:, 0])
+    crossing = (side(a0, a1, b0) * side(a0, a1, b1) < 0) & (side(b0, b1, a0) * side(b0, b1, a1) < 0)
+    nearest = np.minimum.reduce([_segment_distances(a0, b0, b1), _segment_distances(a1, b0, b1), _segment_distances(b0, a0, a1), _segment_distances(b1, a0, a1)])
+    return np.where(crossing, 0.0, nearest)
+
+def _near_edges(starts, ends, ring, radius, group=32, block=1 << 20):
+    # Pares (i, e) con el segmento i (un punto si starts is ends) a distancia <= radius de la arista e del anillo. Dos
+    # niveles: primero contra bloques de `group` aristas consecutivas y solo después arista a arista, en tandas de
+    # ~block pares. Cada bloque va dentro de la cápsula de su cuerda (radio: su vértice más alejado de ella), que en
+    # anillos densos y curvos es mucho más ajustada que su caja: la distancia a la cuerda menos ese radio es una cota
+    # inferior de la distancia a las aristas del bloque
+    n = len(ring); ring_ends = np.roll(ring, -1, axis=0); heads = np.arange(0, n, group)
+    low = np.minimum.reduceat(np.minimum(ring, ring_ends), heads); high = np.maximum.reduceat(np.maximum(ring, ring_ends), heads)
+    chord_start, chord_end = ring[heads], ring[np.minimum(heads + group, n) % n]
+    bulge = np.maximum.reduceat(_segment_distances(ring, chord_start[np.arange(n) // group], chord_end[np.arange(n) // group]), heads)
+    boxes = _segment_boxes(starts, ends)
+    distance = lambda i, b0, b1: _segment_distances(starts[i], b0, b1) if starts is ends else _pair_segment_distances(starts[i], ends[i], b0, b1)
+    found = [(np.empty(0, int), np.empty(0, int))]
+    for i, g in _box_pairs(boxes, np.column_stack((low - radius, high + radius)), max(block // group, 1)):
+        near = distance(i, chord_start[g], chord_end[g]) - bulge[g] <= radius
+        i, e = np.repeat(i[near], group), (g[near, None] * group + np.arange(group)).ravel()
+        i, e = i[e < n], e[e < n]
+        close = distance(i, ring[e], ring_ends[e]) <= radius
+        found.append((i[close], e[close]))
+    return np.concatenate([i for i, _ in found]), np.concatenate([e for _, e in found])
+
+def edge_frame(coords):
+    # Preparación de un anillo para retranquearlo muchas veces: anillo limpio, tangentes y normales interiores de sus
+    # aristas. None si no queda un polígono
+    ring = clean_ring(coords)
+    if len(ring) < 3: return None
+    edge = np.roll(ring, -1, axis=0) - ring; length = np.hypot(*edge.T)
+    tangent = edge / length[:, None]; normal = np.column_stack((-tangent[:, 1], tangent[:, 0]))
+    scale = max(float(np.ptp(ring, axis=0).max()), 1.0)
+    return {'ring': ring, 'length': length, 'tangent': tangent, 'normal': normal, 'scale': scale, 'tol': 1e-7 * scale}
+
+def inset_polygon(coords, distances, frame=None):
+    # Retranqueo del polígono (cóncavo o no): cada arista se desplaza hacia dentro su distancia (escalar o una por
+    # arista del anillo limpio). La zona retranqueada es el polígono menos la unión de las zonas convexas que barre cada
+    # arista (ver _inset_zones); su contorno se arma con los tramos de lado de zona que no cubre ninguna otra zona, y
+    # cada tramo solo se compara con las zonas cuya caja toca la suya, así el coste sigue a los vecinos de cada arista
+    # y no a los cruces entre todas las rectas desplazadas. Devuelve los anillos exteriores antihorarios, de mayor a
+    # menor área, que quedan a la distancia pedida del lindero. Con `frame` (edge_frame ya calculado) se omite la
+    # preparación del anillo
+    frame = frame if frame is not None else edge_frame(coords)
+    if frame is None: return []
+    ring, tangent, normal, scale, tol = frame['ring'], frame['tangent'], frame['normal'], frame['scale'], frame['tol']
+    n = len(ring); dist = np.broadcast_to(np.asarray(distances, dtype=np.float64), (n,))
+    if not dist.any(): return [ring]
+    zones, rays, origin = _inset_zones(ring, tangent, normal, dist, frame['length'])
+    # Tramos candidatos: los lados de cada zona recorridos al revés (la zona válida a su izquierda), salvo la base de
+    # cada franja, que es el propio lindero, y las aristas sin retranqueo. Los lados sobre un mismo rayo desde un
+    # vértice (franja y unión, o dos cometas vecinas) quedan a ambos lados del rayo y se tapan hasta el más corto:
+    # esa parte no es contorno y se recorta
+    head, tail = zones, np.roll(zones, -1, axis=1)
+    edge = tail - head; length = np.hypot(edge[..., 0], edge[..., 1])
+    on_ray = rays >= 0; label = rays[on_ray]; size = int(label.max(initial=-1)) + 1
+    shortest = np.full(size, np.inf); np.minimum.at(shortest, label, length[on_ray])
+    cover = np.zeros_like(length); cover[on_ray] = np.where(np.bincount(label, minlength=size)[label] > 1, shortest[label], 0.0)
+    outward = (head == ring[np.where(rays < 2 * n, rays // 2, origin[:, None])]).all(axis=2)
+    z, k = np.nonzero((rays != -2) & (length > cover))
+    unit = edge[z, k] / length[z, k, None]; cut = cover[z, k, None]; bare = np.flatnonzero(dist == 0)
+    starts = np.concatenate((tail[z, k] - np.where(outward[z, k, None], 0.0, cut) * unit, ring[bare]))
+    ends = np.concatenate((head[z, k] + np.where(outward[z, k, None], cut, 0.0) * unit, ring[(bare + 1) % n]))
+    own = np.concatenate((z, np.full(len(bare), -1))); vertex = np.concatenate((origin[z], bare))
+    # Todo lo que está a menos de la menor distancia del lindero queda dentro de alguna zona (o fuera del polígono):
+    # un tramo entero a menos de eso (cota por la distancia de sus extremos a una muestra de vértices) no es contorno
+    if dist.min() > 0:
+        sample = ring[::max(n // 256, 1)]
+        deep = _sample_distances(starts, sample) + _sample_distances(ends, sample) + np.hypot(*(ends - starts).T) < 2 * dist.min()
+        starts, ends, own, vertex = starts[~deep], ends[~deep], own[~deep], vertex[~deep]
+    # Cada tramo pierde lo que queda estrictamente dentro de otra zona. Primero frente a las zonas de los vértices
+    # vecinos en el anillo, que en anillos densos ya cubren casi todos los tramos, y los que sobreviven frente a todas
+    # las zonas cuya caja toca la suya; lo cubierto se va fusionando para que no crezca con los solapes
+    halfplanes = _zone_sides(zones)
+    def spans(c, other):
+        keep = other != own[c]; c, other = _facing_pairs(starts, ends, c[keep], other[keep], halfplanes, tol)
+        sides = tuple(side[other] for side in halfplanes)
+        lo, hi = _inside_spans(starts[c], ends[c], *sides, _shared_sides(starts[c], ends[c], *sides, tol, other < own[c]))
+        return c[lo < hi], lo[lo < hi], hi[lo < hi]
+    joined = lambda parts: _merged_spans(*(np.concatenate(part) for part in zip(*parts)))
+    # Tapado del todo si solo le quedan puntas más cortas que la tolerancia, que se descartarían igual al final
+    span_length, full = np.hypot(*(ends - starts).T), np.zeros(len(starts), bool)
+    def cover(merged):
+        owner, lo, hi = merged; full[owner[(lo * span_length[owner] < 0.5 * tol) & ((1 - hi) * span_length[owner] < 0.5 * tol)]] = True
+    by_vertex = np.argsort(origin, kind='stable'); bounds = np.searchsorted(origin[by_vertex], np.arange(n + 1))
+    covered, alive = [(np.empty(0, int), np.empty(0), np.empty(0))], np.arange(len(starts))
+    for apart in range(9):
+        # De dentro afuera: los tramos que ya tapan los vértices más cercanos no se prueban con los siguientes
+        for offset in {-apart, apart}:
+            near = (vertex[alive] + offset) % n; low, count = bounds[near], bounds[near + 1] - bounds[near]
+            c = np.repeat(alive, count)
+            covered.append(spans(c, by_vertex[np.arange(int(count.sum())) - np.repeat(np.cumsum(count) - count, count) + np.repeat(low, count)]))
+        covered = [joined(covered)]; cover(covered[0])
+        alive = np.flatnonzero(~full)
+    pending = 0
+    zone_boxes = np.column_stack((zones.min(axis=1), zones.max(axis=1)))
+    for c, other in _box_pairs(_segment_boxes(starts[alive], ends[alive]), zone_boxes, 1 << 18):
+        c = alive[c]; keep = ~full[c]
+        covered.append(spans(c[keep], other[keep])); pending += len(covered[-1][0])
+        if pending > 1 << 20:
+            covered = [joined(covered)]; pending = 0; cover(covered[0])
+    owner, t0, t1 = _uncovered(len(starts), *joined(covered))
+    step = ends[owner] - starts[owner]
+    a, b = starts[owner] + t0[:, None] * step, starts[owner] + t1[:, None] * step
+    # Un tramo es contorno si justo a su izquierda no hay zona (ni la de su lado sobre otra que lo toca) y sí polígono
+    # (los más cortos que la tolerancia se descartan: sus vecinos ya se unen dentro del margen de _chain_pieces)
+    piece = b - a; piece_length = np.hypot(*piece.T); long = piece_length > tol
+    a, b, owner, piece, piece_length = a[long], b[long], owner[long], piece[long], piece_length[long]
+    probes = 0.5 * (a + b) + (np.minimum(tol, 0.25 * piece_length) / np.maximum(piece_length, 1e-300))[:, None] * np.column_stack((-piece[:, 1], piece[:, 0]))
+    inside = np.zeros(len(probes), bool)
+    for p, other in _box_pairs(_segment_boxes(probes, probes), zone_boxes, 1 << 18):
+        hit = _inside_zone(probes[p], *(side[other] for side in halfplanes)) & (other != own[owner[p]])
+        inside[p[hit]] = True
+    boundary = ~inside
+    boundary[boundary] = winding_number(probes[boundary], ring) > 0
+    a, b = a[boundary], b[boundary]
+    # Se cierran los lazos; quedan los antihorarios con área (contornos exteriores), y solo si ningún vértice se
+    # acerca al lindero menos que la menor distancia pedida
+    result = []
+    for loop in _chain_pieces(a, b, 4 * tol):
+        area = signed_area(a[loop])
+        if area <= tol * scale: continue
+        loop = clean_ring(a[loop], 1e-9 * scale)
+        if len(loop) >= 3: result.append((area, loop))
+    reach = float(dist.min()) - tol
+    if reach > 0 and result:
+        points = np.concatenate([loop for _, loop in result]); owner = np.repeat(np.arange(len(result)), [len(loop) for _, loop in result])
+        close, _ = _near_edges(points, points, ring, reach)
+        result = [item for index, item in enumerate(result) if index not in set(owner[close].tolist())]
+    return [loop for _, loop in sorted(result, key=lambda item: -item[0])]
+
+def _inset_zones(ring, tangent, normal, dist, length, miter_limit=2.0, arc_tolerance=1e-3):
+    # Zonas convexas que quita el retranqueo: la franja entre cada arista y su recta desplazada y, en cada esquina
+    # entrante, la unión entre las dos rectas desplazadas. Como en Clipper, en inglete o cuadrada si el inglete supera
+    # miter_limit veces la distancia; pero si el inglete se alarga más allá de las propias aristas (anillos densos o
+    # con ruido de levantamiento) esa prolongación no corresponde a ningún lindero y la unión es redonda: el sector a
+    # la distancia del vértice, circunscrito con cometas que no lo exceden más de arc_tolerance. En las salientes las
+    # franjas ya se solapan y entre aristas paralelas queda un escalón. Devuelve los vértices antihorarios (Z, 5, 2;
+    # las de cuatro repiten el último), qué lados no son degenerados y los dos vértices del anillo de cada zona
+    n = len(ring); ends = np.roll(ring, -1, axis=0)
+    prev_t, prev_n, prev_d = np.roll(tangent, 1, axis=0), np.roll(normal, 1, axis=0), np.roll(dist, 1)
+    denom = prev_t[:, 0] * tangent[:, 1] - prev_t[:, 1] * tangent[:, 0]
+    parallel = np.abs(denom) < 1e-12
+    end_prev, start = ring + prev_d[:, None] * prev_n, ring + dist[:, None] * normal
+    rel = start - end_prev
+    s = (rel[:, 0] * tangent[:, 1] - rel[:, 1] * tangent[:, 0]) / np.where(parallel, 1.0, denom)
+    miter = end_prev + s[:, None] * prev_t
+    reach = np.maximum(prev_d, dist)
+    reflex = ~parallel & (denom < 0) & (reach > 0)
+    rounded = reflex & ((np.hypot(*(miter - end_prev).T) > np.roll(length, 1)) | (np.hypot(*(miter - start).T) > length))
+    square = reflex & ~rounded & (np.hypot(*(miter - ring).T) > miter_limit * np.maximum(reach, 1e-300))
+    # Unión cuadrada: tramo perpendicular a la bisectriz y tangente al círculo de radio `reach` del vértice
+    bisector = prev_n + normal
+    norm = np.hypot(*bisector.T)
+    bisector = np.where((norm > 1e-12)[:, None], bisector / np.maximum(norm, 1e-300)[:, None], prev_t)
+    along_prev, along = np.einsum('ij,ij->i', prev_t, bisector), np.einsum('ij,ij->i', tangent, bisector)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        extend_prev = np.where(square, (reach - prev_d * np.einsum('ij,ij->i', prev_n, bisector)) / along_prev, 0.0)
+        extend = np.where(square, (reach - dist * np.einsum('ij,ij->i', normal, bisector)) / along, 0.0)
+    first, last = end_prev + extend_prev[:, None] * prev_t, start + extend[:, None] * tangent
+    # El inglete es el sector entre las dos normales dentro de ambas rectas desplazadas: con distancias distintas la
+    # recta más cercana puede cortar la normal de la otra arista antes que su propia recta, y queda un triángulo
+    facing = np.einsum('ij,ij->i', prev_n, normal)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        upto, upto_prev = np.where(facing > 0, np.minimum(dist, prev_d / facing), dist), np.where(facing > 0, np.minimum(prev_d, dist / facing), prev_d)
+    near, near_prev = ring + upto[:, None] * normal, ring + upto_prev[:, None] * prev_n
+    clipped = ((upto < dist) | (upto_prev < prev_d))[:, None, None]
+    joints = np.where(square[:, None, None], np.stack((ring, start, last, first, end_prev), axis=1),
+                      np.where(clipped, np.stack((ring, near, near_prev, near_prev, near_prev), axis=1), np.stack((ring, start, miter, end_prev, end_prev), axis=1)))
+    # Unión redonda: el giro en cada esquina se reparte en cometas (vértice, dos tangencias y su corte)
+    arcs = np.flatnonzero(rounded)
+    turn = np.arctan2(-denom[arcs], np.einsum('ij,ij->i', prev_t[arcs], tangent[arcs]))
+    pieces = np.ceil(turn / (2 * np.arccos(1 / (1 + arc_tolerance)))).astype(int)
+    corner = np.repeat(arcs, pieces); step = np.repeat(turn / pieces, pieces)
+    angle = np.arctan2(prev_n[corner, 1], prev_n[corner, 0]) - step * (np.arange(pieces.sum()) - np.repeat(np.cumsum(pieces) - pieces, pieces))
+    ray = lambda a, r: ring[corner] + (reach[corner] * r)[:, None] * np.column_stack((np.cos(a), np.sin(a)))
+    fans = np.stack((ring[corner], ray(angle, 1.0), ray(angle - 0.5 * step, 1 / np.cos(0.5 * step)), ray(angle - step, 1.0), ray(angle - step, 1.0)), axis=1)
+    strips = np.stack((ring, ends, ends + dist[:, None] * normal, start, start), axis=1)
+    wide, corners = np.flatnonzero(dist > 0), np.flatnonzero(reflex & ~rounded)
+    zones = np.concatenate((strips[wide], joints[corners], fans))
+    origin = np.concatenate((wide, corners, corner))
+    # Rayo sobre el que cae cada lado que sale de un vértice del anillo: 2i por la normal de la arista que llega al
+    # vértice i, 2i + 1 por la de la que sale, 2n + g entre las cometas g y g + 1 de una unión redonda; -1 los demás
+    # lados y -2 la base de las franjas (el lindero)
+    kite = np.arange(len(fans)); head = np.r_[True, corner[1:] != corner[:-1]] if len(fans) else kite.astype(bool)
+    tail = np.r_[head[1:], True] if len(fans) else head
+    rays = np.full((len(zones), 5), -1)
+    rays[:len(wide), 0], rays[:len(wide), 1], rays[:len(wide), 4] = -2, 2 * ((wide + 1) % n), 2 * wide + 1
+    rays[len(wide):len(wide) + len(corners), 0], rays[len(wide):len(wide) + len(corners), 4] = 2 * corners + 1, 2 * corners
+    rays[len(wide) + len(corners):, 0] = np.where(head, 2 * corner, 2 * n + kite - 1)
+    rays[len(wide) + len(corners):, 4] = np.where(tail, 2 * corner + 1, 2 * n + kite)
+    following = np.roll(zones, -1, axis=1)
+    clockwise = (zones[..., 0] * following[..., 1] - following[..., 0] * zones[..., 1]).sum(axis=1) < 0
+    # Al invertir el orden, el lado k pasa a ser el 3 - k (el 4 sigue siendo el 4)
+    zones[clockwise], rays[clockwise] = zones[clockwise, ::-1], rays[clockwise][:, [3, 2, 1, 0, 4]]
+    return zones, rays, origin
+
+def _zone_sides(zones):
+    # Lados de cada zona convexa antihoraria como punto y normal interior (qx, qy, mx, my), (Z, 5) cada uno: un punto p
+    # está dentro si (p - q)·m > 0 en todos. Los lados degenerados repiten uno válido de su zona
+    edge = np.roll(zones, -1, axis=1) - zones; valid = (edge != 0).any(axis=2)
+    pick = np.where(valid, np.arange(5), valid.argmax(axis=1)[:, None])
+    take = lambda values: np.take_along_axis(values, pick, axis=1)
+    return take(zones[..., 0]), take(zones[..., 1]), take(-edge[..., 1]), take(edge[..., 0])
+
+def _inside_spans(starts, ends, qx, qy, mx, my, shared=None):
+    # Parte (lo, hi) de cada segmento estrictamente dentro de su zona (Cyrus-Beck, ver _zone_sides); vacía si lo >= hi.
+    # Los lados marcados en `shared` (N, 5) no limitan: el segmento va sobre ellos y cuenta como cubierto
+    c0 = (starts[:, :1] - qx) * mx + (starts[:, 1:] - qy) * my
+    step = ends - starts; c1 = step[:, :1] * mx + step[:, 1:] * my
+    if shared is not None: c0, c1 = np.where(shared, 1.0, c0), np.where(shared, 0.0, c1)
+    with np.errstate(divide='ignore', invalid='ignore'): t = -c0 / c1
+    lo = np.maximum(np.where(c1 > 0, t, -np.inf).max(axis=1), 0.0)
+    hi = np.minimum(np.where(c1 < 0, t, np.inf).min(axis=1), 1.0)
+    return lo, np.where(((c1 == 0) & (c0 <= 0)).any(axis=1), lo, hi)
+
+def _shared_sides(starts, ends, qx, qy, mx, my, tol, first):
+    # Lados de zona sobre los que va el segmento (paralelo y a menos de tol de su recta) y que lo tapan: si la zona
+    # queda a su izquierda el tramo está entre dos zonas, y si queda a su derecha, como la suya, es el mismo contorno
+    # repetido y solo lo conserva una de las dos (se tapa cuando `first`, por segmento)
+    norm = np.hypot(mx, my); step = ends - starts
+    c0 = (starts[:, :1] - qx) * mx + (starts[:, 1:] - qy) * my; c1 = step[:, :1] * mx + step[:, 1:] * my
+    on = (np.abs(c0) <= tol * norm) & (np.abs(c1) <= 1e-9 * np.hypot(*step.T)[:, None] * norm) & (norm > 0)
+    return on & ((step[:, 1:] * mx - step[:, :1] * my < 0) | first[:, None])
+
+def _facing_pairs(starts, ends, c, other, halfplanes, tol):
+    # Descarta los pares (segmento c, zona other) con el segmento entero fuera de un lado de la zona (más allá de tol,
+    # así tampoco va sobre él), lado a lado y solo con los que quedan: casi todos los pares que da _box_pairs se
+    # separan en el primer o el segundo lado y no llegan al recorte completo (_inside_spans, _shared_sides)
+    sx, sy, ex, ey = starts[c, 0], starts[c, 1], ends[c, 0], ends[c, 1]
+    for k in range(5):
+        qx, qy, mx, my = (side[other, k] for side in halfplanes)
+        margin = -tol * np.hypot(mx, my)
+        keep = ((sx - qx) * mx + (sy - qy) * my >= margin) | ((ex - qx) * mx + (ey - qy) * my >= margin)
+        c, other, sx, sy, ex, ey = c[keep], other[keep], sx[keep], sy[keep], ex[keep], ey[keep]
+    return c, other
+
+def _inside_zone(points, qx, qy, mx, my):
+    return ((points[:, :1] - qx) * mx + (points[:, 1:] - qy) * my > 0).all(axis=1)
+
+def _sample_distances(points, sample, block=16384):
+    # Distancia de cada punto al más cercano de `sample`: |p|² + |s|² - 2 p·s en un producto de matrices, con las
+    # coordenadas centradas en la muestra para no perder precisión en coordenadas grandes (UTM)
+    center = sample.mean(axis=0); points, sample = points - center, sample - center
+    norms = (sample * sample).sum(axis=1)
+    squared = [((block_points * block_points).sum(axis=1)[:, None] + norms - 2.0 * block_points @ sample.T).min(axis=1) for block_points in (points[begin:begin + block] for begin in range(0, len(points), block))]
+    return np.sqrt(np.maximum(np.concatenate(squared or [np.empty(0)]), 0.0))
+
+def _merged_spans(owner, lo, hi):
+    # Une los intervalos (owner, lo, hi) que se solapan dentro de cada segmento: disjuntos y ordenados
+    if not len(owner): return owner, lo, hi
+    order = np.lexsort((lo, owner)); owner, lo, hi = owner[order], lo[order], hi[order]
+    # Máximo acumulado de hi por segmento (desplazado por segmento para acumular de una vez); se toma el hi exacto
+    # del intervalo que lo alcanza
+    key = hi + 2.0 * owner; running = np.maximum.accumulate(key)
+    reach = hi[np.maximum.accumulate(np.where(key == running, np.arange(len(key)), 0))]
+    first = np.flatnonzero(np.r_[True, (owner[1:] != owner[:-1]) | (lo[1:] > reach[:-1])])
+    return owner[first], lo[first], reach[np.r_[first[1:], len(lo)] - 1]
+
+def _uncovered(count, owner, lo, hi):
+    # Partes [t0, t1] de cada uno de `count` segmentos que no cubren sus intervalos ya fusionados (ver _merged_spans)
+    untouched = np.setdiff1d(np.arange(count), owner)
+    first = np.r_[True, owner[1:] != owner[:-1]] if len(owner) else np.zeros(0, bool)
+    last = np.r_[first[1:], True] if len(owner) else first
+    before = np.where(first, 0.0, np.r_[0.0, hi[:-1]])
+    owner = np.concatenate((owner, owner[last], untouched))
+    t0 = np.concatenate((before, hi[last], np.zeros(len(untouched))))
+    t1 = np.concatenate((lo, np.ones(last.sum()), np.ones(len(untouched))))
+    return owner[t1 > t0], t0[t1 > t0], t1[t1 > t0]
+
+def _chain_pieces(starts, ends, snap):
+    # Une tramos orientados en lazos cerrados: cada final sigue en el comienzo libre más cercano a menos de `snap`.
+    # Devuelve los lazos como índices de tramos en orden; los que no cierran se descartan
+    if not len(starts): return []
+    base = np.floor(starts / snap).astype(np.int64).min(axis=0) - 1
+    cells = np.floor(starts / snap).astype(np.int64) - base; width = int(cells[:, 1].max()) + 3
+    code = cells[:, 0] * width + cells[:, 1]; order = np.argsort(code, kind='stable'); code = code[order]
+    end_cells = np.floor(ends / snap).astype(np.int64) - base
+    pairs = []
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            key = (end_cells[:, 0] + dx) * width + end_cells[:, 1] + dy
+            low = np.searchsorted(code, key, side='left'); c = np.searchsorted(code, key, side='right') - low
+            k = np.repeat(np.arange(len(ends)), c)
+            pairs.append((k, order[np.arange(int(c.sum())) - np.repeat(np.cumsum(c) - c, c) + np.repeat(low, c)]))
+    k, j = np.concatenate([k for k, _ in pairs]), np.concatenate([j for _, j in pairs])
+    gap = np.hypot(*(starts[j] - ends[k]).T); near = gap <= snap
+    k, j, gap = k[near], j[near], gap[near]
+    successor, taken = [-1] * len(starts), [False] * len(starts)
+    for end, begin in zip(k[np.argsort(gap, kind='stable')].tolist(), j[np.argsort(gap, kind='stable')].tolist()):
+        if successor[end] < 0 and not taken[begin]: successor[end] = begin; taken[begin] = True
+    loops, seen = [], [False] * len(starts)
+    for first in range(len(starts)):
+        loop, p = [], first
+        while p >= 0 and not seen[p]: seen[p] = True; loop.append(p); p = successor[p]
+        if p == first and len(loop) >= 3: loops.append(np.array(loop))
+    return loops
+
+# --- Simplificación ---
+def _segment_distances(points, starts, ends):
+    # Distancia de cada punto a su propio segmento (pares, no todos contra todos como point_segment_distances)
+    d = ends - starts; rel = points - starts
+    t = np.clip((rel * d).sum(axis=1) / np.maximum((d * d).sum(axis=1), 1e-300), 0.0, 1.0)
+    return np.hypot(*(rel - t[:, None] * d).T)
+
+def _douglas_peucker_mask(points, tol, anchors):
+    # Douglas–Peucker por niveles: en cada pasada se miden a la vez todos los puntos contra la cuerda de su tramo y se
+    # parte cada tramo por su punto más lejano si supera tol. Tantas pasadas como profundidad tenga la recursión
+    keep = np.zeros(len(points), dtype=bool); keep[anchors] = True
+    index = np.arange(len(points))
+    while True:
+        kept = np.flatnonzero(keep)
+        span = np.minimum(np.searchsorted(kept, index, side='right') - 1, len(kept) - 2)
+        distance = _segment_distances(points, points[kept[span]], points[kept[span + 1]]); distance[keep] = 0.0
+        farthest = np.maximum.reduceat(distance, kept[:-1])
+        split = np.flatnonzero((distance > tol) & (distance == farthest[span]))
+        if not len(split): return keep
+        keep[split[np.unique(span[split], return_index=True)[1]]] = True
+
+def _visvalingam_mask(points, tol):
+    # Visvalingam–Whyatt por pasadas en bloque: en cada una se quitan a la vez los vértices cuyo triángulo efectivo es
+    # el menor entre sus dos vecinos vivos (nunca dos contiguos), pero solo si todos los vértices originales que
+    # quedarían bajo la nueva cuerda siguen a menos de tol de ella (así se respeta la misma garantía). Los que no la
+    # cumplen esperan a que cambie alguno de sus vecinos. Cada pasada es O(n): los tramos bajo cuerdas distintas no se
+    # solapan
+    n = len(points) - 1; ring = points[:n]
+    alive, stuck = np.arange(n), np.zeros(n, dtype=bool)
+    while len(alive) > 3:
+        prev, nxt = np.roll(alive, 1), np.roll(alive, -1)
+        (ax, ay), (bx, by) = (ring[prev] - ring[alive]).T, (ring[nxt] - ring[alive]).T
+        area = np.where(stuck[alive], np.inf, np.abs(ax * by - ay * bx))
+        # Rango único (área, posición): un vértice es candidato si su rango es menor que el de sus dos vecinos
+        rank = np.empty(len(alive), dtype=np.int64); rank[np.lexsort((np.arange(len(alive)), area))] = np.arange(len(alive))
+        candidate = np.flatnonzero((rank < np.roll(rank, 1)) & (rank < np.roll(rank, -1)) & np.isfinite(area))
+        if not len(candidate): break
+        candidate = candidate[np.argsort(rank[candidate])[:len(alive) - 3]]
+        p, q = prev[candidate], nxt[candidate]; span = (q - p) % n - 1
+        first = np.cumsum(span) - span
+        between = (np.repeat(p + 1, span) + np.arange(int(span.sum())) - np.repeat(first, span)) % n
+        deviation = np.maximum.reduceat(_segment_distances(ring[between], ring[np.repeat(p, span)], ring[np.repeat(q, span)]), first)
+        fits = deviation <= tol
+        stuck[alive[candidate[~fits]]] = True; stuck[p[fits]] = stuck[q[fits]] = False
+        removed = np.zeros(len(alive), dtype=bool); removed[candidate[fits]] = True
+        alive = alive[~removed]
+    keep = np.zeros(len(points), dtype=bool); keep[alive] = True
+    return keep
+
+def simplify_ring(coords, tolerance, method='douglas-peucker', scale=(1.0, 1.0)):
+    # Anillo con menos vértices y desviación máxima `tolerance` (en las unidades de coords por `scale`; con lon/lat,
+    # los metros por grado). Solo quita vértices, nunca los mueve. Si el resultado se corta a sí mismo se reintenta con
+    # la mitad de tolerancia; en último caso se devuelve el anillo limpio sin simplificar
+    ring = clean_ring(coords)
+    if len(ring) <= 3 or tolerance <= 0: return ring
+    points = ring * np.asarray(scale, dtype=np.float64)
+    closed = np.vstack((points, points[:1]))
+    far = int(np.argmax(np.hypot(*(points - points[0]).T)))
+    for _ in range(8):
+        if method == 'visvalingam': keep = _visvalingam_mask(closed, tolerance)[:-1]
+        elif method == 'douglas-peucker': keep = _douglas_peucker_mask(closed, tolerance, [0, far, len(points)])[:-1]
+        else: raise ValueError(f"Método de simplificación desconocido: {method}")
+        simplified = ring[keep]
+        if len(simplified) >= 3 and not len(segment_intersections(simplified, np.roll(simplified, -1, axis=0))[0]): return clean_ring(simplified)
+        tolerance *= 0.5
+    return ring
+
+# --- Validación y reparación ---
+def validate_ring(coords):
+    # Diagnóstico de un anillo y reparación de los casos comunes: vértices no finitos o repetidos, sentido horario y
+    # cruces propios (el lazo de un "lazo de corbata" se parte y se queda la parte de mayor área). Los cruces se buscan
+    # con el barrido de segment_intersections, O(n log n) salvo anillos patológicos. Devuelve (anillo, informe); el
+    # anillo es None si no queda polígono
+    raw = np.asarray(coords, dtype=np.float64)[:, :2]
+    report = {'vertices': len(raw), 'closed': bool(len(raw) > 1 and np.array_equal(raw[0], raw[-1])), 'issues': [], 'errors': [], 'repaired': False}
+    finite = np.isfinite(raw).all(axis=1)
+    if not finite.all(): report['issues'].append('non_finite'); raw = raw[finite]
+    ring = raw[:-1] if len(raw) > 1 and np.array_equal(raw[0], raw[-1]) else raw
+    repeated = np.all(ring == np.roll(ring, 1, axis=0), axis=1) if len(ring) > 1 else np.zeros(len(ring), dtype=bool)
+    report['duplicates'] = int(np.count_nonzero(repeated))
+    if report['duplicates']: report['issues'].append('duplicate_vertices'); ring = ring[~repeated]
+    report['orientation'] = 'ccw' if len(ring) < 3 or signed_area(ring) >= 0 else 'cw'
+    if report['orientation'] == 'cw': report['issues'].append('clockwise')
+    # Picos: el contorno vuelve sobre sí mismo (aristas consecutivas opuestas); clean_ring los quita con los colineales
+    if len(ring) >= 3:
+        prev_edge, next_edge = ring - np.roll(ring, 1, axis=0), np.roll(ring, -1, axis=0) - ring
+        cross, dot = prev_edge[:, 0] * next_edge[:, 1] - prev_edge[:, 1] * next_edge[:, 0], (prev_edge * next_edge).sum(axis=1)
+        report['spikes'] = int(np.count_nonzero((np.abs(cross) <= 1e-9 * np.hypot(*prev_edge.T) * np.hypot(*next_edge.T)) & (dot < 0)))
+    else: report['spikes'] = 0
+    if report['spikes']: report['issues'].append('spikes')
+    cleaned = clean_ring(ring)
+    report['collinear'] = len(ring) - len(cleaned)
+    report['self_intersections'], report['parts'], report['discarded_area'] = 0, 1, 0.0
+    def degenerate():
+        report['errors'].append('degenerate'); report.update(area=0.0, valid=False)
+        return None, report
+    if len(cleaned) < 3: return degenerate()
+    crossings = len(segment_intersections(cleaned, np.roll(cleaned, -1, axis=0))[0])
+    if crossings:
+        report['issues'].append('self_intersection'); report['self_intersections'] = crossings
+        points, _, loops = _uncross(cleaned)
+        parts = [clean_ring(points[loop]) for loop in loops]; parts = [part for part in parts if len(part) >= 3]
+        areas = np.array([signed_area(part) for part in parts])
+        if not len(parts) or areas.max() <= 0: return degenerate()
+        best = int(np.argmax(areas)); cleaned = parts[best]
+        report['parts'], report['discarded_area'] = len(parts), float(np.abs(areas).sum() - areas[best])
+    report['area'] = signed_area(cleaned)
+    if report['area'] <= 1e-12 * max(float(np.ptp(cleaned, axis=0).max()), 1.0) ** 2: return degenerate()
+    report['valid'] = not report['issues']
+    report['repaired'] = bool(report['issues'])
+    return cleaned, report
+
+def validate_parcel(parcel):
+    # Valida la parcela una sola vez: el informe queda en parcel['diagnostics'] y, si hubo que repararla, el anillo
+    # reparado en parcel['repaired'] (parcel['coords'] no se toca)
+    if 'diagnostics' not in parcel:
+        ring, report = validate_ring(parcel['coords'])
+        parcel['diagnostics'] = report
+        if report['repaired']: parcel['repaired'] = ring
+    return parcel['diagnostics']
+
+def triage_parcels(parcels):
+    # Resumen para lotes grandes: ids agrupados por problema ('ok' si no hubo ninguno)
+    groups = {}
+    for parcel in parcels:
+        report = validate_parcel(parcel)
+        for issue in (report['errors'] + report['issues']) or ['ok']: groups.setdefault(issue, []).append(parcel['id'])
+    return groups
+
+def diagnostics_note(report):
+    # Resumen corto en español para mensajes de estado
+    labels = {'non_finite': "coordenadas no numéricas", 'duplicate_vertices': f"{report.get('duplicates', 0)} vértices repetidos", 'clockwise': "sentido horario", 'spikes': f"{report.get('spikes', 0)} picos",
+              'self_intersection': f"{report.get('self_intersections', 0)} cruces, {report.get('parts', 1)} partes", 'degenerate': "sin área"}
+    return ", ".join(labels[issue] for issue in report['errors'] + report['issues'])
+
+# --- Retranqueos por lindero ---
+class SetbackRules(NamedTuple):
+    # Distancia de retranqueo por tipo de lindero; None toma la distancia general (D.Corona)
+    frontage: float = None
+    side: float = None
+    rear: float = None
+
+    @classmethod
+    def uniform(cls, distance): return cls(distance, distance, distance)
+
+    def resolved(self, default): return SetbackRules(*(float(default if d is None else d) for d in self))
+
+class ParcelSetbacks:
+    # Linderos de una parcela clasificados una sola vez (frente, laterales, fondo) junto con sus normales, para
+    # evaluar después cualquier juego de distancias sin volver a preparar el polígono
+    KINDS = ('frontage', 'side', 'rear')
+
+    def __init__(self, coords, frontage=None, rear_cos=-0.7):
+        self.frame = edge_frame(coords)
+        if self.frame is None: raise ValueError("El polígono no tiene área")
+        normal, length = self.frame['normal'], self.frame['length']
+        # Por defecto el frente es la arista más larga; fondo, las aristas que miran en sentido contrario al frente
+        self.frontage = tuple(sorted({int(i) % len(length) for i in np.atleast_1d(frontage)})) if frontage is not None else (int(np.argmax(length)),)
+        front_normal = (normal[list(self.frontage)] * length[list(self.frontage), None]).sum(axis=0)
+        front_normal /= max(float(np.hypot(*front_normal)), 1e-300)
+        self.kinds = np.where(normal @ front_normal < rear_cos, 2, 1)
+        self.kinds[list(self.frontage)] = 0
+
+    @property
+    def ring(self): return self.frame['ring']
+
+    def distances(self, rules):
+        # Distancia por arista a partir de unas reglas ya resueltas (sin None)
+        return np.asarray(rules, dtype=np.float64)[self.kinds]
+
+    def inset(self, rules): return inset_polygon(None, self.distances(rules), frame=self.frame)
+
+    def sweep(self, scenarios):
+        # Evalúa muchos juegos de reglas reutilizando la clasificación y las normales compiladas
+        return [self.inset(rules) for rules in scenarios]
+
+# --- Rectángulo inscrito ---
+def _ring_edges(rings):
+    # Aristas (inicio, fin) de uno o varios anillos, como dos arrays (E, 2)
+    rings = [np.asarray(rings, dtype=np.float64)] if np.ndim(rings) == 2 else [np.asarray(r, dtype=np.float64) for r in rings]
+    return np.concatenate(rings), np.concatenate([np.roll(r, -1, axis=0) for r in rings])
+
+def free_cells(rings, xs, ys, touching=False):
+    # Rasterizado conservador sobre la rejilla xs × ys: una celda es libre si su centro queda dentro (par-impar por
+    # filas) y ninguna arista atraviesa su interior. Cada arista se recorta a las franjas que cruza, así que el coste
+    # es O(E + celdas) y no E × celdas. Con touching, la cota por fuera: las celdas cuyo interior toca la región
+    # (centro dentro o alguna arista que lo atraviesa)
+    starts, ends = _ring_edges(rings)
+    nx, ny = len(xs) - 1, len(ys) - 1
+    ymin, ymax = np.minimum(starts[:, 1], ends[:, 1]), np.maximum(starts[:, 1], ends[:, 1])
+    j0 = np.clip(np.searchsorted(ys, ymin, side='right') - 1, 0, ny - 1)
+    j1 = np.clip(np.searchsorted(ys, ymax, side='left') - 1, 0, ny - 1)
+    counts = np.maximum(j1 - j0 + 1, 0) * (ymax > ys[0]) * (ymin < ys[-1])
+    edge = np.repeat(np.arange(len(starts)), counts)
+    row = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + j0[edge]
+    (x0, y0), (x1, y1) = starts[edge].T, ends[edge].T
+    sloped = y1 != y0
+    slope = np.where(sloped, (x1 - x0) / np.where(sloped, y1 - y0, 1.0), 0.0)
+    lo_y, hi_y = np.maximum(ymin[edge], ys[row]), np.minimum(ymax[edge], ys[row + 1])
+    xa = np.where(sloped, x0 + (lo_y - y0) * slope, np.minimum(x0, x1))
+    xb = np.where(sloped, x0 + (hi_y - y0) * slope, np.maximum(x0, x1))
+    lo_x, hi_x = np.minimum(xa, xb), np.maximum(xa, xb)
+    i0, i1 = np.searchsorted(xs, lo_x, side='right') - 1, np.searchsorted(xs, hi_x, side='left') - 1
+    crosses = (hi_y > lo_y) & (i1 >= i0)
+    touched = np.zeros((ny, nx + 2), dtype=np.int32)
+    np.add.at(touched, (row[crosses], np.clip(i0[crosses], 0, nx)), 1)
+    np.add.at(touched, (row[crosses], np.clip(i1[crosses] + 1, 0, nx + 1)), -1)
+    # Paridad en el centro de cada fila: cada cruce conmuta las celdas cuyo centro queda a su derecha
+    xc, yc = 0.5 * (xs[:-1] + xs[1:]), 0.5 * (ys[:-1] + ys[1:])
+    straddle = (y0 > yc[row]) != (y1 > yc[row])
+    x_cross = x0[straddle] + (yc[row[straddle]] - y0[straddle]) * slope[straddle]
+    toggles = np.zeros((ny, nx + 1), dtype=np.int32)
+    np.add.at(toggles, (row[straddle], np.searchsorted(xc, x_cross, side='right')), 1)
+    inside = np.cumsum(toggles[:, :nx], axis=1) % 2 == 1
+    crossed = np.cumsum(touched[:, :nx], axis=1) != 0
+    return inside | crossed if touching else inside & ~crossed
+
+def _mask_rectangles(mask):
+    # Programación dinámica altura/izquierda/derecha, vectorizada por filas: para cada fila j con celdas libres da
+    # (j, fila, altura, izquierda, derecha) de la columna de celdas que acaba en ella, ensanchada todo lo posible.
+    # Entre esos rectángulos están todos los maximales de la máscara. Admite una pila de máscaras (..., ny, nx)
+    ny, nx = mask.shape[-2:]; columns = np.arange(nx); batch = mask.shape[:-2]
+    height = np.zeros(batch + (nx,), dtype=np.int64); left = np.zeros(batch + (nx,), dtype=np.int64); right = np.full(batch + (nx,), nx)
+    for j in range(ny):
+        row = mask[..., j, :]
+        height = np.where(row, height + 1, 0)
+        run_left = np.maximum.accumulate(np.where(row, 0, columns + 1), axis=-1)
+        run_right = np.minimum.accumulate(np.where(row, nx, columns)[..., ::-1], axis=-1)[..., ::-1]
+        left = np.where(row, np.maximum(left, run_left), 0)
+        right = np.where(row, np.minimum(right, run_right), nx)
+        if row.any(): yield j, row, height, left, right
+
+def largest_rectangle_in_mask(mask, xs, ys):
+    # Mayor rectángulo de celdas libres (ver _mask_rectangles) con celdas de tamaño variable. Devuelve
+    # (área, (i0, i1, j0, j1)) en índices de rejilla o (0, None)
+    best, best_cells = 0.0, None
+    for j, row, height, left, right in _mask_rectangles(mask):
+        area = (xs[right] - xs[left]) * (ys[j + 1] - ys[j + 1 - height]) * row
+        k = int(np.argmax(area))
+        if area[k] > best: best, best_cells = float(area[k]), (int(left[k]), int(right[k]), j + 1 - int(height[k]), j + 1)
+    return best, best_cells
+
+def _inscribed_grid(starts, cells):
+    # Rejilla uniforme de `cells` celdas en el lado largo; con pocos vértices se añaden sus coordenadas para que los
+    # lados alineados a los ejes (lotes rectilíneos) se ajusten exactamente
+    low, high = starts.min(axis=0), starts.max(axis=0)
+    step = max(float((high - low).max()), 1e-12) / cells
+    axes = []
+    for k in range(2):
+        axis = np.linspace(low[k], high[k], max(int(np.ceil((high[k] - low[k]) / step)), 1) + 1)
+        if len(starts) <= cells: axis = np.union1d(axis, starts[:, k])
+        axes.append(axis)
+    return axes
+
+def largest_inscribed_rectangle(rings, cells=256):
+    # Mayor rectángulo alineado a los ejes dentro de uno o varios anillos (p. ej. los del retranqueo). El resultado
+    # es conservador: nunca sale del polígono y, en lotes no rectilíneos, pierde como mucho una celda por lado.
+    # Devuelve una caja {min_x, max_x, min_y, max_y, width, height} o None
+    starts, _ = _ring_edges(rings)
+    if len(starts) < 3: return None
+    xs, ys = _inscribed_grid(starts, cells)
+    _, found = largest_rectangle_in_mask(free_cells(rings, xs, ys), xs, ys)
+    if found is None: return None
+    i0, i1, j0, j1 = found
+    return {'min_x': float(xs[i0]), 'max_x': float(xs[i1]), 'min_y': float(ys[j0]), 'max_y': float(ys[j1]), 'width': float(xs[i1] - xs[i0]), 'height': float(ys[j1] - ys[j0])}
+
+def inscribed_rectangle_bound(ring_sets, score, cells=48):
+    # Cota de score(ancho, alto) (creciente en los dos) para el rectángulo de largest_inscribed_rectangle de cada
+    # juego de anillos: llevado a una rejilla, cualquier rectángulo inscrito solo ocupa celdas que tocan la región, así
+    # que cabe en uno de los rectángulos maximales de esas celdas y basta el máximo de score sobre ellos. Una rejilla
+    # gruesa basta; las de todos los juegos se rellenan a la misma forma y se resuelven juntas. Devuelve un array
+    grids = []
+    for rings in ring_sets:
+        starts, _ = _ring_edges(rings)
+        xs, ys = _inscribed_grid(starts, cells) if len(starts) >= 3 else (np.zeros(1), np.zeros(1))
+        grids.append((xs, ys, free_cells(rings, xs, ys, touching=True) if len(starts) >= 3 else np.zeros((0, 0), dtype=bool)))
+    best = np.zeros(len(grids))
+    if not grids: return best
+    nx, ny = max(len(xs) for xs, _, _ in grids) - 1, max(len(ys) for _, ys, _ in grids) - 1
+    pad = lambda axis, size: np.pad(axis, (0, size + 1 - len(axis)), mode='edge')
+    xs, ys = np.stack([pad(xs, nx) for xs, _, _ in grids]), np.stack([pad(ys, ny) for _, ys, _ in grids])
+    mask = np.zeros((len(grids), ny, nx), dtype=bool)
+    for index, (_, _, cells_mask) in enumerate(grids): mask[index, :cells_mask.shape[0], :cells_mask.shape[1]] = cells_mask
+    for j, row, height, left, right in _mask_rectangles(mask):
+        widths = np.take_along_axis(xs, right, axis=1) - np.take_along_axis(xs, left, axis=1)
+        heights = ys[:, j + 1][:, None] - np.take_along_axis(ys, j + 1 - height, axis=1)
+        best = np.maximum(best, np.where(row, score(widths, heights), 0.0).max(axis=1))
+    return best
+
+def inscribed_rectangles_by_angle(rings, angles, cells=256):
+    # Mejor rectángulo inscrito para cada orientación candidata (grados): se giran los anillos -ángulo, se resuelve
+    # alineado a los ejes y las esquinas se devuelven giradas al marco original. Lista de
+    # (ángulo, caja en el marco girado, esquinas (4, 2)) de mayor a menor área
+    rings = [np.asarray(rings, dtype=np.float64)] if np.ndim(rings) == 2 else [np.asarray(r, dtype=np.float64) for r in rings]
+    results = []
+    for angle in angles:
+        c, s = math.cos(math.radians(angle)), math.sin(math.radians(angle))
+        rotation = np.array([[c, -s], [s, c]])
+        box = largest_inscribed_rectangle([r @ rotation for r in rings], cells)
+        if box is None: continue
+        corners = np.array([[box['min_x'], box['min_y']], [box['max_x'], box['min_y']], [box['max_x'], box['max_y']], [box['min_x'], box['max_y']]])
+        results.append((float(angle), box, corners @ rotation.T))
+    return sorted(results, key=lambda item: -item[1]['width'] * item[1]['height'])
+
+# --- Recorte de unidades ---
+def rectangles_in_polygon(rects, rings, tol=1e-6, chunk=1 << 18):
+    # Máscara de rectángulos (N, 4: x, y, ancho, alto) contenidos en la región de uno o varios anillos. Cada
+    # rectángulo se encoge `tol` (tocar el borde está permitido) y se corta (Liang-Barsky) solo contra las aristas
+    # cuya caja toca la suya (_box_pairs, en tandas de ~chunk pares): si ninguna lo toca, está entero dentro o entero
+    # fuera y basta la paridad de su centro, con un rayo hacia +x contra las aristas que cruzan su altura. Memoria
+    # proporcional a los pares candidatos, no a N × E
+    rects = np.asarray(rects, dtype=np.float64).reshape(-1, 4)
+    if not len(rects): return np.zeros(0, dtype=bool)
+    starts, ends = _ring_edges(rings)
+    px, py, dx, dy = starts[:, 0], starts[:, 1], ends[:, 0] - starts[:, 0], ends[:, 1] - starts[:, 1]
+    edge_boxes = _segment_boxes(starts, ends)
+    x, y, w, h = rects.T
+    x0, x1, y0, y1 = x + tol, x + w - tol, y + tol, y + h - tol
+    valid = (w > 2 * tol) & (h > 2 * tol)
+    touched = np.zeros(len(rects), dtype=bool)
+    for i, j in _box_pairs(np.column_stack((x0, y0, np.maximum(x0, x1), np.maximum(y0, y1))), edge_boxes, chunk):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            tx0, tx1 = (x0[i] - px[j]) / dx[j], (x1[i] - px[j]) / dx[j]
+            ty0, ty1 = (y0[i] - py[j]) / dy[j], (y1[i] - py[j]) / dy[j]
+        # Aristas paralelas a un eje: dentro de la franja, todo el parámetro vale; fuera, ninguno
+        in_x, in_y = (px[j] >= x0[i]) & (px[j] <= x1[i]), (py[j] >= y0[i]) & (py[j] <= y1[i])
+        lo_x = np.where(dx[j] == 0, np.where(in_x, -np.inf, np.inf), np.minimum(tx0, tx1))
+        hi_x = np.where(dx[j] == 0, np.where(in_x, np.inf, -np.inf), np.maximum(tx0, tx1))
+        lo_y = np.where(dy[j] == 0, np.where(in_y, -np.inf, np.inf), np.minimum(ty0, ty1))
+        hi_y = np.where(dy[j] == 0, np.where(in_y, np.inf, -np.inf), np.maximum(ty0, ty1))
+        touched[i[np.maximum(np.maximum(lo_x, lo_y), 0.0) <= np.minimum(np.minimum(hi_x, hi_y), 1.0)]] = True
+    test = np.flatnonzero(valid & ~touched)
+    cx, cy = x[test] + 0.5 * w[test], y[test] + 0.5 * h[test]
+    crossings = np.zeros(len(test), dtype=np.int64)
+    rays = np.column_stack((cx, cy, np.full(len(test), max(float(edge_boxes[:, 2].max()), float(cx.max(initial=0.0)))), cy))
+    for i, j in _box_pairs(rays, edge_boxes, chunk):
+        straddle = (py[j] > cy[i]) != (py[j] + dy[j] > cy[i])
+        with np.errstate(divide='ignore', invalid='ignore'): x_cross = px[j] + (cy[i] - py[j]) * dx[j] / dy[j]
+        crossings += np.bincount(i[straddle & (cx[i] < x_cross)], minlength=len(test))
+    keep = np.zeros(len(rects), dtype=bool); keep[test] = crossings % 2 == 1
+    return keep
+
+def units_in_polygon(units, rings, tol=1e-6):
+    # Máscara para una UnitTable o una lista de unidades {x, y, width, height}
+    if isinstance(units, UnitTable): return rectangles_in_polygon(units.rects(), rings, tol)
+    return rectangles_in_polygon([(u['x'], u['y'], u['width'], u['height']) for u in units], rings, tol)
+
+# --- Descomposición rectilínea ---
+def is_rectilinear(ring, tol=1e-7):
+    # Todas las aristas paralelas a los ejes (con tolerancia relativa al tamaño del anillo)
+    ring = clean_ring(ring)
+    if len(ring) < 4: return False
+    edge = np.roll(ring, -1, axis=0) - ring; scale = max(float(np.ptp(ring, axis=0).max()), 1.0)
+    return bool(np.all(np.abs(edge).min(axis=1) <= tol * scale))
+
+def _snap_levels(values, tol):
+    # Agrupa valores casi iguales (ruido numérico del retranqueo o del giro) y devuelve los niveles y el índice de cada uno
+    order = np.argsort(values); sorted_values = values[order]
+    group = np.concatenate(([0], np.cumsum(np.diff(sorted_values) > tol)))
+    levels = np.array([sorted_values[group == g].mean() for g in range(group[-1] + 1)])
+    index = np.empty(len(values), dtype=int); index[order] = group
+    return levels, index
+
+def _slab_rectangles(ring, tol):
+    # Franjas horizontales entre niveles de vértices; en cada franja, los tramos interiores entre aristas verticales
+    # (par-impar); los tramos con el mismo [x0, x1] en franjas consecutivas se funden en un solo rectángulo
+    levels_y, _ = _snap_levels(ring[:, 1], tol)
+    levels_x, x_index = _snap_levels(ring[:, 0], tol)
+    x = levels_x[x_index]; nxt = np.roll(np.arange(len(ring)), -1)
+    vertical = x_index == x_index[nxt]
+    vx, vy0, vy1 = x[vertical], np.minimum(ring[vertical, 1], ring[nxt[vertical], 1]), np.maximum(ring[vertical, 1], ring[nxt[vertical], 1])
+    rectangles, open_spans = [], {}
+    for k in range(len(levels_y) - 1):
+        y0, y1 = levels_y[k], levels_y[k + 1]; mid = 0.5 * (y0 + y1)
+        cuts = np.sort(vx[(vy0 < mid) & (vy1 > mid)])
+        spans = {(float(a), float(b)) for a, b in zip(cuts[0::2], cuts[1::2])}
+        for span in list(open_spans):
+            if span not in spans: rectangles.append((*span, *open_spans.pop(span)))
+        for span in spans:
+            open_spans[span] = (open_spans[span][0], y1) if span in open_spans else (y0, y1)
+    rectangles.extend((*span, *extent) for span, extent in open_spans.items())
+    return [{'min_x': a, 'max_x': b, 'min_y': float(c), 'max_y': float(d), 'width': b - a, 'height': float(d - c)} for a, b, c, d in rectangles]
+
+def rectilinear_pieces(rings, tol=1e-7):
+    # Descompone anillos rectilíneos en rectángulos: se prueban franjas horizontales y verticales y se queda la que
+    # da menos piezas (casi mínima para lotes en L, T o con muescas). Devuelve cajas, de mayor a menor área
+    pieces = []
+    for ring in ([rings] if np.ndim(rings) == 2 else rings):
+        ring = clean_ring(ring); scale = max(float(np.ptp(ring, axis=0).max()), 1.0)
+        horizontal = _slab_rectangles(ring, tol * scale)
+        vertical = [{'min_x': b['min_y'], 'max_x': b['max_y'], 'min_y': b['min_x'], 'max_y': b['max_x'], 'width': b['height'], 'height': b['width']} for b in _slab_rectangles(ring[:, ::-1], tol * scale)]
+        pieces.extend(min(horizontal, vertical, key=len))
+    return sorted(pieces, key=lambda b: -b['width'] * b['height'])
+
+def shared_boundaries(pieces, tol=1e-6):
+    # Tramos de borde compartidos entre piezas: (pieza, eje, coordenada, desde, hasta); eje 1 = tramo horizontal
+    shared = []
+    for i, a in enumerate(pieces):
+        for j, b in enumerate(pieces):
+            if i == j: continue
+            for axis, (lo, hi, key_a, key_b) in ((1, ('min_x', 'max_x', 'max_y', 'min_y')), (1, ('min_x', 'max_x', 'min_y', 'max_y')), (0, ('min_y', 'max_y', 'max_x', 'min_x')), (0, ('min_y', 'max_y', 'min_x', 'max_x'))):
+                start, end = max(a[lo], b[lo]), min(a[hi], b[hi])
+                if abs(a[key_a] - b[key_b]) <= tol and end - start > tol: shared.append((i, axis, a[key_a], start, end))
+    return shared
+
+def _layout_piece(task, cache=None):
+    # Se ejecuta en los procesos del pool: la disposición elegida sobre una pieza como área interna (la caché solo
+    # se usa en serie, en el propio proceso)
+    piece, base_width, base_length, corridor_width, stair_size, layout_type, fixed_point = task
+    try: return layout_units(piece, base_width, base_length, corridor_width, stair_size, layout_type, fixed_point, cache)['units']
+    except ValueError: return UnitTable.empty()
+
+def layout_pieces(pieces, base_width, base_length, corridor_width, stair_size, layout_type="cuadrada", workers=None, tol=1e-6, fixed_point=False, cache=None):
+    # Ejecuta la disposición en cada pieza (en paralelo con workers > 1) y une los resultados en una UnitTable. En los
+    # bordes que una pieza comparte con otra se quitan las unidades base y de pasillo paralelas a ese borde (a menos
+    # de un fondo de unidad más un pasillo) para que los pasillos de ambas piezas queden conectados; las escaleras se
+    # conservan. building = número de pieza (los ids de escalera salen como P{n}_SU_..)
+    tasks = [(piece, base_width, base_length, corridor_width, stair_size, layout_type, fixed_point) for piece in pieces]
+    if workers and workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor: results = list(executor.map(_layout_piece, tasks))
+    else: results = [_layout_piece(task, cache) for task in tasks]
+    depth, thickness = base_width + corridor_width, max(base_width, corridor_width)
+    boundaries, tables = shared_boundaries(pieces, tol), []
+    for index, table in enumerate(results):
+        drop = np.zeros(len(table), dtype=bool)
+        for edge in (edge for edge in boundaries if edge[0] == index): drop |= _along_boundary(table, edge, depth, thickness, tol)
+        table = table.take(~(drop & (table.kind != UNIT_KINDS.index('stair'))))
+        table.building.fill(index + 1)
+        tables.append(table)
+    return UnitTable.concat(tables)
+
+def _along_boundary(units, edge, depth, thickness, tol):
+    # Máscara de las unidades paralelas al tramo compartido, solapadas con él y dentro de la banda de `depth` desde el borde
+    _, axis, coord, start, end = edge
+    if axis == 1: lo, size, near, across = units.x, units.w, units.y, units.h
+    else: lo, size, near, across = units.y, units.h, units.x, units.w
+    overlap = np.minimum(lo + size, end) - np.maximum(lo, start)
+    return (overlap > tol) & (across <= thickness + tol) & (np.maximum(np.abs(near - coord), np.abs(near + across - coord)) <= depth + tol)
+
+# --- Caja orientada ---
+def convex_hull(points):
+    # Cadena monótona de Andrew, O(n log n): vértices del casco en sentido antihorario, sin colineales
+    pts = np.unique(np.asarray(points, dtype=np.float64)[:, :2], axis=0)
+    if len(pts) < 3: return pts
+    def chain(sequence):
+        out = []
+        for p in sequence:
+            while len(out) >= 2 and (out[-1][0] - out[-2][0]) * (p[1] - out[-2][1]) - (out[-1][1] - out[-2][1]) * (p[0] - out[-2][0]) <= 0: out.pop()
+            out.append(p)
+        return out[:-1]
+    rows = pts.tolist()
+    return np.array(chain(rows) + chain(rows[::-1]))
+
+def oriented_bounding_box(coords):
+    # Caja de área mínima por calibres rotatorios sobre el casco convexo: uno de sus lados contiene una arista del
+    # casco y, al avanzar por las aristas, los otros tres puntos de apoyo solo giran hacia delante (O(h) tras el
+    # casco). Devuelve {'angle' (grados del eje u), 'origin', 'axes' (columnas u, v), 'width', 'height', 'area',
+    # 'corners'} o None si los puntos no encierran área
+    hull = convex_hull(coords)
+    if len(hull) < 3: return None
+    h = len(hull); edges = np.roll(hull, -1, axis=0) - hull
+    directions = edges / np.hypot(*edges.T)[:, None]
+    u, v = directions[0], np.array([-directions[0, 1], directions[0, 0]])
+    right, top, left = int(np.argmax(hull @ u)), int(np.argmax(hull @ v)), int(np.argmin(hull @ u))
+    best = None
+    for i in range(h):
+        u = directions[i]; v = np.array([-u[1], u[0]])
+        while hull[(right + 1) % h] @ u > hull[right] @ u: right = (right + 1) % h
+        while hull[(top + 1) % h] @ v > hull[top] @ v: top = (top + 1) % h
+        while hull[(left + 1) % h] @ u < hull[left] @ u: left = (left + 1) % h
+        width, height = hull[right] @ u - hull[left] @ u, hull[top] @ v - hull[i] @ v
+        if best is None or width * height < best[0]: best = (width * height, u, v, width, height)
+    area, u, v, width, height = best
+    # El eje u sigue el lado largo (como el ancho del terreno en el marco de ejes) y apunta hacia x creciente
+    if height > width: u, v, width, height = v, -u, height, width
+    if u[0] < 0 or (u[0] == 0 and u[1] < 0): u, v = -u, -v
+    axes = np.column_stack((u, v)); origin = (hull @ axes).min(axis=0) @ axes.T
+    corners = origin + np.array([[0, 0], [width, 0], [width, height], [0, height]]) @ axes.T
+    return {'angle': math.degrees(math.atan2(u[1], u[0])), 'origin': origin, 'axes': axes, 'width': float(width), 'height': float(height), 'area': float(area), 'corners': corners}
+
+def rotation_frame(coords, angle):
+    # Marco local girado `angle` grados (eje u = (cos, sin)), con el origen en la esquina de la caja girada
+    c, s = math.cos(math.radians(angle)), math.sin(math.radians(angle))
+    axes = np.array([[c, -s], [s, c]]); local = np.asarray(coords, dtype=np.float64)[:, :2] @ axes
+    low, high = local.min(axis=0), local.max(axis=0); width, height = high - low
+    corners = (low + np.array([[0, 0], [width, 0], [width, height], [0, height]])) @ axes.T
+    return {'angle': float(angle), 'origin': low @ axes.T, 'axes': axes, 'width': float(width), 'height': float(height), 'area': float(width * height), 'corners': corners}
+
+def to_local(coords, frame):
+    # Coordenadas del mundo al marco local (origen en la esquina de la caja orientada, ejes u, v)
+    return (np.asarray(coords, dtype=np.float64)[:, :2] - frame['origin']) @ frame['axes']
+
+def to_world(coords, frame):
+    # Inversa de to_local para cualquier array (..., 2): una sola transformación afín en bloque
+    return np.asarray(coords, dtype=np.float64) @ frame['axes'].T + frame['origin']
+
+def rectangles_to_world(rectangles, frame=None):
+    # Unidades (UnitTable o dicts {x, y, width, height}, en el marco local) a polígonos (N, 4, 2) en el marco del mundo
+    if not len(rectangles): return np.empty((0, 4, 2))
+    if isinstance(rectangles, UnitTable): boxes = rectangles.rects().astype(np.float64, copy=False)
+    else: boxes = np.array([(r['x'], r['y'], r['width'], r['height']) for r in rectangles], dtype=np.float64)
+    x, y, w, h = boxes.T
+    corners = np.stack((np.column_stack((x, y)), np.column_stack((x + w, y)), np.column_stack((x + w, y + h)), np.column_stack((x, y + h))), axis=1)
+    return to_world(corners, frame) if frame is not None else corners
+
+# --- Milímetros enteros ---
+FIXED_POINT_SCALE = 1000  # unidades enteras por metro
+
+def to_fixed(value): return int(round(value * FIXED_POINT_SCALE))
+
+def fixed_box(box):
+    # Caja en milímetros enteros, redondeada hacia dentro (las unidades no salen del área interna, que puede ser el
+    # borde exacto del retranqueo) salvo ruido por debajo de 1e-6 mm; ancho y alto salen exactos de la diferencia
+    min_x, min_y = (math.ceil(box[key] * FIXED_POINT_SCALE - 1e-6) for key in ('min_x', 'min_y'))
+    max_x, max_y = (math.floor(box[key] * FIXED_POINT_SCALE + 1e-6) for key in ('max_x', 'max_y'))
+    return {'min_x': min_x, 'max_x': max_x, 'min_y': min_y, 'max_y': max_y, 'width': max_x - min_x, 'height': max_y - min_y}
+
+def fixed_dtype(values):
+    # int32 si todas las coordenadas caben (la mitad de memoria), si no int64
+    values = np.asarray(values)
+    limit = int(np.abs(values).max()) if values.size else 0
+    return np.int32 if limit < 2**31 else np.int64
+
+# --- Tabla de unidades ---
+UNIT_KINDS = ('outer_base', 'inner_base', 'corridor', 'stair')  # el código de tipo es la posición
+UNIT_TAGS = ('SU_BL', 'SU_BR', 'SU_TL', 'SU_TR', 'SU_L', 'SU_R')  # ids de las escaleras (tag -1: sin id)
+
+class UnitSpans:
+    # Filas de unidades como progresiones aritméticas: origen (x, y), paso (dx, dy), tamaño (w, h), count, kind y tag,
+    # un registro por fila (las escaleras son filas de una unidad). Ordenadas por tipo como UnitTable; con scale != 1
+    # (enteros en mm leídos en metros) se divide al final, igual que al convertir la tabla expandida
+    __slots__ = ('x', 'y', 'dx', 'dy', 'w', 'h', 'count', 'kind', 'tag', 'scale')
+    COLUMNS = ('x', 'y', 'dx', 'dy', 'w', 'h', 'count', 'kind', 'tag')
+
+    def __init__(self, x, y, dx, dy, w, h, count, kind, tag=None, scale=1):
+        kind = np.asarray(kind, dtype=np.int8)
+        columns = [np.asarray(c) for c in (x, y, dx, dy, w, h)] + [np.asarray(count, dtype=np.int64), kind]
+        columns.append(np.full(len(kind), -1, dtype=np.int8) if tag is None else np.asarray(tag, dtype=np.int8))
+        if len(kind) > 1 and np.any(kind[1:] < kind[:-1]):
+            order = np.argsort(kind, kind='stable'); columns = [c[order] for c in columns]
+        self.x, self.y, self.dx, self.dy, self.w, self.h, self.count, self.kind, self.tag = columns
+        self.scale = scale
+
+    def _replace(self, **changes):
+        spans = UnitSpans.__new__(UnitSpans)
+        for name in self.__slots__: setattr(spans, name, changes.get(name, getattr(self, name)))
+        return spans
+
+    def __len__(self): return len(self.kind)
+
+    def kind_counts(self): return np.bincount(self.kind, weights=self.count, minlength=len(UNIT_KINDS)).astype(np.int64)
+
+    def area(self, kind=None):
+        # Superficie de las unidades (de un tipo o todas): count · w · h por fila
+        mask = slice(None) if kind is None else self.kind == UNIT_KINDS.index(kind)
+        return float(np.sum(self.count[mask] * self.w[mask] * self.h[mask])) / self.scale ** 2
+
+    def extents(self):
+        # (N, 4) [min_x, min_y, max_x, max_y] de cada fila, a partir de la primera y la última unidad
+        last = self.count - 1
+        x_end, y_end = self.x + last * self.dx, self.y + last * self.dy
+        boxes = np.column_stack((np.minimum(self.x, x_end), np.minimum(self.y, y_end), np.maximum(self.x, x_end) + self.w, np.maximum(self.y, y_end) + self.h))
+        return boxes / self.scale if self.scale != 1 else boxes
+
+    def expand(self):
+        # Columnas de UnitTable (x, y, w, h, kind, building, tag, outside), de solo lectura. Cada unidad se calcula como
+        # origen + i · paso, la misma cuenta que hacían los generadores unidad a unidad
+        count = self.count
+        index = np.arange(int(count.sum()), dtype=np.int64) - np.repeat(np.cumsum(count) - count, count)
+        x, y = np.repeat(self.x, count) + index * np.repeat(self.dx, count), np.repeat(self.y, count) + index * np.repeat(self.dy, count)
+        w, h = np.repeat(self.w, count), np.repeat(self.h, count)
+        if self.scale != 1: x, y, w, h = (c / self.scale for c in (x, y, w, h))
+        else: x, y = x.astype(self.x.dtype, copy=False), y.astype(self.y.dtype, copy=False)
+        columns = (x, y, w, h, np.repeat(self.kind, count), np.zeros(len(index), dtype=np.int32), np.repeat(self.tag, count))
+        for column in columns: column.flags.writeable = False
+        return columns + (None,)
+
+    def astype(self, dtype): return self._replace(**{name: getattr(self, name).astype(dtype) for name in ('x', 'y', 'dx', 'dy', 'w', 'h')})
+
+    def translated(self, dx, dy):
+        # (dx, dy) en las unidades de lectura: con scale != 1 (mm leídos en metros) se pasan a las de las filas
+        return self._replace(x=self.x + dx * self.scale, y=self.y + dy * self.scale)
+
+    @property
+    def nbytes(self): return sum(getattr(self, name).nbytes for name in self.COLUMNS)
+
+    def readonly(self):
+        columns = {name: getattr(self, name).copy() for name in self.COLUMNS}
+        for column in columns.values(): column.flags.writeable = False
+        return self._replace(**columns)
+
+class UnitTable:
+    # Unidades en columnas NumPy en lugar de un dict por rectángulo: x, y, w, h (float64 en metros o enteros en mm),
+    # kind (posición en UNIT_KINDS), building (pieza de origen, 0 sin piezas), tag (posición en UNIT_TAGS) y
+    # outside (None salvo al marcar en lugar de descartar). Las filas van ordenadas por tipo, así que cada tipo es un
+    # tramo contiguo y view() lo devuelve sin copiar las columnas. Creada desde UnitSpans, conteos, superficies y
+    # extensión salen de las filas y las columnas solo se expanden la primera vez que alguien las lee (expandir dos
+    # veces a la vez desde dos hilos da el mismo resultado, así que no hace falta cerrojo)
+    __slots__ = ('_columns', 'spans', 'bounds')
+    COLUMNS = ('x', 'y', 'w', 'h', 'kind', 'building', 'tag', 'outside')
+
+    def __init__(self, x, y, w, h, kind, building=None, tag=None, outside=None):
+        kind = np.asarray(kind, dtype=np.int8)
+        building = np.zeros(len(kind), dtype=np.int32) if building is None else np.asarray(building, dtype=np.int32)
+        tag = np.full(len(kind), -1, dtype=np.int8) if tag is None else np.asarray(tag, dtype=np.int8)
+        columns = [np.asarray(c) for c in (x, y, w, h)] + [kind, building, tag] + ([np.asarray(outside, dtype=bool)] if outside is not None else [None])
+        if len(kind) > 1 and np.any(kind[1:] < kind[:-1]):
+            order = np.argsort(kind, kind='stable'); columns = [c[order] if c is not None else None for c in columns]
+        self._assign(*columns)
+
+    def _assign(self, x, y, w, h, kind, building, tag, outside):
+        self._columns, self.spans = (x, y, w, h, kind, building, tag, outside), None
+        self.bounds = np.searchsorted(kind, np.arange(len(UNIT_KINDS) + 1))
+
+    def _data(self):
+        if self._columns is None: self._columns = self.spans.expand()
+        return self._columns
+
+    @classmethod
+    def _wrap(cls, *columns):
+        # Columnas ya ordenadas por tipo (vistas, filtrados): sin comprobar ni copiar
+        table = cls.__new__(cls); table._assign(*columns); return table
+
+    @classmethod
+    def from_spans(cls, spans):
+        table = cls.__new__(cls); table._columns, table.spans = None, spans
+        table.bounds = np.concatenate(([0], np.cumsum(spans.kind_counts())))
+        return table
+
+    @classmethod
+    def empty(cls, dtype=np.float64):
+        return cls._wrap(*(np.zeros(0, dtype=dtype) for _ in range(4)), np.zeros(0, np.int8), np.zeros(0, np.int32), np.zeros(0, np.int8), None)
+
+    @classmethod
+    def concat(cls, tables):
+        tables = [table for table in tables if len(table)]
+        if not tables: return cls.empty()
+        flags = [table.outside for table in tables]
+        outside = None if all(f is None for f in flags) else np.concatenate([f if f is not None else np.zeros(len(t), bool) for f, t in zip(flags, tables)])
+        return cls(*(np.concatenate([getattr(table, name) for table in tables]) for name in cls.COLUMNS[:-1]), outside=outside)
+
+    def __len__(self): return int(self.bounds[-1])
+
+    def __repr__(self): return f"UnitTable({', '.join(f'{kind}={self.count(kind)}' for kind in UNIT_KINDS)}{f', spans={len(self.spans)}' if self.spans is not None else ''})"
+
+    def __eq__(self, other): return isinstance(other, UnitTable) and all(_same(getattr(self, name), getattr(other, name)) for name in self.COLUMNS)
+
+    def __ne__(self, other): return not self == other
+    __hash__ = None
+
+    def _span(self, kind):
+        code = UNIT_KINDS.index(kind); return slice(int(self.bounds[code]), int(self.bounds[code + 1]))
+
+    def count(self, kind): span = self._span(kind); return span.stop - span.start
+
+    def area(self, kind=None):
+        # Superficie de las unidades (de un tipo o todas), en las unidades de la tabla
+        if self.spans is not None: return self.spans.area(kind)
+        table = self if kind is None else self.view(kind)
+        return float(np.sum(table.w * table.h))
+
+    def extent(self, kind=None):
+        # Caja de las unidades (de un tipo o todas) como las de bounding_box_of; None si no hay ninguna
+        if self.spans is not None:
+            boxes = self.spans.extents()
+            if kind is not None: boxes = boxes[self.spans.kind == UNIT_KINDS.index(kind)]
+        else:
+            table = self if kind is None else self.view(kind)
+            boxes = np.column_stack((table.x, table.y, table.x + table.w, table.y + table.h))
+        if not len(boxes): return None
+        min_x, min_y = boxes[:, :2].min(axis=0); max_x, max_y = boxes[:, 2:].max(axis=0)
+        return {'min_x': float(min_x), 'max_x': float(max_x), 'min_y': float(min_y), 'max_y': float(max_y), 'width': float(max_x - min_x), 'height': float(max_y - min_y)}
+
+    def view(self, kind):
+        # Las filas de un tipo como tabla que comparte memoria con esta
+        span = self._span(kind)
+        return self._wrap(*(column[span] if column is not None else None for column in self._data()))
+
+    def rects(self):
+        # (N, 4) [x, y, ancho, alto], el formato de rectangles_in_polygon y rectangles_to_world
+        return np.column_stack((self.x, self.y, self.w, self.h))
+
+    def take(self, mask):
+        # Filas seleccionadas por una máscara (o índices crecientes): conserva el orden por tipo
+        return self._wrap(*(column[mask] if column is not None else None for column in self._data()))
+
+    def flagged(self, outside):
+        return self._wrap(*self._data()[:-1], np.asarray(outside, dtype=bool))
+
+    def astype(self, dtype):
+        if self._columns is None: return self.from_spans(self.spans.astype(dtype))
+        return self._wrap(*(c.astype(dtype) for c in (self.x, self.y, self.w, self.h)), self.kind, self.building, self.tag, self.outside)
+
+    def translated(self, dx, dy):
+        # La tabla desplazada (dx, dy) en sus propias unidades: sin expandir, solo se suman los orígenes de las filas
+        if self._columns is None: return self.from_spans(self.spans.translated(dx, dy))
+        return self._wrap(self.x + dx, self.y + dy, *self._columns[2:])
+
+    @property
+    def nbytes(self):
+        if self._columns is None: return self.spans.nbytes
+        return sum(column.nbytes for column in self._columns if column is not None)
+
+    def to_meters(self):
+        # De milímetros enteros a metros (el resto de columnas se comparte)
+        if self._columns is None: return self.from_spans(self.spans._replace(scale=FIXED_POINT_SCALE))
+        return self._wrap(*(c / FIXED_POINT_SCALE for c in (self.x, self.y, self.w, self.h)), self.kind, self.building, self.tag, self.outside)
+
+    def readonly(self):
+        # Copia con todas las columnas de solo lectura (sus vistas también lo son); sin expandir, basta con las filas
+        if self._columns is None: return self.from_spans(self.spans.readonly())
+        columns = list(self._columns)
+        for index, column in enumerate(columns):
+            if column is not None: columns[index] = column.copy(); columns[index].flags.writeable = False
+        return self._wrap(*columns)
+
+    def records(self, kind=None):
+        # Acceso de compatibilidad: las filas (de un tipo o todas) como los dicts {x, y, width, height[, id][, outside]}
+        table = self if kind is None else self.view(kind)
+        outside = table.outside.tolist() if table.outside is not None else [None] * len(table)
+        units = []
+        for x, y, w, h, building, tag, out in zip(table.x.tolist(), table.y.tolist(), table.w.tolist(), table.h.tolist(), table.building.tolist(), table.tag.tolist(), outside):
+            unit = {'x': x, 'y': y, 'width': w, 'height': h}
+            if tag >= 0: unit['id'] = f"P{building}_{UNIT_TAGS[tag]}" if building else UNIT_TAGS[tag]
+            if out is not None: unit['outside'] = out
+            units.append(unit)
+        return units
+
+# Las columnas se leen a través de _data(), que expande las filas la primera vez
+for _index, _name in enumerate(UnitTable.COLUMNS): setattr(UnitTable, _name, property(lambda self, index=_index: self._data()[index]))
+
+# --- Barrido de orientaciones ---
+def layout_upper_bound(layout_type, width, height, base_width, base_length, corridor_width, stair_size):
+    # Cota superior de unidades base en cualquier área interna de como mucho width × height (arrays), con las
+    # escaleras de los generadores: con el lado s = min(stair_size, recorte), cada brazo pierde al menos s por escalera
+    # salvo que el recorte deje s en la mitad (o el total) de un lado, y entonces el otro brazo no tiene unidades.
+    # cuadrada: 2·F(w - 2s) + 2·F(h - 2s) o 2·F(lado); forma_l: F(w - s) + F(h - s) o F(lado); forma_rectangular
+    # necesita h >= base_width + pasillo, así que s >= min(stair_size, base_width + pasillo). F(x) = floor(x / largo)
+    width, height = np.asarray(width, dtype=np.float64), np.asarray(height, dtype=np.float64)
+    fit = lambda length: np.floor(np.maximum(length, 0.0) / base_length + 1e-9)
+    stair = stair_size if stair_size > _UnitGenerator.epsilon else 0.0
+    if layout_type == "forma_rectangular":
+        return np.where(height >= base_width + corridor_width, fit(width - 2 * min(stair, base_width + corridor_width)), 0.0)
+    if layout_type == "forma_l": return np.maximum(np.maximum(fit(width), fit(height)), fit(width - stair) + fit(height - stair))
+    return 2 * np.maximum(np.maximum(fit(width), fit(height)), fit(width - 2 * stair) + fit(height - 2 * stair))
+
+def count_base_units(inner_area, base_width, base_length, corridor_width, stair_size, layout_type="cuadrada", fixed_point=False):
+    # Cuántas unidades base caben en un área interna dada, con el conteo cerrado (sin generar las unidades)
+    try: counts = count_units(inner_area, base_width, base_length, corridor_width, stair_size, layout_type, fixed_point)
+    except ValueError: return 0
+    return int(counts['outer_base'] + counts['inner_base'])
+
+def _evaluate_orientation(task):
+    # Se ejecuta en los procesos del pool: área interna y unidades base con los anillos en el marco girado `angle`
+    # grados de `reference` (el mismo que usará KMLProcessor, para obtener exactamente los mismos números). Las
+    # unidades se cuentan como las dejará calculate_units: con la forma cerrada si el recorte no puede quitar
+    # ninguna y, si no, generadas y recortadas contra el retranqueo. El conteo sin recortar es una cota: si no
+    # supera `floor` (lo mejor hasta ahora) no se recorta y se devuelve None
+    angle, rings, reference, source, layout, clip_mode, floor = task
+    frame = rotation_frame(reference, angle); rotated = [to_local(ring, frame) for ring in rings]
+    inner_area = largest_inscribed_rectangle(rotated) if source == 'rectangle' else bounding_box_of(np.concatenate(rotated))
+    if not inner_area: return angle, 0, inner_area
+    fixed_point = len(layout) > 5 and layout[5]
+    counts = count_units(inner_area, *layout[:5], fixed_point)
+    base = int(counts['outer_base'] + counts['inner_base'])
+    if not clip_mode or _clip_free(counts, inner_area, rotated, source, layout[0], layout[2], layout[4]): return angle, base, inner_area
+    if base <= floor: return angle, None, inner_area
+    units, _, _ = place_units(inner_area, rotated, None, *layout[:5], fixed_point, clip_mode)
+    return angle, units['units'].count('outer_base') + units['units'].count('inner_base'), inner_area
+
+def orientation_sweep(rings, layout, angles, source='bbox', workers=None, batch=None, reference=None, clip_mode='drop'):
+    # Busca la orientación con más unidades base tras el recorte (clip_mode como en place_units). `rings` son los
+    # anillos del retranqueo en el marco del mundo, `layout` = (base_width, base_length, corridor_width, stair_size,
+    # layout_type[, fixed_point]) y `reference` el polígono que fija el origen de cada marco girado (por defecto, los
+    # anillos). Cada ángulo tiene una cota de unidades (layout_upper_bound): con 'bbox', sobre la caja girada del casco
+    # convexo (todos los ángulos a la vez); con 'rectangle', sobre los rectángulos maximales de una rejilla gruesa
+    # girada (inscribed_rectangle_bound), mucho más barata que el rectángulo inscrito. Los ángulos se evalúan de mayor a
+    # menor cota, por lotes repartidos en un pool si workers > 1, y se descartan los que no pueden mejorar
+    angles = np.asarray(list(angles), dtype=np.float64)
+    hull = convex_hull(np.concatenate(rings)); reference = hull if reference is None else reference
+    fixed_point = len(layout) > 5 and layout[5]
+    # Con fixed_point las medidas se redondean al mm: la caja puede ganar hasta 1 mm y las dimensiones, medio
+    dimensions = [round(v * FIXED_POINT_SCALE) / FIXED_POINT_SCALE for v in layout[:4]] if fixed_point else layout[:4]
+    slack = 1.0 / FIXED_POINT_SCALE if fixed_point else 0.0
+    bound_of = lambda width, height: layout_upper_bound(layout[4], width + slack, height + slack, *dimensions)
+    if source == 'rectangle':
+        frames = (rotation_frame(reference, angle) for angle in angles)
+        bound = inscribed_rectangle_bound([[to_local(ring, frame) for ring in rings] for frame in frames], bound_of)
+    else:
+        radians = np.radians(angles); u = np.column_stack((np.cos(radians), np.sin(radians))); v = np.column_stack((-u[:, 1], u[:, 0]))
+        bound = bound_of(np.ptp(hull @ u.T, axis=0), np.ptp(hull @ v.T, axis=0))
+    order = np.argsort(-bound, kind='stable')
+    executor = ProcessPoolExecutor(max_workers=workers) if workers and workers > 1 else None
+    batch = batch or (4 * workers if executor else 1)
+    best, evaluated = None, 0
+    try:
+        for start in range(0, len(order), batch):
+            chunk = [i for i in order[start:start + batch] if best is None or bound[i] > best[1]]
+            if not chunk: break
+            tasks = [(float(angles[i]), rings, reference, source, layout, clip_mode, best[1] if best else -1) for i in chunk]
+            for result in (executor.map(_evaluate_orientation, tasks) if executor else map(_evaluate_orientation, tasks)):
+                if result[1] is None: continue
+                evaluated += 1
+                if best is None or result[1] > best[1]: best = result
+    finally:
+        if executor: executor.shutdown()
+    return {'angle': best[0], 'base_units': best[1], 'inner_area': best[2], 'evaluated': evaluated, 'pruned': len(angles) - evaluated}
+
+# --- Ingesta masiva ---
+def _ingest_file(file_path, cache=None, validate=False):
+    # Se ejecuta en los procesos del pool: el error se devuelve como texto para no abortar el lote
+    try:
+        parcels = list(load_parcel_catalog(file_path, cache))
+        if validate:
+            for parcel in parcels: validate_parcel(parcel)
+        return file_path, parcels, None
+    except Exception as e: return file_path, [], f"{type(e).__name__}: {e}"
+
+def ingest_folder(folder, workers=None, chunksize=8, cache=None, extensions=('.kml', '.kmz'), validate=False):
+    # Reparte los archivos de la carpeta en un pool de procesos y une todo en un catálogo; los ids se prefijan
+    # con el nombre del archivo para que no choquen. Con validate, cada proceso adjunta el diagnóstico de sus
+    # parcelas (ver validate_parcel). Devuelve (catálogo, {ruta: error}).
+    if workers is not None and workers < 1: raise ValueError(f"workers debe ser >= 1 (recibido {workers})")
+    paths = sorted(os.path.join(folder, n) for n in os.listdir(folder) if n.lower().endswith(extensions))
+    catalog, errors = ParcelCatalog(), {}
+    if workers == 1: results = (_ingest_file(path, cache, validate) for path in paths)
+    else: pool = ProcessPoolExecutor(max_workers=workers); results = pool.map(_ingest_file, paths, [cache] * len(paths), [validate] * len(paths), chunksize=max(1, chunksize))
+    try:
+        for path, parcels, error in results:
+            if error: errors[path] = error; continue
+            stem = os.path.splitext(os.path.basename(path))[0]
+            for parcel in parcels: catalog.add(dict(parcel, id=f"{stem}/{parcel['id']}", source=path))
+    finally:
+        if workers != 1: pool.shutdown()
+    return catalog, errors
+
+class _UnitGenerator:
+    # Los generadores de cada disposición sobre un objeto de usar y tirar: cada cálculo tiene sus propias filas y no
+    # comparte estado con KMLProcessor, así que pueden calcularse varias disposiciones a la vez. Cada brazo es una
+    # fila (origen, paso, tamaño, cuántas) y table() devuelve una UnitTable sobre esas filas, sin expandirlas
+    epsilon = 1e-9
+
+    def __init__(self, inner_area, fixed=False):
+        self.inner_area, self._fixed_active = inner_area, fixed
+        self.central_area, self._spans = None, []
+
+    def _add(self, kind, x, y, width, height, count=1, step=(0, 0), tag=None):
+        self._spans.append((x, y, step[0], step[1], width, height, count, UNIT_KINDS.index(kind), UNIT_TAGS.index(tag) if tag else -1))
+
+    def _stair(self, x, y, size, tag): self._add('stair', x, y, size, size, tag=tag)
+
+    def table(self):
+        dtype = np.int64 if self._fixed_active else np.float64
+        columns = list(zip(*self._spans)) or [()] * len(UnitSpans.COLUMNS)
+        return UnitTable.from_spans(UnitSpans(*(np.array(c, dtype=dtype) for c in columns[:6]), *columns[6:]))
+
+    def _layout_units(self, base_width, base_length, corridor_width, stair_size, layout_type):
         nominal_stair_size = stair_size
         if nominal_stair_size > self.epsilon:
             max_dim_stair = 0
-            if layout_type == "cuadrada": max_dim_stair = min(self.inner_area['width'] / 2, self.inner_area['height'] / 2)
+            if layout_type == "cuadrada": max_dim_stair = min(self._half(self.inner_area['width']), self._half(self.inner_area['height']))
             elif layout_type == "forma_l": max_dim_stair = min(self.inner_area['width'], self.inner_area['height'])
-            elif layout_type == "forma_rectangular": max_dim_stair = min(self.inner_area['width'] / 2, self.inner_area['height'])
+            elif layout_type == "forma_rectangular": max_dim_stair = min(self._half(self.inner_area['width']), self.inner_area['height'])
             if nominal_stair_size > max_dim_stair: nominal_stair_size = max_dim_stair
-        if nominal_stair_size <= self.epsilon: self.stair_units, nominal_stair_size = [], 0
+        if nominal_stair_size <= self.epsilon: nominal_stair_size = 0
         if layout_type == "cuadrada": self._calculate_units_cuadrada(base_width, base_length, corridor_width, nominal_stair_size)
         elif layout_type == "forma_l": self._calculate_units_forma_l(base_width, base_length, corridor_width, nominal_stair_size)
         elif layout_type == "forma_rectangular": self._calculate_units_forma_rectangular(base_width, base_length, corridor_width, nominal_stair_size)
-        else: return False, "Tipo de disposición no reconocido."
-        return True, "Cálculo de unidades completado."
+        else: return False
+        return True
+
+    def _fit(self, available, unit):
+        # Cuántas unidades caben: división entera exacta en milímetros; en metros, floor de la división (que con
+        # 60.0 / 6.0 calculado como 9.999999 pierde una)
+        return available // unit if self._fixed_active else math.floor(available / unit)
+
+    def _half(self, value): return value // 2 if self._fixed_active else value / 2
 
     def _calculate_units_cuadrada(self, base_width, base_length, corridor_width, nominal_stair_size):
         ia = self.inner_area
         if nominal_stair_size > self.epsilon:
-            self.stair_units.extend([
-                {'x': ia['min_x'], 'y': ia['min_y'], 'width': nominal_stair_size, 'height': nominal_stair_size, 'id': 'SU_BL'},
-                {'x': ia['max_x'] - nominal_stair_size, 'y': ia['min_y'], 'width': nominal_stair_size, 'height': nominal_stair_size, 'id': 'SU_BR'},
-                {'x': ia['min_x'], 'y': ia['max_y'] - nominal_stair_size, 'width': nominal_stair_size, 'height': nominal_stair_size, 'id': 'SU_TL'},
-                {'x': ia['max_x'] - nominal_stair_size, 'y': ia['max_y'] - nominal_stair_size, 'width': nominal_stair_size, 'height': nominal_stair_size, 'id': 'SU_TR'}])
+            self._stair(ia['min_x'], ia['min_y'], nominal_stair_size, 'SU_BL')
+            self._stair(ia['max_x'] - nominal_stair_size, ia['min_y'], nominal_stair_size, 'SU_BR')
+            self._stair(ia['min_x'], ia['max_y'] - nominal_stair_size, nominal_stair_size, 'SU_TL')
+            self._stair(ia['max_x'] - nominal_stair_size, ia['max_y'] - nominal_stair_size, nominal_stair_size, 'SU_TR')
         available_width, available_height = ia['width'] - (2 * nominal_stair_size), ia['height'] - (2 * nominal_stair_size)
         unit_w_horiz, unit_h_horiz = base_length, base_width
-        num_fitted_horizontally = math.floor(available_width / unit_w_horiz) if available_width >= unit_w_horiz else 0
+        num_fitted_horizontally = self._fit(available_width, unit_w_horiz) if available_width >= unit_w_horiz else 0
         unit_w_vert, unit_h_vert = base_width, base_length
-        num_fitted_vertically = math.floor(available_height / unit_h_vert) if available_height >= unit_h_vert else 0
-        start_x = ia['min_x'] + nominal_stair_size + (available_width - (num_fitted_horizontally * unit_w_horiz)) / 2
-        start_y = ia['min_y'] + nominal_stair_size + (available_height - (num_fitted_vertically * unit_h_vert)) / 2
-        for i in range(num_fitted_horizontally):
-            current_x = start_x + (i * unit_w_horiz)
-            self.outer_base_units.append({'x': current_x, 'y': ia['min_y'], 'width': unit_w_horiz, 'height': unit_h_horiz})
-            self.corridor_units.append({'x': current_x, 'y': ia['min_y'] + unit_h_horiz, 'width': unit_w_horiz, 'height': corridor_width})
-            self.outer_base_units.append({'x': current_x, 'y': ia['max_y'] - unit_h_horiz, 'width': unit_w_horiz, 'height': unit_h_horiz})
-            self.corridor_units.append({'x': current_x, 'y': ia['max_y'] - unit_h_horiz - corridor_width, 'width': unit_w_horiz, 'height': corridor_width})
-        for i in range(num_fitted_vertically):
-            current_y = start_y + (i * unit_h_vert)
-            self.outer_base_units.append({'x': ia['min_x'], 'y': current_y, 'width': unit_w_vert, 'height': unit_h_vert})
-            self.corridor_units.append({'x': ia['min_x'] + unit_w_vert, 'y': current_y, 'width': corridor_width, 'height': unit_h_vert})
-            self.outer_base_units.append({'x': ia['max_x'] - unit_w_vert, 'y': current_y, 'width': unit_w_vert, 'height': unit_h_vert})
-            self.corridor_units.append({'x': ia['max_x'] - unit_w_vert - corridor_width, 'y': current_y, 'width': corridor_width, 'height': unit_h_vert})
+        num_fitted_vertically = self._fit(available_height, unit_h_vert) if available_height >= unit_h_vert else 0
+        start_x = ia['min_x'] + nominal_stair_size + self._half(available_width - (num_fitted_horizontally * unit_w_horiz))
+        start_y = ia['min_y'] + nominal_stair_size + self._half(available_height - (num_fitted_vertically * unit_h_vert))
+        if num_fitted_horizontally > 0:
+            row = num_fitted_horizontally, (unit_w_horiz, 0)
+            self._add('outer_base', start_x, ia['min_y'], unit_w_horiz, unit_h_horiz, *row)
+            self._add('corridor', start_x, ia['min_y'] + unit_h_horiz, unit_w_horiz, corridor_width, *row)
+            self._add('outer_base', start_x, ia['max_y'] - unit_h_horiz, unit_w_horiz, unit_h_horiz, *row)
+            self._add('corridor', start_x, ia['max_y'] - unit_h_horiz - corridor_width, unit_w_horiz, corridor_width, *row)
+        if num_fitted_vertically > 0:
+            column = num_fitted_vertically, (0, unit_h_vert)
+            self._add('outer_base', ia['min_x'], start_y, unit_w_vert, unit_h_vert, *column)
+            self._add('corridor', ia['min_x'] + unit_w_vert, start_y, corridor_width, unit_h_vert, *column)
+            self._add('outer_base', ia['max_x'] - unit_w_vert, start_y, unit_w_vert, unit_h_vert, *column)
+            self._add('corridor', ia['max_x'] - unit_w_vert - corridor_width, start_y, corridor_width, unit_h_vert, *column)
 
     # MODIFICADO: Lógica de creación de escaleras simplificada para mayor robustez.
     def _calculate_units_forma_l(self, base_width, base_length, corridor_width, nominal_stair_size):
         ia = self.inner_area; self.central_area = None
-        su_tl, su_bl, su_br = None, None, None # Variables para controlar los límites de los brazos
+        su_tl, su_bl, su_br = None, None, None # Esquinas (x, y) de las escaleras, para controlar los límites de los brazos
         
         if nominal_stair_size > self.epsilon:
             # Colocar escalera Superior-Izquierda (TL) si cabe
             if ia['height'] >= nominal_stair_size:
-                su_tl = {'x': ia['min_x'], 'y': ia['max_y'] - nominal_stair_size, 'width': nominal_stair_size, 'height': nominal_stair_size, 'id': 'SU_TL'}
-                self.stair_units.append(su_tl)
+                su_tl = (ia['min_x'], ia['max_y'] - nominal_stair_size)
+                self._stair(*su_tl, nominal_stair_size, 'SU_TL')
 
             # Colocar escalera Inferior-Izquierda (BL) si cabe
             if ia['height'] >= nominal_stair_size and ia['width'] >= nominal_stair_size:
                 # Comprobar que no se solape con la TL si el área es muy baja
-                if not (su_tl and su_tl['y'] < ia['min_y'] + nominal_stair_size):
-                    su_bl = {'x': ia['min_x'], 'y': ia['min_y'], 'width': nominal_stair_size, 'height': nominal_stair_size, 'id': 'SU_BL'}
-                    self.stair_units.append(su_bl)
+                if not (su_tl and su_tl[1] < ia['min_y'] + nominal_stair_size):
+                    su_bl = (ia['min_x'], ia['min_y'])
+                    self._stair(*su_bl, nominal_stair_size, 'SU_BL')
 
             # Colocar escalera Inferior-Derecha (BR) si cabe
             if ia['width'] >= nominal_stair_size:
                 # Comprobar que no se solape con la BL si el área es muy estrecha
-                if not (su_bl and ia['max_x'] - nominal_stair_size < su_bl['x'] + su_bl['width']):
-                    su_br = {'x': ia['max_x'] - nominal_stair_size, 'y': ia['min_y'], 'width': nominal_stair_size, 'height': nominal_stair_size, 'id': 'SU_BR'}
-                    self.stair_units.append(su_br)
+                if not (su_bl and ia['max_x'] - nominal_stair_size < su_bl[0] + nominal_stair_size):
+                    su_br = (ia['max_x'] - nominal_stair_size, ia['min_y'])
+                    self._stair(*su_br, nominal_stair_size, 'SU_BR')
 
         unit_w_vert, unit_h_vert = base_width, base_length
         y_start_vert, y_end_vert = ia['min_y'] + (nominal_stair_size if su_bl else 0), ia['max_y'] - (nominal_stair_size if su_tl else 0)
         available_h_vert = y_end_vert - y_start_vert
-        if available_h_vert >= unit_h_vert:
-            for i in range(math.floor(available_h_vert / unit_h_vert)):
-                current_y = y_start_vert + (i * unit_h_vert)
-                self.outer_base_units.append({'x': ia['min_x'], 'y': current_y, 'width': unit_w_vert, 'height': unit_h_vert})
-                if ia['min_x'] + unit_w_vert + corridor_width <= (su_br['x'] if su_br else ia['max_x']):
-                    self.corridor_units.append({'x': ia['min_x'] + unit_w_vert, 'y': current_y, 'width': corridor_width, 'height': unit_h_vert})
+        if available_h_vert >= unit_h_vert and (count := self._fit(available_h_vert, unit_h_vert)) > 0:
+            self._add('outer_base', ia['min_x'], y_start_vert, unit_w_vert, unit_h_vert, count, (0, unit_h_vert))
+            if ia['min_x'] + unit_w_vert + corridor_width <= (su_br[0] if su_br else ia['max_x']):
+                self._add('corridor', ia['min_x'] + unit_w_vert, y_start_vert, corridor_width, unit_h_vert, count, (0, unit_h_vert))
         
         unit_w_horiz, unit_h_horiz = base_length, base_width
         x_start_horiz, x_end_horiz = ia['min_x'] + (nominal_stair_size if su_bl else 0), ia['max_x'] - (nominal_stair_size if su_br else 0)
         available_w_horiz = x_end_horiz - x_start_horiz
-        if available_w_horiz >= unit_w_horiz:
-            for i in range(math.floor(available_w_horiz / unit_w_horiz)):
-                current_x = x_start_horiz + (i * unit_w_horiz)
-                self.outer_base_units.append({'x': current_x, 'y': ia['min_y'], 'width': unit_w_horiz, 'height': unit_h_horiz})
-                if ia['min_y'] + unit_h_horiz + corridor_width <= (su_tl['y'] if su_tl else ia['max_y']):
-                    self.corridor_units.append({'x': current_x, 'y': ia['min_y'] + unit_h_horiz, 'width': unit_w_horiz, 'height': corridor_width})
+        if available_w_horiz >= unit_w_horiz and (count := self._fit(available_w_horiz, unit_w_horiz)) > 0:
+            self._add('outer_base', x_start_horiz, ia['min_y'], unit_w_horiz, unit_h_horiz, count, (unit_w_horiz, 0))
+            if ia['min_y'] + unit_h_horiz + corridor_width <= (su_tl[1] if su_tl else ia['max_y']):
+                self._add('corridor', x_start_horiz, ia['min_y'] + unit_h_horiz, unit_w_horiz, corridor_width, count, (unit_w_horiz, 0))
 
     def _calculate_units_forma_rectangular(self, base_width, base_length, corridor_width, nominal_stair_size):
         ia = self.inner_area
-        self.central_area, self.inner_base_units = None, []
+        self.central_area, stairs = None, False
         if nominal_stair_size > self.epsilon:
-            stair_y_start = ia['min_y'] + (ia['height'] - nominal_stair_size) / 2
+            stair_y_start = ia['min_y'] + self._half(ia['height'] - nominal_stair_size)
             if stair_y_start >= ia['min_y'] and (stair_y_start + nominal_stair_size) <= ia['max_y']:
-                self.stair_units.extend([
-                    {'x': ia['min_x'], 'y': stair_y_start, 'width': nominal_stair_size, 'height': nominal_stair_size, 'id': 'SU_L'},
-                    {'x': ia['max_x'] - nominal_stair_size, 'y': stair_y_start, 'width': nominal_stair_size, 'height': nominal_stair_size, 'id': 'SU_R'}])
-        x_start, x_end = ia['min_x'] + (nominal_stair_size if self.stair_units else 0), ia['max_x'] - (nominal_stair_size if self.stair_units else 0)
+                self._stair(ia['min_x'], stair_y_start, nominal_stair_size, 'SU_L')
+                self._stair(ia['max_x'] - nominal_stair_size, stair_y_start, nominal_stair_size, 'SU_R')
+                stairs = True
+        x_start, x_end = ia['min_x'] + (nominal_stair_size if stairs else 0), ia['max_x'] - (nominal_stair_size if stairs else 0)
         available_w = x_end - x_start
         unit_w, unit_h_base, unit_h_corridor = base_length, base_width, corridor_width
-        num_fitted = math.floor(available_w / unit_w) if available_w >= unit_w else 0
+        num_fitted = self._fit(available_w, unit_w) if available_w >= unit_w else 0
         if num_fitted > 0:
-            y_base_start = ia['min_y'] + (ia['height'] - (unit_h_base + unit_h_corridor)) / 2
+            y_base_start = ia['min_y'] + self._half(ia['height'] - (unit_h_base + unit_h_corridor))
             y_corridor_start = y_base_start + unit_h_base
             if y_base_start >= ia['min_y'] and (y_corridor_start + unit_h_corridor) <= ia['max_y']:
-                for i in range(num_fitted):
-                    current_x = x_start + (i * unit_w)
-                    self.outer_base_units.append({'x': current_x, 'y': y_base_start, 'width': unit_w, 'height': unit_h_base})
-                    self.corridor_units.append({'x': current_x, 'y': y_corridor_start, 'width': unit_w, 'height': unit_h_corridor})
+                self._add('outer_base', x_start, y_base_start, unit_w, unit_h_base, num_fitted, (unit_w, 0))
+                self._add('corridor', x_start, y_corridor_start, unit_w, unit_h_corridor, num_fitted, (unit_w, 0))
+
+# --- Conteo sin unidades ---
+LAYOUT_TYPES = ("cuadrada", "forma_l", "forma_rectangular")
+
+def _check_dimensions(base_width, base_length, corridor_width, stair_size):
+    if not all(d > 0 for d in [base_width, base_length, corridor_width]) or stair_size < 0: raise ValueError("Dimensiones deben ser > 0 (stair_size >= 0).")
+
+def _clamped_stair(width, height, stair_size, layout_type, half=lambda value: value / 2):
+    # Lado de escalera que usan los generadores: el pedido, recortado a max_dim_stair según el tipo, y 0 si no llega
+    # a epsilon (arrays que se difunden)
+    epsilon = _UnitGenerator.epsilon
+    if layout_type == "cuadrada": max_dim_stair = np.minimum(half(width), half(height))
+    elif layout_type == "forma_l": max_dim_stair = np.minimum(width, height)
+    else: max_dim_stair = np.minimum(half(width), height)
+    stair_size = np.where((stair_size > epsilon) & (stair_size > max_dim_stair), max_dim_stair, stair_size)
+    return np.where(stair_size > epsilon, stair_size, np.zeros((), dtype=np.result_type(stair_size)))
+
+def count_units(inner_area, base_width, base_length, corridor_width, stair_size, layout_type="cuadrada", fixed_point=False):
+    # Cuántas unidades de cada tipo daría layout_units, sin generarlas: son las mismas comparaciones, floor y mitades
+    # de _UnitGenerator (en el mismo orden, así que el redondeo coincide), escritas sobre arrays. Los valores de
+    # inner_area y las dimensiones pueden ser arrays que se difunden entre sí; las combinaciones con dimensiones no
+    # válidas cuentan 0. Devuelve {tipo: array int64}
+    if layout_type not in LAYOUT_TYPES: raise ValueError("Tipo de disposición no reconocido.")
+    min_x, min_y, max_x, max_y, width, height = (np.asarray(inner_area[key], dtype=np.float64) for key in ('min_x', 'min_y', 'max_x', 'max_y', 'width', 'height'))
+    bw, bl, cw, stair = (np.asarray(v, dtype=np.float64) for v in (base_width, base_length, corridor_width, stair_size))
+    valid = (bw > 0) & (bl > 0) & (cw > 0) & (stair >= 0)
+    if fixed_point:
+        # Igual que fixed_box y to_fixed: caja redondeada hacia dentro y dimensiones al milímetro, todo entero
+        scale = FIXED_POINT_SCALE
+        min_x, min_y = (np.ceil(v * scale - 1e-6).astype(np.int64) for v in (min_x, min_y))
+        max_x, max_y = (np.floor(v * scale + 1e-6).astype(np.int64) for v in (max_x, max_y))
+        width, height = max_x - min_x, max_y - min_y
+        bw, bl, cw, stair = (np.round(v * scale).astype(np.int64) for v in (bw, bl, cw, stair))
+        valid &= (bw > 0) & (bl > 0) & (cw > 0)
+        bw, bl, cw = (np.where(valid, v, 1) for v in (bw, bl, cw))
+        fit, half = (lambda available, unit: available // unit), (lambda value: value // 2)
+    else:
+        bw, bl, cw = (np.where(valid, v, 1.0) for v in (bw, bl, cw))
+        fit, half = (lambda available, unit: np.floor(available / unit)), (lambda value: value / 2)
+    epsilon, zero = _UnitGenerator.epsilon, np.zeros((), dtype=width.dtype)
+    n = _clamped_stair(width, height, stair, layout_type, half); has_stairs = n > epsilon
+    if layout_type == "cuadrada":
+        available_width, available_height = width - (2 * n), height - (2 * n)
+        rows = np.where(available_width >= bl, fit(available_width, bl), 0) + np.where(available_height >= bl, fit(available_height, bl), 0)
+        base, corridor, stairs = 2 * rows, 2 * rows, 4 * has_stairs
+    elif layout_type == "forma_l":
+        tl = has_stairs & (height >= n)
+        bl_ = has_stairs & (height >= n) & (width >= n) & ~(tl & (max_y - n < min_y + n))
+        br = has_stairs & (width >= n) & ~(bl_ & (max_x - n < min_x + n))
+        available_v = (max_y - np.where(tl, n, zero)) - (min_y + np.where(bl_, n, zero))
+        vertical = np.where(available_v >= bl, fit(available_v, bl), 0)
+        available_h = (max_x - np.where(br, n, zero)) - (min_x + np.where(bl_, n, zero))
+        horizontal = np.where(available_h >= bl, fit(available_h, bl), 0)
+        base = vertical + horizontal
+        corridor = np.where(min_x + bw + cw <= np.where(br, max_x - n, max_x), vertical, 0) + np.where(min_y + bw + cw <= np.where(tl, max_y - n, max_y), horizontal, 0)
+        stairs = tl.astype(np.int64) + bl_ + br
+    else:
+        stair_y_start = min_y + half(height - n)
+        placed = has_stairs & (stair_y_start >= min_y) & (stair_y_start + n <= max_y)
+        available_w = (max_x - np.where(placed, n, zero)) - (min_x + np.where(placed, n, zero))
+        fitted = np.where(available_w >= bl, fit(available_w, bl), 0)
+        y_base_start = min_y + half(height - (bw + cw))
+        fits = (fitted > 0) & (y_base_start >= min_y) & (y_base_start + bw + cw <= max_y)
+        base = corridor = np.where(fits, fitted, 0); stairs = 2 * placed
+    counts = {'outer_base': base, 'inner_base': np.zeros_like(base), 'corridor': corridor, 'stair': stairs}
+    return {kind: np.where(valid, count, 0).astype(np.int64) for kind, count in counts.items()}
+
+def verify_count_units(samples=20_000, seed=0):
+    # Compara count_units con los generadores en combinaciones aleatorias, muchas en el límite (el área justa para k
+    # unidades, decimales como 0.1 · 600 que no son exactos en binario) y mide cuántas se cuentan por segundo
+    rng = np.random.default_rng(seed)
+    dims = rng.choice([2.5, 3.0, 4.0, 6.0, 7.5, 0.1 * 60, 10.0, 12.0], size=(samples, 3)); stair = rng.choice([0.0, 0.3, 5.0, 10.0, 0.1 * 90, 40.0], samples)
+    k = rng.integers(0, 25, size=(samples, 2)); jitter = rng.choice([0.0, 1e-12, -1e-12, 1e-4, -1e-4, 0.5], size=(samples, 2))
+    width, height = k[:, 0] * dims[:, 1] + 2 * stair + jitter[:, 0], k[:, 1] * dims[:, 1] + 2 * stair + jitter[:, 1]
+    random_size = rng.random(samples) < 0.3
+    width[random_size], height[random_size] = rng.uniform(0, 300, (2, int(random_size.sum())))
+    width, height = np.maximum(width, 0.01), np.maximum(height, 0.01)
+    min_x, min_y = rng.choice([0.0, 0.1 * 3, 12.7, 1.15, 500000.3], samples), rng.choice([0.0, 0.7 * 3, 0.2, 4470000.9], samples)
+    boxes = {'min_x': min_x, 'min_y': min_y, 'max_x': min_x + width, 'max_y': min_y + height, 'width': width, 'height': height}
+    mismatches, elapsed = [], 0.0
+    for layout_type in LAYOUT_TYPES:
+        for fixed_point in (False, True):
+            t0 = time.perf_counter(); counts = count_units(boxes, dims[:, 0], dims[:, 1], dims[:, 2], stair, layout_type, fixed_point); elapsed += time.perf_counter() - t0
+            for i in range(samples):
+                box = {key: float(value[i]) for key, value in boxes.items()}
+                units = layout_units(box, dims[i, 0], dims[i, 1], dims[i, 2], stair[i], layout_type, fixed_point)['units']
+                expected = tuple(units.count(kind) for kind in UNIT_KINDS); got = tuple(int(counts[kind][i]) for kind in UNIT_KINDS)
+                if expected != got: mismatches.append({'layout_type': layout_type, 'fixed_point': fixed_point, 'inner_area': box, 'dims': (*dims[i].tolist(), float(stair[i])), 'expected': expected, 'counted': got})
+    checked = samples * len(LAYOUT_TYPES) * 2
+    return {'checked': checked, 'mismatches': mismatches, 'per_second': checked / elapsed if elapsed > 0 else float('inf')}
+
+# --- Disposición como función pura ---
+UNIT_LISTS = tuple(f'{kind}_units' for kind in UNIT_KINDS)  # las listas de dicts de compatibilidad (Layout, KMLProcessor)
+
+class LayoutParams(NamedTuple):
+    # Todo lo que decide una disposición además de la parcela. terrain: caja del terreno redimensionado a mano
+    # (None usa el polígono real)
+    offset: float
+    base_width: float
+    base_length: float
+    corridor_width: float
+    stair_size: float
+    layout_type: str = "cuadrada"
+    rules: SetbackRules = None
+    source: str = 'bbox'
+    clip_mode: str = 'drop'
+    fixed_point: bool = False
+    terrain: dict = None
+
+class ParcelGeometry(NamedTuple):
+    # La parcela ya preparada por KMLProcessor: polígono en el marco de cálculo, marco (None: ejes del mundo),
+    # caja en ese marco y linderos compilados
+    polygon: np.ndarray
+    frame: dict
+    bounding_box: dict
+    setbacks: object
+
+class Layout(NamedTuple):
+    # Resultado inmutable de compute_layout: cajas como MappingProxyType, listas como tuplas y unidades en una
+    # UnitTable de solo lectura (fixed_units: la misma en mm enteros con fixed_point), para poder compartirlo entre
+    # hilos, cachearlo y compararlo. Las listas *_units de antes siguen disponibles como dicts recién creados
+    params: LayoutParams
+    terrain: object
+    inner_area: object
+    inner_polygons: tuple
+    pieces: tuple
+    units: UnitTable
+    central_area: object
+    clipped_units: object
+    fixed_units: UnitTable
+    message: str
+
+    @property
+    def base_units(self): return self.units.count('outer_base') + self.units.count('inner_base')
+
+    @property
+    def outer_base_units(self): return self.units.records('outer_base')
+
+    @property
+    def inner_base_units(self): return self.units.records('inner_base')
+
+    @property
+    def corridor_units(self): return self.units.records('corridor')
+
+    @property
+    def stair_units(self): return self.units.records('stair')
+
+    def __eq__(self, other):
+        # Igualdad campo a campo; los arrays (anillos, unidades en mm) se comparan elemento a elemento
+        return isinstance(other, Layout) and all(_same(a, b) for a, b in zip(self, other))
+
+    def __ne__(self, other): return not self == other
+    __hash__ = None
+
+def _same(a, b):
+    if isinstance(a, np.ndarray) or isinstance(b, np.ndarray): return isinstance(a, np.ndarray) and isinstance(b, np.ndarray) and a.shape == b.shape and bool(np.array_equal(a, b))
+    if isinstance(a, (tuple, list)) and isinstance(b, (tuple, list)): return len(a) == len(b) and all(_same(x, y) for x, y in zip(a, b))
+    if isinstance(a, (dict, MappingProxyType)) and isinstance(b, (dict, MappingProxyType)): return a.keys() == b.keys() and all(_same(a[key], b[key]) for key in a)
+    return a == b
+
+# Los Layout viajan entre procesos: MappingProxyType se serializa como el dict que envuelve
+def _mapping_proxy(mapping): return MappingProxyType(mapping)
+copyreg.pickle(MappingProxyType, lambda proxy: (_mapping_proxy, (dict(proxy),)))
+
+def _frozen(value):
+    if isinstance(value, dict): return MappingProxyType({key: _frozen(item) for key, item in value.items()})
+    if isinstance(value, list): return tuple(_frozen(item) for item in value)
+    if isinstance(value, np.ndarray): value = value.copy(); value.flags.writeable = False
+    if isinstance(value, UnitTable): value = value.readonly()
+    return value
+
+def compute_inner_area(geometry, offset, rules=None, source='bbox', terrain=None, inset=None):
+    # Área interna sobre el polígono real (terrain None) o sobre una caja de terreno. inset(rules) devuelve los
+    # anillos del retranqueo en el marco de cálculo (por defecto se calculan con geometry.setbacks). Devuelve
+    # (inner_area, inner_polygons, pieces, mensaje); ValueError con el mensaje si no hay área interna
+    if source not in ('bbox', 'rectangle', 'pieces'): raise ValueError(f"Origen de área interna desconocido: {source}")
+    rules = (rules or SetbackRules()).resolved(offset)
+    if offset < 0 or min(rules) < 0: raise ValueError("Offset >= 0")
+    if terrain is None and geometry.polygon is not None:
+        # Con el polígono real, el área interna es la caja del retranqueo (ajustada a la forma del lote)
+        if inset is not None: inner_polygons = inset(rules)
+        elif geometry.setbacks is None: inner_polygons = []
+        else: inner_polygons = [to_local(ring, geometry.frame) if geometry.frame is not None else ring for ring in geometry.setbacks.inset(rules)]
+        if not inner_polygons: raise ValueError("Offset grande, área interna inválida.")
+        if source == 'rectangle':
+            inner_area = largest_inscribed_rectangle(inner_polygons)
+            if not inner_area: raise ValueError("No cabe un rectángulo en el área interna.")
+            return inner_area, inner_polygons, None, "Área interna calculada (rectángulo inscrito)"
+        if source == 'pieces':
+            if not all(is_rectilinear(ring) for ring in inner_polygons): raise ValueError("El área interna no es rectilínea (pruebe a orientar).")
+            pieces = rectilinear_pieces(inner_polygons)
+            return bounding_box_of(np.concatenate(inner_polygons)), inner_polygons, pieces, f"Área interna calculada ({len(pieces)} pieza{'s' if len(pieces) != 1 else ''})"
+        return bounding_box_of(np.concatenate(inner_polygons)), inner_polygons, None, "Área interna calculada"
+    bb = terrain if terrain is not None else geometry.bounding_box
+    if len(set(rules)) > 1:
+        # Terreno redimensionado a mano con linderos distintos: se retranquea el rectángulo como polígono
+        box = np.array([[bb['min_x'], bb['min_y']], [bb['max_x'], bb['min_y']], [bb['max_x'], bb['max_y']], [bb['min_x'], bb['max_y']]])
+        polygons = ParcelSetbacks(box).inset(rules) if bb['width'] > 0 and bb['height'] > 0 else []
+        if not polygons: raise ValueError("Offset grande, área interna inválida.")
+        return bounding_box_of(np.concatenate(polygons)), None, None, "Área interna calculada"
+    offset = rules.frontage
+    inner_width = bb['width'] - 2 * offset; inner_height = bb['height'] - 2 * offset
+    if inner_width <= 0 or inner_height <= 0: raise ValueError("Offset grande, área interna inválida.")
+    inner_area = {'min_x': bb['min_x'] + offset, 'max_x': bb['max_x'] - offset, 'min_y': bb['min_y'] + offset, 'max_y': bb['max_y'] - offset, 'width': inner_width, 'height': inner_height}
+    return inner_area, None, None, "Área interna calculada"
+
+def layout_units(inner_area, base_width, base_length, corridor_width, stair_size, layout_type="cuadrada", fixed_point=False, cache=None):
+    # Unidades de una disposición sobre una caja: dict con 'units' (UnitTable en metros), 'central_area' y, con
+    # fixed_point, 'fixed_units' (la misma tabla en mm enteros). ValueError si las dimensiones o el tipo no valen.
+    # Con una LayoutCache se reutiliza la disposición de otra caja del mismo tamaño
+    _check_dimensions(base_width, base_length, corridor_width, stair_size)
+    if cache is not None: return cache.layout_units(inner_area, base_width, base_length, corridor_width, stair_size, layout_type, fixed_point)
+    if fixed_point:
+        # Todo a milímetros enteros: los generadores cuentan con división entera y centran al milímetro
+        inner_area = fixed_box(inner_area)
+        base_width, base_length, corridor_width, stair_size = (to_fixed(v) for v in (base_width, base_length, corridor_width, stair_size))
+        if min(base_width, base_length, corridor_width) <= 0: raise ValueError("Dimensiones deben ser >= 1 mm.")
+    generator = _UnitGenerator(inner_area, fixed_point)
+    if not generator._layout_units(base_width, base_length, corridor_width, stair_size, layout_type): raise ValueError("Tipo de disposición no reconocido.")
+    units, fixed_units = generator.table(), None
+    if fixed_point:
+        # Se guardan como enteros (int32 si caben) y la tabla en metros se obtiene de ellos
+        fixed_units = units.astype(fixed_dtype(units.spans.extents())); units = fixed_units.to_meters()
+    return {'units': units, 'central_area': generator.central_area, 'fixed_units': fixed_units}
+
+# --- Caché de disposiciones ---
+LAYOUT_ALGORITHM_VERSION = 1  # súbase al cambiar los generadores: las claves de LayoutCache dejan de coincidir
+
+class LayoutCache:
+    # Caché LRU en memoria de layout_units. Los generadores solo dependen del ancho y alto de la caja y de los
+    # parámetros; la posición es una traslación. Cada entrada guarda la disposición sobre la caja en el origen y un
+    # acierto solo suma la esquina de la caja a los orígenes de las filas. Clave: (versión, fixed_point, tamaño
+    # cuantizado, parámetros, tipo). Con fixed_point el tamaño es el de fixed_box en mm y el resultado es idéntico
+    # al de layout_units. En metros, el tamaño se redondea hacia abajo a `quantum` (nunca por encima del real: la caja
+    # local cabe en la de la llamada): las unidades no salen de la caja, pero pueden quedar a menos de quantum de donde
+    # caerían sin caché. Un acierto es la disposición en el origen trasladada: lejos del origen, layout_units sin caché
+    # resta coordenadas absolutas (x_end - x_start) y su redondeo puede perder una unidad en el límite de un brazo que
+    # la caché conserva. max_bytes limita la memoria de las tablas (las entradas menos usadas salen primero)
+    def __init__(self, max_bytes=64 * 2**20, quantum=1e-3):
+        if quantum <= 0: raise ValueError("quantum debe ser > 0.")
+        self.max_bytes, self.quantum = max_bytes, quantum
+        # Pasos por metro si 1/quantum es entero: size / steps es el decimal exacto (39800 / 1000 == 39.8, mientras
+        # que 39800 * 1e-3 == 39.800000000000004)
+        steps = round(1 / quantum); self._steps = steps if steps and abs(1 / quantum - steps) < 1e-9 else None
+        self.hits = self.misses = self.evictions = self.bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()  # compute_layout puede llamarse desde varios hilos
+
+    def __len__(self): return len(self._entries)
+
+    def key(self, inner_area, base_width, base_length, corridor_width, stair_size, layout_type="cuadrada", fixed_point=False):
+        if fixed_point: box = fixed_box(inner_area); size = (box['width'], box['height'])
+        else: size = tuple(self._quantize(inner_area[key]) for key in ('width', 'height'))
+        return (LAYOUT_ALGORITHM_VERSION, bool(fixed_point), None if fixed_point else self.quantum, *size, *(float(v) for v in (base_width, base_length, corridor_width, stair_size)), layout_type)
+
+    def _length(self, size): return size / self._steps if self._steps else size * self.quantum
+
+    def _quantize(self, length):
+        # Múltiplo de quantum más cercano por debajo; la tolerancia absorbe el ruido de 39.8 / 1e-3, pero si el
+        # tamaño redondeado acaba por encima de la longitud real se baja un paso
+        size = math.floor(length / self.quantum + 1e-6)
+        return size - 1 if self._length(size) > length else size
+
+    def layout_units(self, inner_area, base_width, base_length, corridor_width, stair_size, layout_type="cuadrada", fixed_point=False):
+        # Como layout_units; las tablas devueltas comparten con la entrada todo salvo los orígenes trasladados
+        key = self.key(inner_area, base_width, base_length, corridor_width, stair_size, layout_type, fixed_point)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None: self._entries.move_to_end(key); self.hits += 1
+            else: self.misses += 1
+        if entry is None:
+            width, height = (size / FIXED_POINT_SCALE if fixed_point else self._length(size) for size in key[3:5])
+            local = layout_units({'min_x': 0.0, 'min_y': 0.0, 'max_x': width, 'max_y': height, 'width': width, 'height': height}, base_width, base_length, corridor_width, stair_size, layout_type, fixed_point)
+            # Con fixed_point se guarda la tabla en mm (la de metros sale de ella al trasladar)
+            table = (local['fixed_units'] if fixed_point else local['units']).readonly()
+            entry = (table, _frozen(local['central_area']), table.nbytes)
+            with self._lock:
+                if key not in self._entries:
+                    self._entries[key] = entry; self.bytes += entry[2]
+                    while self.bytes > self.max_bytes and len(self._entries) > 1:
+                        _, (_, _, size) = self._entries.popitem(last=False); self.bytes -= size; self.evictions += 1
+        table, central_area, _ = entry
+        if fixed_point:
+            # La entrada guarda int32 si sus coordenadas en el origen caben; el tipo se elige otra vez con la caja
+            # trasladada, como en layout_units (en coordenadas UTM los mm no caben en int32)
+            box = fixed_box(inner_area); extent = table.extent()
+            limits = [] if extent is None else [int(extent[f'{end}_{axis}']) + box[f'min_{axis}'] for end in ('min', 'max') for axis in 'xy']
+            fixed_units = table.astype(fixed_dtype(limits)).translated(box['min_x'], box['min_y']); units = fixed_units.to_meters()
+            dx, dy = box['min_x'] / FIXED_POINT_SCALE, box['min_y'] / FIXED_POINT_SCALE
+        else: dx, dy = inner_area['min_x'], inner_area['min_y']; fixed_units = None; units = table.translated(dx, dy)
+        if central_area is not None:
+            central_area = dict(central_area, min_x=central_area['min_x'] + dx, max_x=central_area['max_x'] + dx, min_y=central_area['min_y'] + dy, max_y=central_area['max_y'] + dy)
+        return {'units': units, 'central_area': central_area, 'fixed_units': fixed_units}
+
+    def clear(self):
+        with self._lock: self._entries.clear(); self.bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hits / lookups if lookups else 0.0, 'evictions': self.evictions,
+                    'entries': len(self._entries), 'bytes': self.bytes, 'max_bytes': self.max_bytes}
+
+def clip_units(units, rings, mode='drop'):
+    # Con el polígono real, las unidades generadas en la caja se prueban todas de una vez contra el retranqueo.
+    # Devuelve tablas nuevas ('drop' quita las de fuera, 'flag' rellena la columna outside; fixed_units igual) y lo
+    # que quedó fuera por grupo
+    table, fixed = units['units'], units['fixed_units']
+    if rings is None or not mode or not len(table): return units, {}
+    keep = units_in_polygon(table, rings)
+    outside = np.bincount(table.kind[~keep], minlength=len(UNIT_KINDS))
+    clipped = {kind: int(count) for kind, count in zip(UNIT_KINDS, outside)}
+    if mode == 'drop': table, fixed = table.take(keep), fixed.take(keep) if fixed is not None else None
+    else: table, fixed = table.flagged(~keep), fixed.flagged(~keep) if fixed is not None else None
+    return dict(units, units=table, fixed_units=fixed), clipped
+
+def place_units(inner_area, inner_polygons, pieces, base_width, base_length, corridor_width, stair_size, layout_type="cuadrada", fixed_point=False, clip_mode='drop', workers=None, cache=None):
+    # Unidades sobre un área interna ya calculada (por piezas si las hay) y recorte contra el retranqueo.
+    # Devuelve (unidades como en layout_units, {grupo: fuera}, mensaje)
+    if pieces:
+        if layout_type not in LAYOUT_TYPES: raise ValueError("Tipo de disposición no reconocido.")
+        _check_dimensions(base_width, base_length, corridor_width, stair_size)
+        units = {'units': layout_pieces(pieces, base_width, base_length, corridor_width, stair_size, layout_type, workers, fixed_point=fixed_point, cache=cache), 'central_area': None, 'fixed_units': None}
+    else: units = layout_units(inner_area, base_width, base_length, corridor_width, stair_size, layout_type, fixed_point, cache)
+    units, clipped = clip_units(units, inner_polygons, clip_mode)
+    total = sum(clipped.values())
+    if total: return units, clipped, f"Cálculo de unidades completado ({total} fuera del retranqueo {'descartadas' if clip_mode == 'drop' else 'marcadas'})."
+    return units, clipped, "Cálculo de unidades completado."
+
+def compute_layout(geometry, params, inset=None, workers=None, cache=None):
+    # Parcela preparada + parámetros → Layout inmutable. No lee ni escribe estado compartido (salvo la LayoutCache
+    # opcional, que tiene su cerrojo), así que varias disposiciones pueden calcularse a la vez en hilos o procesos.
+    # ValueError con el mensaje si no es posible. La caja de terreno se copia congelada en los parámetros del resultado
+    if params.terrain is not None: params = params._replace(terrain=_frozen(dict(params.terrain)))
+    inner_area, inner_polygons, pieces, _ = compute_inner_area(geometry, params.offset, params.rules, params.source, params.terrain, inset)
+    units, clipped, message = place_units(inner_area, inner_polygons, pieces, params.base_width, params.base_length, params.corridor_width, params.stair_size, params.layout_type, params.fixed_point, params.clip_mode, workers, cache)
+    terrain = params.terrain if params.terrain is not None else geometry.bounding_box
+    return Layout(params, _frozen(dict(terrain)), _frozen(dict(inner_area)), _frozen(list(inner_polygons)) if inner_polygons is not None else None,
+                  _frozen(list(pieces)) if pieces else None, _frozen(units['units']), _frozen(units['central_area']), _frozen(clipped), _frozen(units['fixed_units']), message)
+
+# --- Barrido de parámetros ---
+SWEEP_AXES = ('base_width', 'base_length', 'corridor_width', 'stair_size', 'offset', 'layout_type')
+
+class SweepResult(NamedTuple):
+    # Resultado de parameter_sweep: counts[ancho, largo, pasillo, escalera, offset, tipo, clase] con los valores de
+    # cada eje en axes ((nombre, valores), ...) y la clase de unidad (UNIT_KINDS) en el último eje. exact (misma forma
+    # sin la clase) es False donde el recorte contra el retranqueo podría quitar unidades: ahí el conteo es una cota
+    # superior. inner_areas[offset]: la caja usada (None si el offset no deja área)
+    axes: tuple
+    counts: np.ndarray
+    exact: np.ndarray
+    inner_areas: tuple
+
+    @property
+    def base_units(self): return self.count('outer_base') + self.count('inner_base')
+
+    @property
+    def shape(self): return self.counts.shape[:-1]
+
+    def axis(self, name): return dict(self.axes)[name]
+
+    def count(self, kind): return self.counts[..., UNIT_KINDS.index(kind)]
+
+    def select(self, **labels):
+        # Fija uno o varios ejes por valor (select(layout_type='forma_l', offset=5)) y los quita del resultado
+        names = [name for name, _ in self.axes]
+        if unknown := set(labels) - set(names): raise KeyError(f"Ejes desconocidos: {sorted(unknown)}")
+        index = []
+        for name, values in self.axes:
+            if name not in labels: index.append(slice(None)); continue
+            found = [i for i, value in enumerate(values) if value == labels[name]]
+            if not found: raise KeyError(f"{name}={labels[name]!r} no está en el barrido")
+            index.append(found[0])
+        index = tuple(index)
+        return SweepResult(tuple(axis for axis in self.axes if axis[0] not in labels), self.counts[index], self.exact[index], self.inner_areas)
+
+    def best(self, top=1):
+        # Las `top` combinaciones con más unidades base (a igualdad, la primera del barrido), como dicts con el
+        # valor de cada eje, los conteos por clase y si el conteo es exacto
+        base = self.base_units.ravel(); rows = []
+        for flat in np.argsort(-base, kind='stable')[:top]:
+            index = np.unravel_index(flat, self.shape)
+            row = {name: (values[i].item() if isinstance(values, np.ndarray) else values[i]) for (name, values), i in zip(self.axes, index)}
+            row.update(base_units=int(base[flat]), counts={kind: int(count) for kind, count in zip(UNIT_KINDS, self.counts[index])}, exact=bool(self.exact[index]))
+            rows.append(row)
+        return rows
+
+def _box_inside(inner_area, inner_polygons, source):
+    # La caja está dentro del retranqueo con el rectángulo inscrito o si el retranqueo la llena entera
+    return inner_polygons is None or source == 'rectangle' or math.isclose(sum(abs(signed_area(ring)) for ring in inner_polygons), inner_area['width'] * inner_area['height'], rel_tol=1e-9)
+
+def _rows_fit(inner_area, base_width, corridor_width, layout_type):
+    # Los generadores no miran el fondo de las filas: si unidad + pasillo (en L, la unidad) no caben en la caja,
+    # el recorte quitará las que sobresalen. Las escaleras y la forma rectangular quedan siempre dentro. Admite
+    # vectores (parameter_sweep)
+    if layout_type == "cuadrada": return base_width + corridor_width <= np.minimum(inner_area['width'], inner_area['height'])
+    if layout_type == "forma_l": return base_width <= np.minimum(inner_area['width'], inner_area['height'])
+    return np.ones((), dtype=bool)
+
+def _clip_free(counts, inner_area, inner_polygons, source, base_width, corridor_width, layout_type):
+    # True si el recorte contra el retranqueo no puede quitar ninguna de las unidades de count_units
+    return bool(_box_inside(inner_area, inner_polygons, source) and (_rows_fit(inner_area, base_width, corridor_width, layout_type) or counts['outer_base'] + counts['corridor'] == 0))
+
+def parameter_sweep(geometry, base_widths, base_lengths, corridor_widths, stair_sizes, offsets, layout_types=LAYOUT_TYPES, rules=None, source='bbox', terrain=None, fixed_point=False, inset=None):
+    # Todas las combinaciones de los vectores de parámetros en una pasada: el área interna se calcula una vez por
+    # offset (compute_inner_area) y count_units cuenta cada tipo de disposición difundiendo anchos × largos ×
+    # pasillos × escaleras × offsets, con el mismo recorte de escaleras (max_dim_stair) que calculate_units.
+    # Las piezas no tienen forma cerrada (dependen de los bordes compartidos): ValueError con source='pieces'
+    if source == 'pieces': raise ValueError("El barrido de parámetros no admite piezas (use 'bbox' o 'rectangle').")
+    layout_types = tuple(layout_types)
+    for layout_type in layout_types:
+        if layout_type not in LAYOUT_TYPES: raise ValueError(f"Tipo de disposición no reconocido: {layout_type}")
+    vectors = [np.asarray(values, dtype=np.float64).ravel() for values in (base_widths, base_lengths, corridor_widths, stair_sizes, offsets)]
+    inner_areas, clipped, inside = [], [], []
+    for offset in vectors[4]:
+        try: inner_area, inner_polygons, _, _ = compute_inner_area(geometry, float(offset), rules, source, terrain, inset)
+        except ValueError: inner_areas.append(None); clipped.append(False); inside.append(True); continue
+        inner_areas.append(inner_area); clipped.append(inner_polygons is not None)
+        inside.append(_box_inside(inner_area, inner_polygons, source))
+    valid, clipped, inside = (np.array(flags).reshape(1, 1, 1, 1, -1) for flags in ([inner_area is not None for inner_area in inner_areas], clipped, inside))
+    boxes = {key: np.array([inner_area[key] if inner_area else 0.0 for inner_area in inner_areas]) for key in ('min_x', 'min_y', 'max_x', 'max_y', 'width', 'height')}
+    # Cada vector en su eje: (W, 1, 1, 1, 1), (1, L, 1, 1, 1), ... y las cajas en el eje de offsets
+    grid = [vector.reshape([-1 if axis == position else 1 for axis in range(5)]) for position, vector in enumerate(vectors)]
+    boxes = {key: values.reshape(1, 1, 1, 1, -1) for key, values in boxes.items()}
+    counts = np.zeros(tuple(len(vector) for vector in vectors) + (len(layout_types), len(UNIT_KINDS)), dtype=np.int64)
+    exact = np.zeros(counts.shape[:-1], dtype=bool)
+    bw, cw = grid[0], grid[2]
+    for position, layout_type in enumerate(layout_types):
+        result = count_units(boxes, *grid[:4], layout_type, fixed_point)
+        for k, kind in enumerate(UNIT_KINDS): counts[..., position, k] = np.where(valid, result[kind], 0)
+        fits = _rows_fit(boxes, bw, cw, layout_type)
+        exact[..., position] = ~valid | ~clipped | (inside & (fits | (result['outer_base'] + result['corridor'] == 0)))
+    axes = tuple(zip(SWEEP_AXES, vectors + [layout_types]))
+    return SweepResult(axes, counts, exact, tuple(_frozen(inner_area) for inner_area in inner_areas))
+
+# --- Frente de Pareto ---
+PARETO_OBJECTIVES = {'base_units': 1, 'corridor_area': -1, 'open_space': 1}  # 1: maximizar, -1: minimizar
+
+def pareto_indices(points):
+    # Índices (crecientes) de los puntos no dominados de una matriz N×2 o N×3, maximizando todas las columnas; de
+    # los puntos repetidos queda el primero. Barrido de Kung, O(n log n): por la primera columna de mayor a menor
+    # un punto solo puede estar dominado por los anteriores. En 2-D basta el máximo acumulado de la segunda columna;
+    # en 3-D la escalera de las otras dos
+    points = np.asarray(points, dtype=np.float64)
+    if points.ndim != 2 or points.shape[1] not in (2, 3): raise ValueError("Se esperan puntos N×2 o N×3.")
+    if not len(points): return np.empty(0, dtype=np.intp)
+    order = np.lexsort(tuple(-points[:, column] for column in reversed(range(points.shape[1]))))
+    if points.shape[1] == 2:
+        second = points[order, 1]
+        best = np.maximum.accumulate(np.concatenate(([-np.inf], second[:-1])))
+        return np.sort(order[second > best])
+    staircase, keep = _Staircase(), []
+    for index, (b, c) in zip(order.tolist(), points[order, 1:].tolist()):
+        if staircase.insert(b, c): keep.append(index)
+    return np.sort(np.array(keep, dtype=np.intp))
+
+class _Staircase:
+    # Frente 2-D (maximizando) ordenado por la primera coordenada: la segunda decrece estrictamente, así que una
+    # búsqueda binaria dice si un punto está dominado y los puntos que él domina forman un tramo contiguo
+    __slots__ = ('first', 'negated', 'items')
+
+    def __init__(self): self.first, self.negated, self.items = [], [], []
+
+    def __len__(self): return len(self.first)
+
+    def insert(self, a, b, item=None):
+        # Añade (a, b) si ningún punto lo domina (ni lo iguala) y quita los que domina; True si ha entrado
+        index = bisect.bisect_left(self.first, a)
+        if index < len(self.first) and -self.negated[index] >= b: return False
+        end = index + 1 if index < len(self.first) and self.first[index] == a else index
+        start = bisect.bisect_left(self.negated, -b, 0, index)
+        self.first[start:end] = [a]; self.negated[start:end] = [-b]; self.items[start:end] = [item]
+        return True
+
+class ParetoArchive:
+    # Archivo incremental de puntos no dominados con 2 o 3 objetivos (senses: 1 maximizar, -1 minimizar) y un
+    # elemento asociado a cada punto. En 2-D cada punto del lote que sobrevive a Kung entra en la escalera con
+    # búsquedas binarias; en 3-D el lote se une al frente y se vuelve a filtrar con Kung: O(n log n) en ambos casos
+    def __init__(self, senses):
+        self.senses = np.asarray(senses, dtype=np.float64)
+        if self.senses.shape not in ((2,), (3,)) or not np.all(np.abs(self.senses) == 1): raise ValueError("senses: 2 o 3 valores 1/-1.")
+        self._staircase = _Staircase() if len(self.senses) == 2 else None
+        self._points, self._items = np.empty((0, len(self.senses))), []
+
+    def __len__(self): return len(self._staircase) if self._staircase is not None else len(self._items)
+
+    def add(self, points, items):
+        # Añade un lote (N×k objetivos y N elementos); devuelve cuántos puntos nuevos han entrado en el frente
+        points = np.asarray(points, dtype=np.float64).reshape(-1, len(self.senses)) * self.senses
+        if len(items) != len(points): raise ValueError("Un elemento por punto.")
+        survivors = pareto_indices(points)
+        if self._staircase is not None:
+            return sum(self._staircase.insert(a, b, items[index]) for index, (a, b) in zip(survivors.tolist(), points[survivors].tolist()))
+        combined = np.concatenate((self._points, points[survivors])); items = self._items + [items[index] for index in survivors.tolist()]
+        # El frente va primero: ante un empate gana el punto que ya estaba
+        keep = pareto_indices(combined); added = int(np.count_nonzero(keep >= len(self._points)))
+        self._points, self._items = combined[keep], [items[index] for index in keep.tolist()]
+        return added
+
+    def front(self):
+        # [(objetivos, elemento), ...] con los objetivos en su sentido original, del mejor al peor en el primero
+        if self._staircase is not None:
+            rows = [((a, -negated), item) for a, negated, item in zip(self._staircase.first, self._staircase.negated, self._staircase.items)][::-1]
+        else:
+            order = np.lexsort(tuple(-self._points[:, column] for column in reversed(range(len(self.senses)))))
+            rows = [(tuple(self._points[index]), self._items[index]) for index in order.tolist()]
+        return [(tuple(float(value * sense) for value, sense in zip(values, self.senses)), item) for values, item in rows]
+
+class ParetoScenario(NamedTuple):
+    # Una combinación del frente con sus tres objetivos (corridor_area y open_space en m²)
+    base_width: float
+    base_length: float
+    corridor_width: float
+    stair_size: float
+    offset: float
+    layout_type: str
+    base_units: int
+    corridor_area: float
+    open_space: float
+
+    def params(self, **options):
+        # LayoutParams para compute_layout (options: rules, source, clip_mode, fixed_point, terrain)
+        return LayoutParams(self.offset, self.base_width, self.base_length, self.corridor_width, self.stair_size, self.layout_type, **options)
+
+class ParetoUpdate(NamedTuple):
+    # Estado de pareto_search cada vez que el frente mejora: el frente (por unidades base de mayor a menor), las
+    # combinaciones ya evaluadas de `total` y cuántas se descartaron por no tener conteo exacto
+    front: tuple
+    evaluated: int
+    total: int
+    skipped: int
+
+def sweep_objectives(sweep):
+    # Los tres objetivos de PARETO_OBJECTIVES sobre un SweepResult, con su forma. El espacio libre es el área de la
+    # caja interna menos unidades, pasillos y escaleras (con el lado recortado que usan los generadores): las
+    # disposiciones no dejan un área central propia (central_area es siempre None)
+    bw, bl, cw, stair, offsets = (sweep.axis(name).reshape([-1 if axis == position else 1 for axis in range(6)]) for position, name in enumerate(SWEEP_AXES[:5]))
+    width = np.array([inner_area['width'] if inner_area else 0.0 for inner_area in sweep.inner_areas]).reshape(1, 1, 1, 1, -1, 1)
+    height = np.array([inner_area['height'] if inner_area else 0.0 for inner_area in sweep.inner_areas]).reshape(1, 1, 1, 1, -1, 1)
+    side = np.concatenate([_clamped_stair(width, height, stair, layout_type) for layout_type in sweep.axis('layout_type')], axis=5)
+    base, corridor_area = sweep.base_units, sweep.count('corridor') * bl * cw
+    open_space = width * height - base * bw * bl - corridor_area - sweep.count('stair') * side ** 2
+    return {'base_units': base, 'corridor_area': corridor_area, 'open_space': open_space}
+
+def pareto_search(geometry, base_widths, base_lengths, corridor_widths, stair_sizes, offsets, layout_types=LAYOUT_TYPES, objectives=tuple(PARETO_OBJECTIVES), rules=None, source='bbox', terrain=None, fixed_point=False, inset=None, batch=20_000):
+    # Generador: barre las combinaciones offset a offset (parameter_sweep) y las mete en un ParetoArchive en lotes
+    # de `batch`; cada vez que el frente cambia devuelve un ParetoUpdate, así quien llama (la interfaz) puede
+    # mostrar resultados antes de terminar. El último ParetoUpdate tiene evaluated == total. Solo entran las
+    # combinaciones con unidades base y conteo exacto (las cotas superiores no sirven para comparar)
+    objectives = tuple(objectives)
+    if unknown := set(objectives) - set(PARETO_OBJECTIVES): raise ValueError(f"Objetivos desconocidos: {sorted(unknown)}")
+    archive = ParetoArchive([PARETO_OBJECTIVES[name] for name in objectives])
+    offsets = np.asarray(offsets, dtype=np.float64).ravel()
+    per_offset = math.prod(np.size(values) for values in (base_widths, base_lengths, corridor_widths, stair_sizes)) * len(tuple(layout_types))
+    total, evaluated, skipped, sweeps, reported = per_offset * len(offsets), 0, 0, [], None
+    def update():
+        # Los elementos del archivo son número de barrido * per_offset + índice plano dentro de ese barrido
+        front = []
+        for _, item in archive.front():
+            sweep, scores = sweeps[item // per_offset]; index = np.unravel_index(item % per_offset, sweep.shape)
+            labels = [values[i].item() if isinstance(values, np.ndarray) else values[i] for (_, values), i in zip(sweep.axes, index)]
+            front.append(ParetoScenario(*labels, int(scores['base_units'][index]), float(scores['corridor_area'][index]), float(scores['open_space'][index])))
+        return ParetoUpdate(tuple(sorted(front, key=lambda scenario: -scenario.base_units)), evaluated, total, skipped)
+    for number, offset in enumerate(offsets):
+        sweep = parameter_sweep(geometry, base_widths, base_lengths, corridor_widths, stair_sizes, [offset], layout_types, rules, source, terrain, fixed_point, inset)
+        scores = sweep_objectives(sweep); sweeps.append((sweep, scores))
+        useful = (scores['base_units'] > 0).ravel(); exact = sweep.exact.ravel()
+        skipped += int(np.count_nonzero(useful & ~exact)); candidates = np.flatnonzero(useful & exact)
+        points = np.stack([scores[name].ravel()[candidates] for name in objectives], axis=1)
+        bounds = np.searchsorted(candidates, np.arange(0, per_offset + batch, batch))
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            added = archive.add(points[start:end], candidates[start:end] + number * per_offset)
+            evaluated = min(evaluated + batch, (number + 1) * per_offset)
+            if added: reported = update(); yield reported
+    if reported is None or reported.evaluated != total: yield update()
+
+class KMLProcessor:
+    def __init__(self, parse_cache=None, projection='utm'):
+        self.parse_cache = parse_cache
+        self.projection = projection  # 'utm', 'local' o None para usar las coordenadas tal cual
+        self.catalog = None
+        self.parcel_id = None
+        self.parcel = None
+        self.crs = None
+        self.polygon = None
+        self.polygon_key = None
+        self.simplify_tolerance = None  # metros; None deja el anillo tal cual
+        self.simplify_method = 'douglas-peucker'  # o 'visvalingam'
+        self.inner_polygons = None
+        self.setbacks = None
+        self.oriented = False
+        self.orientation_angle = None  # None: ángulo de la caja orientada mínima
+        self.layout_frame = None
+        self.last_sweep = None
+        self.inner_area_source = 'bbox'  # 'bbox': caja del retranqueo; 'rectangle': mayor rectángulo inscrito; 'pieces': rectángulos de un lote rectilíneo
+        self.pieces = None
+        self.layout_workers = None  # procesos para calcular las piezas en paralelo (None: en serie)
+        self.clip_mode = 'drop'  # unidades fuera del retranqueo: 'drop' las quita, 'flag' las marca, None no mira
+        self.layout_cache = None  # LayoutCache compartible entre parcelas con cajas del mismo tamaño (None: sin caché)
+        self.clipped_units = {}
+        self._inset_cache = OrderedDict()
+        self._inset_lock = threading.Lock()  # compute_layout puede llamarse desde varios hilos
+        self.bounding_box = None
+        self.original_bounding_box = None
+        self.inner_area = None
+        self.inner_area_origin = None  # el origen (ver inner_area_source) con que se calculó inner_area
+        self.units = UnitTable.empty()  # las unidades en columnas; las listas de abajo son sus dicts, por compatibilidad
+        self.unit_counts = {}  # {tipo de UNIT_KINDS: cantidad}, también con calculate_units(count_only=True)
+        self.outer_base_units = []
+        self.inner_base_units = []
+        self.corridor_units = []
+        self.stair_units = []
+        self.central_area = None
+        self.offset_value = 0
+        self.base_width_value = 0
+        self.base_length_value = 0
+        self.corridor_width_value = 0
+        self.fixed_point = False  # True: la disposición se calcula en milímetros enteros (exacta y reproducible)
+        self.fixed_units = None  # con fixed_point, self.units como UnitTable de enteros en mm
+
+    def load_kml(self, file_path, streaming=False):
+        if streaming: return self._load_kml_streaming(file_path)
+        try:
+            with open_kml_source(file_path) as f:
+                try: root, ns = parse_kml_document(f)
+                except etree.XMLSyntaxError as parse_err: return False, f"Error KML Parse: {str(parse_err)}"
+            polygon, coordinates = find_first_polygon(root, ns)
+            if polygon is None: return False, "No se encontró polígono"
+            if coordinates is None or not coordinates.text: return False, "No se encontraron coordenadas"
+            coords = parse_coordinates(coordinates.text)
+            if len(coords) < 3: return False, "Coords insuficientes."
+            self._set_parcel({'id': 'P0', 'name': None, 'part': 0, 'coords': coords, 'bounding_box': bounding_box_of(coords)})
+            return self._loaded("KML cargado", "Polígono inválido")
+        except FileNotFoundError: return False, f"Error: Archivo no encontrado '{file_path}'"
+        except Exception as e: return False, f"Error inesperado KML: {str(e)}"
+
+    def load_catalog(self, file_path):
+        # Carga todas las parcelas del archivo en una sola pasada y deja seleccionada la primera
+        try:
+            try: catalog = load_parcel_catalog(file_path, self.parse_cache)
+            except etree.XMLSyntaxError as parse_err: return False, f"Error KML Parse: {str(parse_err)}"
+            if not len(catalog): return False, "No se encontró polígono"
+            self.catalog = catalog.project(self.projection) if self.projection else catalog
+            success, message = self.select_parcel(catalog.ids()[0])
+            return (True, f"KML cargado ({len(catalog)} parcelas)") if success else (False, message)
+        except FileNotFoundError: return False, f"Error: Archivo no encontrado '{file_path}'"
+        except Exception as e: return False, f"Error inesperado KML: {str(e)}"
+
+    def select_parcel(self, parcel_id):
+        if self.catalog is None or parcel_id not in self.catalog: return False, f"Parcela '{parcel_id}' no encontrada"
+        parcel = self.catalog[parcel_id]
+        self._set_parcel(parcel); self.parcel_id = parcel_id
+        return self._loaded(f"Parcela '{parcel_id}' seleccionada", f"Parcela '{parcel_id}' inválida")
+
+    def _loaded(self, message, invalid):
+        # Resultado común de toda carga tras _set_parcel: una parcela con errores de validación se rechaza y, si no,
+        # el mensaje lleva las reparaciones y la simplificación aplicadas
+        diagnostics = self.parcel['diagnostics']
+        if diagnostics['errors']: return False, f"{invalid} ({diagnostics_note(diagnostics)})"
+        return True, f"{message}{self._parcel_note()}"
+
+    def _set_parcel(self, parcel):
+        if self.projection: project_parcels([parcel], self.projection)
+        self.parcel, self.crs = parcel, parcel.get('crs')
+        world = self._layout_ring(parcel)
+        # Linderos y retranqueo se preparan en el marco del mundo (no dependen del giro); con orientación, el resto del
+        # cálculo ocurre en el marco local (caja orientada mínima o el ángulo fijado)
+        self.polygon_key = hashlib.blake2b(np.ascontiguousarray(world).tobytes(), digest_size=16).hexdigest()
+        try: self.setbacks = ParcelSetbacks(world)
+        except ValueError: self.setbacks = None
+        if not self.oriented: self.layout_frame = None
+        elif self.orientation_angle is None: self.layout_frame = oriented_bounding_box(world)
+        else: self.layout_frame = rotation_frame(world, self.orientation_angle)
+        self.polygon = to_local(world, self.layout_frame) if self.layout_frame is not None else world
+        self.bounding_box = bounding_box_of(self.polygon) if self.layout_frame is not None or world is not parcel['coords'] else parcel['bounding_box'].copy()
+        self.original_bounding_box = self.bounding_box.copy()
+        self.inner_area = None; self.inner_polygons = None; self.pieces = None; self.units = UnitTable.empty(); self.unit_counts = {}; self.outer_base_units = []; self.inner_base_units = []; self.corridor_units = []; self.stair_units = []; self.central_area = None
+
+    def _layout_ring(self, parcel):
+        # Anillo con el que se calcula: el original (o el reparado si la validación lo corrigió) o, con
+        # simplify_tolerance, el simplificado, que se guarda en la parcela junto al original (el dibujo sigue usando
+        # parcel['coords']) y solo se rehace si cambian los parámetros
+        validate_parcel(parcel); base = parcel.get('repaired', parcel['coords'])
+        if not self.simplify_tolerance: return base
+        cached = parcel.get('simplified')
+        if cached is None or (cached['tolerance'], cached['method']) != (self.simplify_tolerance, self.simplify_method):
+            coords = base
+            scale = _equirectangular_scale(float(coords[:, 1].mean())) if is_geographic(coords) else (1.0, 1.0)
+            ring = simplify_ring(coords, self.simplify_tolerance, self.simplify_method, scale)
+            original = len(parcel['coords']) - int(len(parcel['coords']) > 1 and np.array_equal(parcel['coords'][0], parcel['coords'][-1]))
+            cached = parcel['simplified'] = {'tolerance': self.simplify_tolerance, 'method': self.simplify_method, 'coords': ring, 'vertices': (original, len(ring))}
+        return cached['coords']
+
+    def _parcel_note(self):
+        # Reparaciones y simplificación aplicadas a la parcela actual, para los mensajes de carga
+        if self.parcel is None: return ""
+        notes = [f"reparada: {diagnostics_note(self.parcel['diagnostics'])}"] if self.parcel.get('diagnostics', {}).get('repaired') else []
+        if self.simplify_tolerance and 'simplified' in self.parcel:
+            before, after = self.parcel['simplified']['vertices']; notes.append(f"{before} → {after} vértices, tolerancia {self.simplify_tolerance:g} m")
+        return f" ({'; '.join(notes)})" if notes else ""
+
+    def set_simplification(self, tolerance, method='douglas-peucker'):
+        # Cambia la tolerancia (None o 0 la desactiva) y vuelve a preparar la parcela: el frente se recalcula, porque
+        # los índices de aristas dejan de valer
+        if tolerance is not None and tolerance < 0: return False, "Tolerancia >= 0"
+        if method not in ('douglas-peucker', 'visvalingam'): return False, f"Método de simplificación desconocido: {method}"
+        self.simplify_tolerance, self.simplify_method = tolerance or None, method
+        if self.parcel is None: return True, "Simplificación guardada"
+        self._set_parcel(self.parcel)
+        return True, f"Simplificación aplicada{self._parcel_note()}"
+
+    def set_orientation(self, oriented, angle=None):
+        # Activa o desactiva el marco local rotado (por defecto el de la caja orientada mínima; `angle` en grados lo
+        # fija) y vuelve a preparar la parcela actual en ese marco
+        self.oriented, self.orientation_angle = bool(oriented), angle
+        if self.parcel is None: return True, "Orientación guardada"
+        frontage = self.setbacks.frontage if self.setbacks is not None else None
+        self._set_parcel(self.parcel)
+        if frontage is not None: self.set_frontage(frontage)
+        if self.layout_frame is None: return True, "Marco de ejes"
+        return True, f"Marco orientado a {self.layout_frame['angle']:.1f}°"
+
+    def best_orientation(self, offset, base_width, base_length, corridor_width, stair_size, layout_type="cuadrada", angles=None, rules=None, source=None, workers=None):
+        # Barre orientaciones (por defecto cada 1° más la de la caja orientada) y deja la parcela en el marco de la
+        # que da más unidades base tras el recorte; después basta con calculate_inner_area y calculate_units
+        if self.parcel is None: return False, "Cargue KML"
+        rules = (rules or SetbackRules()).resolved(offset)
+        if min(rules) < 0: return False, "Offset >= 0"
+        rings = self.inset_polygons(rules, world=True)
+        if not rings: return False, "Offset grande, área interna inválida."
+        if (source or self.inner_area_source) == 'pieces': return self._best_piece_orientation(offset, (base_width, base_length, corridor_width, stair_size, layout_type), rules, rings, angles)
+        if angles is None:
+            box = oriented_bounding_box(np.concatenate(rings))
+            angles = np.append(np.arange(0.0, 180.0, 1.0), box['angle'] % 180 if box else [])
+        layout = (base_width, base_length, corridor_width, stair_size, layout_type)
+        self.last_sweep = orientation_sweep(rings, layout + (self.fixed_point,), angles, source or self.inner_area_source, workers, reference=self._layout_ring(self.parcel), clip_mode=self.clip_mode)
+        self.set_orientation(True, self.last_sweep['angle'])
+        sweep = self.last_sweep
+        return True, f"Mejor giro {sweep['angle']:.1f}°: {sweep['base_units']} unidades base ({sweep['evaluated']} ángulos evaluados, {sweep['pruned']} descartados)"
+
+    def _best_piece_orientation(self, offset, layout, rules, rings, angles=None):
+        # Con piezas solo sirven los giros que dejan el retranqueo rectilíneo: por defecto las direcciones de sus aristas
+        # (módulo 90°), que son pocas, así que se calcula cada una completa en lugar de acotar como orientation_sweep
+        edges = np.concatenate([np.roll(ring, -1, axis=0) - ring for ring in rings])
+        angles = np.asarray(list(angles), dtype=np.float64) if angles is not None else np.unique(np.round(np.degrees(np.arctan2(edges[:, 1], edges[:, 0])) % 90.0, 6))
+        best = None
+        for angle in angles:
+            self.set_orientation(True, float(angle))
+            if not self.calculate_inner_area(offset, rules, 'pieces')[0] or not self.calculate_units(*layout)[0]: continue
+            count = self.units.count('outer_base') + self.units.count('inner_base')
+            if best is None or count > best['base_units']: best = {'angle': float(angle), 'base_units': count, 'inner_area': self.inner_area}
+        if best is None: return False, "El área interna no es rectilínea en ningún giro."
+        self.last_sweep = dict(best, evaluated=len(angles), pruned=0)
+        self.set_orientation(True, best['angle'])
+        return True, f"Mejor giro {best['angle']:.1f}°: {best['base_units']} unidades base ({len(angles)} ángulos evaluados, 0 descartados)"
+
+    def unit_polygons(self, units):
+        # Unidades del marco de cálculo como polígonos (N, 4, 2) del mundo, en una sola transformación
+        return rectangles_to_world(units, self.layout_frame)
+
+    def set_frontage(self, edges):
+        # Fija las aristas de frente (índices del anillo limpio, antihorario) y recompila la clasificación de linderos
+        if self.polygon is None: return False, "Cargue KML"
+        try: self.setbacks = ParcelSetbacks(self._layout_ring(self.parcel), edges)
+        except (ValueError, IndexError) as e: return False, f"Frente inválido: {e}"
+        return True, f"Frente: aristas {list(self.setbacks.frontage)}"
+
+    def inset_polygons(self, setback, world=False):
+        # Retranqueo real del polígono (distancia única o SetbackRules), cacheado por (parcela, frente, distancias)
+        # para recalcular al instante al mover la corona. Se devuelve en el marco de cálculo salvo con world=True
+        rules = setback.resolved(0) if isinstance(setback, SetbackRules) else SetbackRules.uniform(float(setback))
+        if self.setbacks is None: return []
+        key = (self.polygon_key, self.setbacks.frontage, rules)
+        with self._inset_lock:
+            polygons = self._inset_cache.get(key)
+            if polygons is not None: self._inset_cache.move_to_end(key)
+        if polygons is None:
+            polygons = self.setbacks.inset(rules)
+            with self._inset_lock:
+                self._inset_cache[key] = polygons
+                if len(self._inset_cache) > 64: self._inset_cache.popitem(last=False)
+        if world or self.layout_frame is None: return polygons
+        return [to_local(ring, self.layout_frame) for ring in polygons]
+
+    def _load_kml_streaming(self, file_path):
+        # Solo se lee hasta cerrar el primer Placemark con polígono válido
+        try:
+            with open_kml_source(file_path) as f:
+                try: parcel = next(iter_kml_parcels(f), None)
+                except etree.XMLSyntaxError as parse_err: return False, f"Error KML Parse: {str(parse_err)}"
+            if parcel is None: return False, "No se encontró polígono"
+            self._set_parcel(parcel)
+            return self._loaded("KML cargado", "Polígono inválido")
+        except FileNotFoundError: return False, f"Error: Archivo no encontrado '{file_path}'"
+        except Exception as e: return False, f"Error inesperado KML: {str(e)}"
+
+    def calculate_inner_area(self, offset, rules=None, source=None):
+        # `rules` (SetbackRules) fija distancias distintas para frente, laterales y fondo; lo que no fije usa offset.
+        # `source` elige el área interna sobre el polígono: 'bbox' (caja del retranqueo) o 'rectangle' (mayor
+        # rectángulo inscrito en el retranqueo, que no deja unidades fuera en lotes en L, trapecios o con muescas)
+        if not self.bounding_box: return False, "Cargue KML"
+        self.pieces = None
+        # Si bounding_box ya no es el del polígono (terreno redimensionado a mano) se trabaja sobre esa caja
+        terrain = None if self.polygon is not None and self.bounding_box == self.original_bounding_box else self.bounding_box
+        try: self.inner_area, self.inner_polygons, self.pieces, message = compute_inner_area(self.geometry, offset, rules, source or self.inner_area_source, terrain, self.inset_polygons)
+        except ValueError as e: self.inner_area = self.inner_polygons = None; return False, str(e)
+        self.offset_value, self.inner_area_origin = offset, source or self.inner_area_source
+        return True, message
+
+    def calculate_units(self, base_width, base_length, corridor_width, stair_size, layout_type="cuadrada", count_only=False):
+        # count_only: solo unit_counts ({tipo: cantidad}) con el conteo cerrado, sin generar unidades, salvo con piezas
+        # o si el recorte contra el retranqueo puede quitar alguna, que depende de dónde cae cada unidad (entonces se
+        # cuentan las generadas). Con el rectángulo inscrito o un retranqueo que llena su caja no quita ninguna
+        if not self.inner_area: return False, "Calcule área interna"
+        self.outer_base_units, self.inner_base_units, self.corridor_units, self.stair_units, self.central_area = [], [], [], [], None
+        self.units, self.fixed_units, self.clipped_units, self.unit_counts = UnitTable.empty(), None, {}, {}
+        if count_only and not self.pieces:
+            try: _check_dimensions(base_width, base_length, corridor_width, stair_size); counts = count_units(self.inner_area, base_width, base_length, corridor_width, stair_size, layout_type, self.fixed_point)
+            except ValueError as e: return False, str(e)
+            clipping = self.inner_polygons is not None and bool(self.clip_mode)
+            if not clipping or _clip_free(counts, self.inner_area, self.inner_polygons, self.inner_area_origin, base_width, corridor_width, layout_type):
+                self.base_width_value, self.base_length_value, self.corridor_width_value = base_width, base_length, corridor_width
+                self.unit_counts = {kind: int(count) for kind, count in counts.items()}
+                if clipping: self.clipped_units = {kind: 0 for kind in UNIT_KINDS}
+                return True, "Conteo de unidades completado."
+        try: units, self.clipped_units, message = place_units(self.inner_area, self.inner_polygons, self.pieces, base_width, base_length, corridor_width, stair_size, layout_type, self.fixed_point, self.clip_mode, self.layout_workers, self.layout_cache)
+        except ValueError as e: return False, str(e)
+        self.base_width_value, self.base_length_value, self.corridor_width_value = base_width, base_length, corridor_width
+        self.units = units['units']; self.unit_counts = {kind: self.units.count(kind) for kind in UNIT_KINDS}
+        if count_only: return True, message
+        self.outer_base_units, self.inner_base_units, self.corridor_units, self.stair_units = (self.units.records(kind) for kind in UNIT_KINDS)
+        self.central_area, self.fixed_units = units['central_area'], units['fixed_units']
+        return True, message
+
+    @property
+    def geometry(self):
+        # Vista de solo lectura de la parcela preparada, para compute_layout
+        return ParcelGeometry(self.polygon, self.layout_frame, self.original_bounding_box or self.bounding_box, self.setbacks)
+
+    def compute_layout(self, params, workers=None):
+        # Disposición completa sobre la parcela actual sin tocar el estado del procesador (ni bounding_box ni las
+        # listas de unidades): se puede llamar desde varios hilos a la vez con parámetros distintos
+        if self.bounding_box is None: raise ValueError("Cargue KML")
+        return compute_layout(self.geometry, params, self.inset_polygons if self.polygon is not None else None, workers or self.layout_workers, self.layout_cache)
+
+    def parameter_sweep(self, base_widths, base_lengths, corridor_widths, stair_sizes, offsets, layout_types=LAYOUT_TYPES, rules=None, source=None, terrain=None):
+        # parameter_sweep sobre la parcela actual: su marco, los retranqueos cacheados y el modo en milímetros
+        if self.bounding_box is None: raise ValueError("Cargue KML")
+        return parameter_sweep(self.geometry, base_widths, base_lengths, corridor_widths, stair_sizes, offsets, layout_types, rules, source or self.inner_area_source, terrain, self.fixed_point, self.inset_polygons if self.polygon is not None else None)
+
+    def pareto_search(self, base_widths, base_lengths, corridor_widths, stair_sizes, offsets, layout_types=LAYOUT_TYPES, objectives=tuple(PARETO_OBJECTIVES), rules=None, source=None, terrain=None, batch=20_000):
+        # pareto_search sobre la parcela actual (generador de ParetoUpdate, como parameter_sweep)
+        if self.bounding_box is None: raise ValueError("Cargue KML")
+        return pareto_search(self.geometry, base_widths, base_lengths, corridor_widths, stair_sizes, offsets, layout_types, objectives, rules, source or self.inner_area_source, terrain, self.fixed_point, self.inset_polygons if self.polygon is not None else None, batch)
 
 class Application(tk.Tk):
     def __init__(self):
         super().__init__()
         self.title("Distribución de Unidades en Terreno v3.4")
         self.geometry("1200x700")
-        self.kml_processor = KMLProcessor()
+        self.kml_processor = KMLProcessor(parse_cache=ParseCache())
         self.current_figure, self.canvas, self.toolbar = None, None, None
+        self.layout = None
         self.control_frame = tk.Frame(self)
         self.control_frame.pack(side=tk.TOP, fill=tk.X, padx=5, pady=5)
         self.plot_frame = tk.Frame(self)
@@ -196,6 +2690,9 @@ class Application(tk.Tk):
     def create_widgets(self):
         self.load_button = tk.Button(self.control_frame, text="Cargar KML", command=self.load_kml)
         self.load_button.pack(side=tk.LEFT, padx=(5, 10))
+        # Tolerancia de simplificación del contorno al cargar (metros); en blanco no se simplifica
+        tk.Label(self.control_frame, text="Simplif.(m):").pack(side=tk.LEFT, padx=(0,1))
+        self.simplify_entry = tk.Entry(self.control_frame, width=5); self.simplify_entry.pack(side=tk.LEFT, padx=(0, 10))
         param_frame = tk.Frame(self.control_frame)
         param_frame.pack(side=tk.LEFT, padx=0)
         
@@ -214,10 +2711,24 @@ class Application(tk.Tk):
         self.terrain_height_entry = tk.Entry(param_frame, width=8, state='disabled'); self.terrain_height_entry.pack(side=tk.LEFT, padx=(0, 15))
         tk.Label(param_frame, text="D.Corona:").pack(side=tk.LEFT, padx=(0,1));
         self.offset_entry = tk.Entry(param_frame, width=6); self.offset_entry.pack(side=tk.LEFT, padx=(0, 5)); self.offset_entry.insert(0, "5")
+        # Retranqueos de frente y fondo opcionales: en blanco usan D.Corona
+        tk.Label(param_frame, text="Frente:").pack(side=tk.LEFT, padx=(0,1));
+        self.frontage_entry = tk.Entry(param_frame, width=5); self.frontage_entry.pack(side=tk.LEFT, padx=(0, 5))
+        tk.Label(param_frame, text="Fondo:").pack(side=tk.LEFT, padx=(0,1));
+        self.rear_entry = tk.Entry(param_frame, width=5); self.rear_entry.pack(side=tk.LEFT, padx=(0, 5))
         tk.Label(param_frame, text="Disposición:").pack(side=tk.LEFT, padx=(10,1))
         self.layout_var = tk.StringVar(self); self.layout_options = ["Forma Cuadrada", "Forma L", "Forma Rectangular"]; self.layout_var.set(self.layout_options[0])
         self.layout_menu = tk.OptionMenu(param_frame, self.layout_var, *self.layout_options); self.layout_menu.pack(side=tk.LEFT, padx=(0,10))
+        self.orient_var = tk.BooleanVar(self, value=False)
+        self.orient_check = tk.Checkbutton(param_frame, text="Orientar", variable=self.orient_var, command=self.toggle_orientation); self.orient_check.pack(side=tk.LEFT, padx=(0,10))
+        self.fixed_point_var = tk.BooleanVar(self, value=False)
+        self.fixed_point_check = tk.Checkbutton(param_frame, text="mm exactos", variable=self.fixed_point_var, command=lambda: setattr(self.kml_processor, 'fixed_point', self.fixed_point_var.get())); self.fixed_point_check.pack(side=tk.LEFT, padx=(0,10))
+        tk.Label(param_frame, text="Área:").pack(side=tk.LEFT, padx=(0,1))
+        self.area_source_var = tk.StringVar(self); self.area_source_options = {"Caja": 'bbox', "Rect. inscrito": 'rectangle', "Piezas": 'pieces'}; self.area_source_var.set("Caja")
+        self.area_source_menu = tk.OptionMenu(param_frame, self.area_source_var, *self.area_source_options); self.area_source_menu.pack(side=tk.LEFT, padx=(0,10))
         self.calculate_button = tk.Button(self.control_frame, text="Calcular y Visualizar", command=self.calculate_and_visualize, state=tk.DISABLED); self.calculate_button.pack(side=tk.LEFT, padx=5)
+        self.sweep_button = tk.Button(self.control_frame, text="Mejor giro", command=self.sweep_orientations, state=tk.DISABLED); self.sweep_button.pack(side=tk.LEFT, padx=5)
+        self.pareto_button = tk.Button(self.control_frame, text="Pareto", command=self.pareto_front, state=tk.DISABLED); self.pareto_button.pack(side=tk.LEFT, padx=5)
         self.status_var = tk.StringVar(); self.status_var.set("Listo. Cargue KML.")
         self.status_label = tk.Label(self, textvariable=self.status_var, bd=1, relief=tk.SUNKEN, anchor=tk.W, padx=5); self.status_label.pack(side=tk.BOTTOM, fill=tk.X)
 
@@ -227,51 +2738,130 @@ class Application(tk.Tk):
             self.stair_size_entry.delete(0, tk.END); self.stair_size_entry.insert(0, f"{auto_size:.2f}")
         except (ValueError, tk.TclError): messagebox.showerror("Entrada Inválida", "Asegúrese de que 'An.Base' y 'An.Pasillo' sean números válidos.")
 
+    def toggle_orientation(self):
+        # El marco orientado cambia ancho y alto del terreno: se refrescan las entradas para no tomarlas como editadas
+        success, message = self.kml_processor.set_orientation(self.orient_var.get())
+        if self.kml_processor.original_bounding_box: self._fill_terrain_entries()
+        self.status_var.set(message)
+
+    def _fill_terrain_entries(self):
+        bb = self.kml_processor.bounding_box
+        self.terrain_width_entry.config(state='normal'); self.terrain_height_entry.config(state='normal')
+        self.terrain_width_entry.delete(0, tk.END); self.terrain_width_entry.insert(0, f"{bb['width']:.2f}")
+        self.terrain_height_entry.delete(0, tk.END); self.terrain_height_entry.insert(0, f"{bb['height']:.2f}")
+
     def load_kml(self):
         self._clear_plot()
-        file_path = filedialog.askopenfilename(title="Seleccionar KML", filetypes=[("KML", "*.kml"), ("Todos", "*.*")])
+        file_path = filedialog.askopenfilename(title="Seleccionar KML", filetypes=[("KML/KMZ", "*.kml *.kmz"), ("KML", "*.kml"), ("KMZ", "*.kmz"), ("Todos", "*.*")])
         if file_path:
+            try: tolerance = float(self.simplify_entry.get()) if self.simplify_entry.get().strip() else None
+            except ValueError: messagebox.showerror("Entrada Inválida", "Tolerancia de simplificación inválida."); return
+            if not self.kml_processor.set_simplification(tolerance)[0]: messagebox.showerror("Entrada Inválida", "La tolerancia no puede ser negativa."); return
             self.status_var.set(f"Cargando {file_path}..."); self.update_idletasks()
-            success, message = self.kml_processor.load_kml(file_path)
+            success, message = self.kml_processor.load_catalog(file_path)
             if success:
-                bb = self.kml_processor.bounding_box; fname = file_path.split('/')[-1]
-                self.status_var.set(f"KML '{fname}' cargado. W={bb['width']:.2f}, H={bb['height']:.2f}. Calcule.")
-                self.terrain_width_entry.config(state='normal'); self.terrain_height_entry.config(state='normal')
-                self.terrain_width_entry.delete(0, tk.END); self.terrain_width_entry.insert(0, f"{bb['width']:.2f}")
-                self.terrain_height_entry.delete(0, tk.END); self.terrain_height_entry.insert(0, f"{bb['height']:.2f}")
-                self.calculate_button['state'] = tk.NORMAL
+                bb = self.kml_processor.bounding_box; fname = file_path.split('/')[-1]; n_parcels = len(self.kml_processor.catalog)
+                parcel_info = f" Parcela '{self.kml_processor.parcel_id}' de {n_parcels}." if n_parcels > 1 else ""
+                self.status_var.set(f"KML '{fname}' cargado{self.kml_processor._parcel_note()}.{parcel_info} W={bb['width']:.2f}, H={bb['height']:.2f}. Calcule.")
+                self._fill_terrain_entries()
+                self.calculate_button['state'] = tk.NORMAL; self.sweep_button['state'] = tk.NORMAL; self.pareto_button['state'] = tk.NORMAL
                 self.auto_calculate_stair_size()
             else:
                 messagebox.showerror("Error KML", message); self.status_var.set("Error KML.")
-                self.calculate_button['state'] = tk.DISABLED
+                self.calculate_button['state'] = tk.DISABLED; self.sweep_button['state'] = tk.DISABLED; self.pareto_button['state'] = tk.DISABLED
 
-    def calculate_and_visualize(self):
-        if not self.kml_processor.original_bounding_box: messagebox.showwarning("Inválido", "Cargue KML primero."); return
+    def _read_params(self):
+        # Lee y valida las entradas numéricas; None (tras avisar) si alguna no es válida
         try:
             params = {name: float(entry.get()) for name, entry in {
                 "offset": self.offset_entry, "base_width": self.base_width_entry, "base_length": self.base_length_entry,
                 "corridor_width": self.corridor_width_entry, "stair_size": self.stair_size_entry,
                 "terrain_w": self.terrain_width_entry, "terrain_h": self.terrain_height_entry}.items()}
-            if any(v < 0 for v in params.values()): messagebox.showerror("Entrada Inválida", "Los valores numéricos no pueden ser negativos."); return
-        except (ValueError, tk.TclError): messagebox.showerror("Entrada Inválida", "Valores numéricos inválidos."); return
-        
-        temp_bb = self.kml_processor.original_bounding_box.copy()
-        temp_bb.update({'width': params['terrain_w'], 'height': params['terrain_h'], 'max_x': temp_bb['min_x'] + params['terrain_w'], 'max_y': temp_bb['min_y'] + params['terrain_h']})
-        self.kml_processor.bounding_box = temp_bb
-        
+            optional = [float(entry.get()) if entry.get().strip() else None for entry in (self.frontage_entry, self.rear_entry)]
+            params['rules'] = SetbackRules(frontage=optional[0], rear=optional[1])
+            if any(v < 0 for v in params.values() if isinstance(v, float)) or any(v is not None and v < 0 for v in optional): messagebox.showerror("Entrada Inválida", "Los valores numéricos no pueden ser negativos."); return None
+        except (ValueError, tk.TclError): messagebox.showerror("Entrada Inválida", "Valores numéricos inválidos."); return None
         layout_map = {"Forma L": "forma_l", "Forma Rectangular": "forma_rectangular"}
-        layout_type_arg = layout_map.get(self.layout_var.get(), "cuadrada")
-        
+        params['layout_type'] = layout_map.get(self.layout_var.get(), "cuadrada")
+        params['source'] = self.area_source_options[self.area_source_var.get()]
+        return params
+
+    def sweep_orientations(self):
+        # Barre giros de 1° y deja la parcela en el marco del mejor antes de calcular y dibujar
+        if not self.kml_processor.original_bounding_box: messagebox.showwarning("Inválido", "Cargue KML primero."); return
+        if (params := self._read_params()) is None: return
+        self.status_var.set("Barriendo orientaciones..."); self.update_idletasks()
+        success, msg = self.kml_processor.best_orientation(params['offset'], params['base_width'], params['base_length'], params['corridor_width'], params['stair_size'], params['layout_type'], rules=params['rules'], source=params['source'])
+        if not success: messagebox.showerror("Error", msg); self.status_var.set("Error de cálculo."); return
+        self.orient_var.set(True); self._fill_terrain_entries()
+        if self.calculate_and_visualize(): self.status_var.set(msg)
+
+    def pareto_front(self):
+        # Frente de Pareto alrededor de las entradas actuales (±25% en anchos, largo y pasillo, escalera 0 o la
+        # actual, los tres tipos de disposición): un hilo recorre pareto_search y la ventana se va rellenando con
+        # cada mejora. Doble clic en una fila la pasa a las entradas y la dibuja
+        if not self.kml_processor.original_bounding_box: messagebox.showwarning("Inválido", "Cargue KML primero."); return
+        if (params := self._read_params()) is None: return
+        if params['source'] == 'pieces': messagebox.showerror("Error", "El frente de Pareto no admite piezas (use Caja o Rect. inscrito)."); return
+        steps = np.linspace(0.75, 1.25, 9)
+        search = self.kml_processor.pareto_search(params['base_width'] * steps, params['base_length'] * steps, params['corridor_width'] * steps, sorted({0.0, params['stair_size']}), [params['offset']],
+                                                  rules=params['rules'], source=params['source'], terrain=self._terrain(params))
+        window = tk.Toplevel(self); window.title("Frente de Pareto (unidades / pasillo m² / libre m²)")
+        listbox = tk.Listbox(window, width=110, height=20, font=('Courier', 9)); listbox.pack(fill=tk.BOTH, expand=True)
+        updates, stop, front = queue.Queue(), threading.Event(), []
+        names = {"cuadrada": "Forma Cuadrada", "forma_l": "Forma L", "forma_rectangular": "Forma Rectangular"}
+        def worker():
+            try:
+                for update in search:
+                    updates.put(update)
+                    if stop.is_set(): return
+            except ValueError as e: updates.put(e)
+        def poll():
+            # Solo el hilo de tk toca los widgets: se vacía la cola y se pinta el último frente
+            latest = None
+            while not updates.empty(): latest = updates.get_nowait()
+            if not window.winfo_exists(): return
+            if isinstance(latest, ValueError): self.status_var.set(f"Pareto: {latest}"); return
+            if latest is not None:
+                front[:] = latest.front; listbox.delete(0, tk.END)
+                for s in front: listbox.insert(tk.END, f"{s.base_units:6d} u  {s.corridor_area:10.1f}  {s.open_space:10.1f}   B:{s.base_width:.2f}x{s.base_length:.2f} P:{s.corridor_width:.2f} E:{s.stair_size:.2f}  {names[s.layout_type]}")
+                self.status_var.set(f"Pareto: {latest.evaluated}/{latest.total} combinaciones, {len(front)} en el frente" + (f", {latest.skipped} sin conteo exacto" if latest.skipped else ""))
+                if latest.evaluated == latest.total: return
+            window.after(100, poll)
+        def choose(_event):
+            if not (selection := listbox.curselection()): return
+            s = front[selection[0]]
+            for entry, value in ((self.base_width_entry, s.base_width), (self.base_length_entry, s.base_length), (self.corridor_width_entry, s.corridor_width), (self.stair_size_entry, s.stair_size)):
+                entry.delete(0, tk.END); entry.insert(0, f"{value:.2f}")
+            self.layout_var.set(names[s.layout_type])
+            self.calculate_and_visualize()
+        listbox.bind('<Double-Button-1>', choose)
+        window.protocol("WM_DELETE_WINDOW", lambda: (stop.set(), window.destroy()))
+        self.status_var.set("Buscando frente de Pareto...")
+        threading.Thread(target=worker, daemon=True).start(); window.after(100, poll)
+
+    def _terrain(self, params):
+        # Si el usuario no tocó las dimensiones (mostradas con 2 decimales) se trabaja sobre el polígono real (None);
+        # si no, la caja redimensionada va en los parámetros (el procesador no se modifica)
+        bb = self.kml_processor.original_bounding_box
+        if abs(params['terrain_w'] - bb['width']) > 0.005 or abs(params['terrain_h'] - bb['height']) > 0.005:
+            return dict(bb, width=params['terrain_w'], height=params['terrain_h'], max_x=bb['min_x'] + params['terrain_w'], max_y=bb['min_y'] + params['terrain_h'])
+        return None
+
+    def calculate_and_visualize(self):
+        if not self.kml_processor.original_bounding_box: messagebox.showwarning("Inválido", "Cargue KML primero."); return False
+        if (params := self._read_params()) is None: return False
+        kp = self.kml_processor
+        layout_params = LayoutParams(params['offset'], params['base_width'], params['base_length'], params['corridor_width'], params['stair_size'], params['layout_type'],
+                                     params['rules'], params['source'], kp.clip_mode, kp.fixed_point, self._terrain(params))
         self.status_var.set("Calculando..."); self.update_idletasks()
-        success, msg = self.kml_processor.calculate_inner_area(params['offset'])
-        if not success: messagebox.showerror("Error", msg); self.status_var.set("Error de cálculo."); self._clear_plot(); return
-        
-        success, msg = self.kml_processor.calculate_units(params['base_width'], params['base_length'], params['corridor_width'], params['stair_size'], layout_type_arg)
-        if not success: messagebox.showerror("Error", msg); self.status_var.set("Error de cálculo."); self._clear_plot(); return
+        try: self.layout = kp.compute_layout(layout_params)
+        except ValueError as e: messagebox.showerror("Error", str(e)); self.status_var.set("Error de cálculo."); self._clear_plot(); return False
         
         self.status_var.set("Generando visualización..."); self.update_idletasks()
-        self._visualize_results()
-        self.status_var.set(msg)
+        self._visualize_results(self.layout)
+        self.status_var.set(self.layout.message)
+        return True
 
     def _clear_plot(self):
         if self.canvas: self.canvas.get_tk_widget().destroy()
@@ -279,29 +2869,42 @@ class Application(tk.Tk):
         self.canvas, self.toolbar = None, None
         for widget in self.plot_frame.winfo_children(): widget.destroy()
 
-    def _visualize_results(self):
+    def _visualize_results(self, layout):
         self._clear_plot()
         fig, ax = plt.subplots(figsize=(8, 6)); fig.subplots_adjust(right=0.72)
-        bb = self.kml_processor.bounding_box
-        ax.add_patch(Rectangle((bb['min_x'], bb['min_y']), bb['width'], bb['height'], ec='black', fc='#EEEEEE', alpha=0.6))
-        if ia := self.kml_processor.inner_area:
-            ax.add_patch(Rectangle((ia['min_x'], ia['min_y']), ia['width'], ia['height'], ec='blue', fc='none', ls='--', lw=1.5))
-            if ca := self.kml_processor.central_area: ax.add_patch(Rectangle((ca['min_x'], ca['min_y']), ca['width'], ca['height'], ec='purple', fc='lavender', alpha=0.7))
-            for unit in self.kml_processor.stair_units: ax.add_patch(Rectangle((unit['x'], unit['y']), unit['width'], unit['height'], ec='#8B0000', fc='#FFA07A', alpha=0.9))
-            for unit in self.kml_processor.outer_base_units: ax.add_patch(Rectangle((unit['x'], unit['y']), unit['width'], unit['height'], ec='#006400', fc='#90EE90', alpha=0.8))
-            for unit in self.kml_processor.corridor_units: ax.add_patch(Rectangle((unit['x'], unit['y']), unit['width'], unit['height'], ec='#FF8C00', fc='#FFD700', alpha=0.85))
-        padding_x, padding_y = max(bb['width'] * 0.1, 1), max(bb['height'] * 0.1, 1)
-        ax.set_xlim(bb['min_x'] - padding_x, bb['max_x'] + padding_x); ax.set_ylim(bb['min_y'] - padding_y, bb['max_y'] + padding_y)
-        ax.set_xlabel("Longitud"); ax.set_ylabel("Latitud")
+        kp = self.kml_processor; bb, frame, inner_polygons = layout.terrain, kp.layout_frame, layout.inner_polygons
+        # El cálculo vive en el marco local (rotado si se orientó la parcela): todo se lleva al mundo en bloque
+        world = (lambda pts: to_world(pts, frame)) if frame is not None else (lambda pts: pts)
+        as_unit = lambda box: {'x': box['min_x'], 'y': box['min_y'], 'width': box['width'], 'height': box['height']}
+        # El contorno se dibuja con el anillo original aunque el cálculo use el simplificado
+        outline = kp.parcel['coords'] if inner_polygons is not None else kp.unit_polygons([as_unit(bb)])[0]
+        ax.add_patch(MplPolygon(outline, closed=True, ec='black', fc='#EEEEEE', alpha=0.6))
+        if ia := layout.inner_area:
+            if inner_polygons is not None:
+                for ring in inner_polygons: ax.add_patch(MplPolygon(world(ring), closed=True, ec='blue', fc='none', ls='--', lw=1.5))
+                if layout.params.source == 'rectangle': ax.add_patch(MplPolygon(kp.unit_polygons([as_unit(ia)])[0], closed=True, ec='blue', fc='none', ls=':', lw=1))
+                if layout.pieces: ax.add_collection(PolyCollection(kp.unit_polygons([as_unit(piece) for piece in layout.pieces]), edgecolors='blue', facecolors='none', linestyles=':', lw=1))
+            else: ax.add_patch(MplPolygon(kp.unit_polygons([as_unit(ia)])[0], closed=True, ec='blue', fc='none', ls='--', lw=1.5))
+            if ca := layout.central_area: ax.add_patch(MplPolygon(kp.unit_polygons([as_unit(ca)])[0], closed=True, ec='purple', fc='lavender', alpha=0.7))
+            # Cada tipo es una vista de la tabla de unidades: se pasa a polígonos sin crear un dict por unidad
+            for kind, ec, fc, alpha in (('stair', '#8B0000', '#FFA07A', 0.9), ('outer_base', '#006400', '#90EE90', 0.8), ('corridor', '#FF8C00', '#FFD700', 0.85)):
+                if len(units := layout.units.view(kind)): ax.add_collection(PolyCollection(kp.unit_polygons(units), edgecolors=ec, facecolors=fc, alpha=alpha))
+            if layout.units.outside is not None and layout.units.outside.any():
+                ax.add_collection(PolyCollection(kp.unit_polygons(layout.units.take(layout.units.outside)), edgecolors='red', facecolors='none', linestyles='--', lw=1.5))
+        low, high = outline.min(axis=0), outline.max(axis=0)
+        padding_x, padding_y = max((high[0] - low[0]) * 0.1, 1), max((high[1] - low[1]) * 0.1, 1)
+        ax.set_xlim(low[0] - padding_x, high[0] + padding_x); ax.set_ylim(low[1] - padding_y, high[1] + padding_y)
+        if self.kml_processor.crs: ax.set_xlabel(f"Este (m) [{self.kml_processor.crs}]"); ax.set_ylabel("Norte (m)")
+        else: ax.set_xlabel("X"); ax.set_ylabel("Y")
         title = f"Distribución de Unidades ({self.layout_var.get()})\n(B:{self.base_width_entry.get()}x{self.base_length_entry.get()}, P:{self.corridor_width_entry.get()}, E:{self.stair_size_entry.get()})"
         ax.set_title(title); ax.grid(True, linestyle=':', alpha=0.5)
 
         legend_elements = [ Patch(fc='#EEEEEE', ec='black', label=f'Terreno'),
                             Patch(fc='none', ec='blue', ls='--', label=f"Área Interna (Off:{self.offset_entry.get()})")]
-        total_base = len(self.kml_processor.outer_base_units) + len(self.kml_processor.inner_base_units)
-        if self.kml_processor.stair_units: legend_elements.append(Patch(fc='#FFA07A', ec='#8B0000', label=f'U. Escalera: {len(self.kml_processor.stair_units)}'))
+        total_base = layout.base_units
+        if stairs := layout.units.count('stair'): legend_elements.append(Patch(fc='#FFA07A', ec='#8B0000', label=f'U. Escalera: {stairs}'))
         if total_base > 0: legend_elements.append(Patch(fc='#90EE90', ec='#006400', label=f'U. Base: {total_base}'))
-        if self.kml_processor.corridor_units: legend_elements.append(Patch(fc='#FFD700', ec='#FF8C00', label=f'U. Pasillo: {len(self.kml_processor.corridor_units)}'))
+        if corridors := layout.units.count('corridor'): legend_elements.append(Patch(fc='#FFD700', ec='#FF8C00', label=f'U. Pasillo: {corridors}'))
         
         if total_base > 0:
             units_per_building = total_base * 4
@@ -316,6 +2919,52 @@ class Application(tk.Tk):
         self.toolbar = NavigationToolbar2Tk(self.canvas, self.plot_frame); self.toolbar.update()
         self.toolbar.pack(side=tk.BOTTOM, fill=tk.X)
 
-if __name__ == "__main__":
+def _positive_int(text):
+    # Tipo de argparse para --workers: error de uso claro en lugar del ValueError del pool
+    try: value = int(text)
+    except ValueError: raise argparse.ArgumentTypeError(f"se esperaba un entero, no {text!r}")
+    if value < 1: raise argparse.ArgumentTypeError(f"debe ser >= 1 (recibido {value})")
+    return value
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Distribución de Unidades en Terreno")
+    arg_parser.add_argument('--bench-parse', action='store_true', help="Mide el tiempo de lectura KML frente al tamaño del archivo")
+    arg_parser.add_argument('--cache-stats', action='store_true', help="Muestra aciertos y uso de disco de la caché de parcelas")
+    arg_parser.add_argument('--cache-clear', action='store_true', help="Vacía la caché de parcelas")
+    arg_parser.add_argument('--cache-dir', default=None, help="Directorio de la caché (por defecto ~/.cache/viviendas_kml)")
+    arg_parser.add_argument('--ingest', metavar='CARPETA', help="Carga en paralelo todos los KML/KMZ de una carpeta")
+    arg_parser.add_argument('--workers', type=_positive_int, default=None, help="Procesos para --ingest (por defecto, uno por núcleo)")
+    arg_parser.add_argument('--chunksize', type=int, default=8, help="Archivos por tarea enviada a cada proceso en --ingest")
+    arg_parser.add_argument('--validate', action='store_true', help="Con --ingest, valida y repara las parcelas y las agrupa por problema")
+    arg_parser.add_argument('--check-counts', type=int, metavar='N', default=None, help="Compara el conteo sin unidades con los generadores en N combinaciones aleatorias por tipo")
+    args = arg_parser.parse_args(argv)
+    if args.ingest:
+        t0 = time.perf_counter(); catalog, errors = ingest_folder(args.ingest, args.workers, args.chunksize, validate=args.validate)
+        print(f"{len(catalog)} parcelas cargadas en {time.perf_counter() - t0:.2f} s; {len(errors)} archivos con error")
+        for path, error in errors.items(): print(f"  {path}: {error}")
+        if args.validate:
+            for issue, ids in sorted(triage_parcels(catalog).items(), key=lambda item: item[0] != 'ok'):
+                print(f"{issue:>20}: {len(ids)}" + (f"  ({', '.join(ids[:5])}{', ...' if len(ids) > 5 else ''})" if issue != 'ok' else ""))
+        return
+    if args.cache_stats or args.cache_clear:
+        cache = ParseCache(args.cache_dir)
+        if args.cache_clear: cache.clear(); print(f"Caché vaciada: {cache.cache_dir}")
+        if args.cache_stats:
+            st = cache.stats()
+            print(f"Caché: {cache.cache_dir}\nEntradas: {st['entries']}  Uso: {st['bytes'] / 2**20:.2f} / {st['max_bytes'] / 2**20:.0f} MB")
+            print(f"Aciertos: {st['hits']}  Fallos: {st['misses']}  Tasa de acierto: {st['hit_rate']:.1%}")
+        return
+    if args.check_counts:
+        result = verify_count_units(args.check_counts)
+        print(f"{result['checked']} combinaciones comprobadas, {len(result['mismatches'])} distintas; conteo: {result['per_second']:,.0f} combinaciones/s")
+        for mismatch in result['mismatches'][:10]: print(f"  {mismatch}")
+        return
+    if args.bench_parse:
+        print(f"{'Vértices':>10} {'Tamaño (MB)':>12} {'Tiempo (ms)':>12} {'MB/s':>8}")
+        for row in benchmark_kml_parse(): print(f"{row['vertices']:>10} {row['bytes'] / 1e6:>12.2f} {row['seconds'] * 1e3:>12.2f} {row['mb_per_s']:>8.1f}")
+        return
     app = Application()
-    app.mainloop()
\ No newline at end of file
+    app.mainloop()
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
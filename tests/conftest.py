@@ -0,0 +1,27 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import Proyecto_Viviendas as P  # noqa: E402
+
+L_LOT = [(0, 0), (120, 0), (120, 60), (60, 60), (60, 90), (0, 90)]
+
+
+def kml_text(*rings):
+    placemarks = ''.join('<Placemark><Polygon><outerBoundaryIs><LinearRing><coordinates>' + ' '.join(f'{x},{y}' for x, y in list(ring) + [ring[0]]) +
+                         '</coordinates></LinearRing></outerBoundaryIs></Polygon></Placemark>' for ring in rings)
+    return f'<kml xmlns="http://www.opengis.net/kml/2.2"><Document>{placemarks}</Document></kml>'
+
+
+@pytest.fixture
+def load_lot(tmp_path):
+    # Procesador con un lote cargado desde un KML real (coordenadas en metros)
+    def load(ring=L_LOT, **options):
+        path = tmp_path / "lot.kml"; path.write_text(kml_text(ring))
+        processor = P.KMLProcessor(**options)
+        success, message = processor.load_kml(str(path))
+        assert success, message
+        return processor
+    return load
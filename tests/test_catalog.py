@@ -0,0 +1,88 @@
+import io
+import zipfile
+
+import numpy as np
+import pytest
+
+import Proyecto_Viviendas as P
+
+
+def polygon(x, y, width, height):
+    ring = [(x, y), (x + width, y), (x + width, y + height), (x, y + height), (x, y)]
+    return ('<Polygon><outerBoundaryIs><LinearRing><coordinates>' + ' '.join(f'{a},{b},0' for a, b in ring) +
+            '</coordinates></LinearRing></outerBoundaryIs></Polygon>')
+
+
+# A repetido, una MultiGeometry con dos polígonos y un Placemark sin id ni nombre
+CATALOG = ('<kml xmlns="http://www.opengis.net/kml/2.2"><Document>'
+           f'<Placemark id="A"><name>Uno</name>{polygon(0, 0, 40, 30)}</Placemark>'
+           f'<Placemark id="A"><name>Dos</name>{polygon(100, 0, 20, 20)}</Placemark>'
+           f'<Folder><Placemark id="M"><name>Multi</name><MultiGeometry>{polygon(0, 100, 10, 10)}{polygon(50, 100, 30, 10)}</MultiGeometry></Placemark></Folder>'
+           f'<Placemark>{polygon(-60, -40, 60, 40)}</Placemark>'
+           '</Document></kml>').encode('utf-8')
+
+
+def test_catalog_loads_every_placemark_and_multigeometry_part():
+    catalog = P.ParcelCatalog.from_kml(io.BytesIO(CATALOG))
+    assert catalog.ids() == ['A', 'A~1', 'M#0', 'M#1', 'P3'] and len(catalog) == 5
+    assert [(p['name'], p['part']) for p in catalog] == [('Uno', 0), ('Dos', 0), ('Multi', 0), ('Multi', 1), (None, 0)]
+    assert catalog['A~1']['id'] == 'A~1' and catalog['A~1']['bounding_box']['min_x'] == 100
+    assert 'M#1' in catalog and 'M' not in catalog and 'B' not in catalog
+    assert catalog['M#1']['coords'][:, :2].tolist()[:2] == [[50, 100], [80, 100]]
+    assert np.array_equal(catalog.bounding_boxes(), [[0, 0, 40, 30], [100, 0, 120, 20], [0, 100, 10, 110], [50, 100, 80, 110], [-60, -40, 0, 0]])
+    assert [[p['id'] for p in batch] for batch in catalog.batches(2)] == [['A', 'A~1'], ['M#0', 'M#1'], ['P3']]
+
+
+def test_adding_keeps_the_bounding_box_array_in_step():
+    catalog = P.ParcelCatalog.from_kml(io.BytesIO(CATALOG))
+    assert catalog.bounding_boxes().shape == (5, 4)
+    extra = next(P.iter_kml_parcels(io.BytesIO(CATALOG)))
+    assert catalog.add(extra) == 'A~2' and extra['id'] == 'A'  # el original no se toca
+    assert catalog.bounding_boxes().shape == (6, 4) and catalog.bounding_boxes()[-1].tolist() == [0, 0, 40, 30]
+
+
+def test_processor_switches_parcels_without_reopening(tmp_path):
+    path = tmp_path / "catalog.kml"; path.write_bytes(CATALOG)
+    processor = P.KMLProcessor(projection=None)
+    assert processor.load_catalog(str(path))[0] and processor.parcel_id == 'A'
+    path.unlink()
+    success, message = processor.select_parcel('M#1')
+    assert success, message
+    assert (processor.bounding_box['width'], processor.bounding_box['height']) == (30, 10)
+    assert not processor.select_parcel('missing')[0]
+
+
+def write_kmz(path, members):
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, data in members.items(): archive.writestr(name, data)
+    return str(path)
+
+
+def test_kmz_prefers_doc_kml_and_streams_it(tmp_path):
+    other = CATALOG.replace(b'id="A"', b'id="Z"')
+    path = write_kmz(tmp_path / "catalog.kmz", {'files/other.kml': other, 'doc.kml': CATALOG, 'files/image.png': b'\x89PNG'})
+    with P.open_kml_source(path) as f: assert not isinstance(f, io.BufferedReader) and f.read(5) == b'<kml '
+    assert P.load_parcel_catalog(path).ids() == ['A', 'A~1', 'M#0', 'M#1', 'P3']
+    # Sin doc.kml vale el primer .kml del archivo
+    assert P.load_parcel_catalog(write_kmz(tmp_path / "nested.kmz", {'files/other.kml': other})).ids()[0] == 'Z'
+
+
+def test_kmz_without_a_document_is_rejected(tmp_path):
+    path = write_kmz(tmp_path / "empty.kmz", {'image.png': b'\x89PNG'})
+    with pytest.raises(ValueError, match="no contiene"):
+        with P.open_kml_source(path): pass
+    processor = P.KMLProcessor(projection=None)
+    success, _ = processor.load_kml(path)
+    assert not success
+
+
+def test_processor_opens_a_kmz_like_the_plain_kml(tmp_path):
+    plain, packed = tmp_path / "lot.kml", write_kmz(tmp_path / "lot.kmz", {'doc.kml': CATALOG})
+    plain.write_bytes(CATALOG)
+    loaded = []
+    for path in (str(plain), packed):
+        processor = P.KMLProcessor(projection=None)
+        success, message = processor.load_kml(path)
+        assert success, message
+        loaded.append(processor.parcel['coords'].tolist())
+    assert loaded[0] == loaded[1]
@@ -0,0 +1,18 @@
+import pytest
+
+import Proyecto_Viviendas as P
+
+
+@pytest.mark.parametrize("value", ["0", "-2", "dos"])
+def test_ingest_rejects_invalid_workers(tmp_path, capsys, value):
+    with pytest.raises(SystemExit) as exit_info: P.main(["--ingest", str(tmp_path), "--workers", value])
+    assert exit_info.value.code == 2 and "--workers" in capsys.readouterr().err
+
+
+def test_ingest_folder_rejects_zero_workers(tmp_path):
+    with pytest.raises(ValueError, match="workers"): P.ingest_folder(str(tmp_path), workers=0)
+
+
+def test_ingest_accepts_one_worker(tmp_path, capsys):
+    P.main(["--ingest", str(tmp_path), "--workers", "1"])
+    assert "0 parcelas cargadas" in capsys.readouterr().out
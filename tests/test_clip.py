@@ -0,0 +1,37 @@
+import tracemalloc
+
+import numpy as np
+
+import Proyecto_Viviendas as P
+
+
+def test_clipped_counts_use_unit_kinds(load_lot):
+    processor = load_lot()
+    params = P.LayoutParams(5, 6, 10, 4, 10)
+    unclipped = processor.compute_layout(params._replace(clip_mode=None))
+    layout = processor.compute_layout(params)
+    assert set(layout.clipped_units) == set(P.UNIT_KINDS) and sum(layout.clipped_units.values()) > 0
+    for kind in P.UNIT_KINDS:
+        assert unclipped.units.count(kind) == layout.units.count(kind) + layout.clipped_units[kind]
+    assert processor.calculate_inner_area(5)[0] and processor.calculate_units(6, 10, 4, 10)[0]
+    assert processor.unit_counts == {kind: layout.units.count(kind) for kind in P.UNIT_KINDS}
+
+
+def test_kept_units_lie_inside_the_setback(load_lot):
+    layout = load_lot().compute_layout(P.LayoutParams(5, 6, 10, 4, 10))
+    assert layout.base_units > 0 and P.units_in_polygon(layout.units, layout.inner_polygons).all()
+
+
+def test_large_ring_clips_in_bounded_memory():
+    # Elipse de 20 000 aristas: la decisión tiene que coincidir con la de las esquinas contra la elipse exacta
+    t = np.linspace(0, 2 * np.pi, 20_000, endpoint=False); ring = np.column_stack((300 * np.cos(t), 180 * np.sin(t)))
+    rng = np.random.default_rng(1)
+    rects = np.column_stack((rng.uniform(-320, 300, 20_000), rng.uniform(-200, 180, 20_000), rng.uniform(0.5, 30, 20_000), rng.uniform(0.5, 30, 20_000)))
+    tracemalloc.start()
+    try: keep = P.rectangles_in_polygon(rects, ring); peak = tracemalloc.get_traced_memory()[1]
+    finally: tracemalloc.stop()
+    assert peak < 100e6
+    corners = np.stack([rects[:, :2] + rects[:, 2:] * offset for offset in ((0, 0), (1, 0), (1, 1), (0, 1))], axis=1)
+    level = ((corners[..., 0] / 300) ** 2 + (corners[..., 1] / 180) ** 2).max(axis=1)
+    clear = np.abs(level - 1) > 1e-4
+    assert clear.sum() > 19_000 and np.array_equal(keep[clear], level[clear] < 1)
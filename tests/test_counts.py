@@ -0,0 +1,38 @@
+import pytest
+
+import Proyecto_Viviendas as P
+
+RECTANGLE_LOT = [(0, 0), (100, 0), (100, 60), (0, 60)]
+
+
+def test_count_units_matches_the_generators():
+    report = P.verify_count_units(samples=1500, seed=1)
+    assert report['checked'] == 1500 * len(P.LAYOUT_TYPES) * 2 and report['mismatches'] == []
+
+
+def counted(processor, layout, source, monkeypatch=None):
+    assert processor.calculate_inner_area(5, source=source)[0]
+    if monkeypatch is not None:
+        monkeypatch.setattr(P, 'place_units', lambda *args, **kwargs: pytest.fail("count_only generó las unidades"))
+    assert processor.calculate_units(*layout, count_only=True)[0]
+    if monkeypatch is not None: monkeypatch.undo()
+    return dict(processor.unit_counts)
+
+
+@pytest.mark.parametrize("layout_type", P.LAYOUT_TYPES)
+@pytest.mark.parametrize("lot, source", [({'ring': RECTANGLE_LOT}, 'bbox'), ({}, 'rectangle')])
+def test_count_only_takes_the_closed_form_when_nothing_can_be_clipped(load_lot, monkeypatch, lot, source, layout_type):
+    # Lote rectangular (el retranqueo llena su caja) y lote en L con el rectángulo inscrito
+    processor = load_lot(**lot)
+    layout = (6, 10, 4, 10, layout_type)
+    counts = counted(processor, layout, source, monkeypatch)
+    full = processor.compute_layout(P.LayoutParams(5, *layout, source=source))
+    assert counts == {kind: full.units.count(kind) for kind in P.UNIT_KINDS} and sum(full.clipped_units.values()) == 0
+    assert processor.clipped_units == {kind: 0 for kind in P.UNIT_KINDS}
+
+
+def test_count_only_counts_generated_units_when_clipping_removes_some(load_lot):
+    processor = load_lot()
+    counts = counted(processor, (6, 10, 4, 10), 'bbox')
+    full = processor.compute_layout(P.LayoutParams(5, 6, 10, 4, 10))
+    assert sum(full.clipped_units.values()) > 0 and counts == {kind: full.units.count(kind) for kind in P.UNIT_KINDS}
@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+import Proyecto_Viviendas as P
+
+# 64.005 - 4.005 == 59.99999999999999: en metros floor(59.99999999999999 / 6) pierde la décima unidad de 6 m
+LOT = [(4.005, 0.0), (64.005, 0.0), (64.005, 20.0), (4.005, 20.0)]
+BOX = {'min_x': 4.005, 'max_x': 64.005, 'min_y': 0.0, 'max_y': 20.0, 'width': 64.005 - 4.005, 'height': 20.0}
+LAYOUT = (6, 6, 4, 0, "forma_rectangular")
+
+
+def base_units(units): return units.count('outer_base') + units.count('inner_base')
+
+
+def test_sixty_metres_hold_ten_six_metre_units_in_millimetres():
+    assert BOX['width'] < 60 and base_units(P.layout_units(BOX, *LAYOUT)['units']) == 9
+    result = P.layout_units(BOX, *LAYOUT, fixed_point=True)
+    assert base_units(result['units']) == 10
+    fixed = result['fixed_units']
+    assert fixed.x.dtype == np.int32 and fixed.view('outer_base').x.tolist() == list(range(4005, 64005, 6000))
+    assert result['units'].view('outer_base').x.tolist() == [x / 1000 for x in range(4005, 64005, 6000)]
+    counts = P.count_units(BOX, *LAYOUT, fixed_point=True)
+    assert counts['outer_base'] + counts['inner_base'] == 10
+
+
+def test_processor_counts_ten_units_in_fixed_point(load_lot):
+    processor = load_lot(LOT)
+    processor.fixed_point = True
+    assert processor.calculate_inner_area(0)[0]
+    for count_only in (False, True):
+        assert processor.calculate_units(*LAYOUT, count_only=count_only)[0]
+        assert processor.unit_counts['outer_base'] == 10
+
+
+@pytest.mark.parametrize("layout_type", P.LAYOUT_TYPES)
+def test_utm_coordinates_widen_to_int64(layout_type):
+    box = dict(BOX, min_x=500000.3, max_x=500060.3, min_y=4470000.9, max_y=4470020.9)
+    fixed = P.layout_units(box, 6, 6, 4, 5, layout_type, fixed_point=True)['fixed_units']
+    assert fixed.x.dtype == np.int64 and fixed.x.min() >= 500000300 and fixed.y.min() >= 4470000900
@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+import Proyecto_Viviendas as P
+
+L_LOT = [(0, 0), (120, 0), (120, 60), (60, 60), (60, 90), (0, 90)]
+
+
+def test_l_shape_gives_the_known_rectangle():
+    # Candidatos: el brazo de 120 × 60 (7200 m²) y el de 60 × 90 (5400 m²)
+    box = P.largest_inscribed_rectangle([np.array(L_LOT, dtype=np.float64)])
+    assert box == {'min_x': 0.0, 'max_x': 120.0, 'min_y': 0.0, 'max_y': 60.0, 'width': 120.0, 'height': 60.0}
+
+
+def test_orientations_return_corners_in_the_original_frame():
+    results = P.inscribed_rectangles_by_angle(np.array(L_LOT, dtype=np.float64), [45.0, 90.0, 0.0])
+    assert [angle for angle, _, _ in results][:2] in ([0.0, 90.0], [90.0, 0.0])
+    for angle, box, corners in results[:2]:
+        assert box['width'] * box['height'] == pytest.approx(7200)
+        assert sorted(map(tuple, corners.round(9) + 0.0)) == [(0, 0), (0, 60), (120, 0), (120, 60)]
+    assert results[2][1]['width'] * results[2][1]['height'] < 7200
+
+
+def test_dense_ellipse_stays_inside_and_close_to_the_optimum():
+    # El mayor rectángulo inscrito en una elipse de semiejes a, b mide 2a·b; la rejilla pierde como mucho una celda
+    t = np.linspace(0, 2 * np.pi, 3000, endpoint=False)
+    ellipse = np.column_stack((80 * np.cos(t), 45 * np.sin(t)))
+    box = P.largest_inscribed_rectangle([ellipse])
+    assert 0.97 * 2 * 80 * 45 <= box['width'] * box['height'] <= 2 * 80 * 45
+    assert P.rectangles_in_polygon([[box['min_x'], box['min_y'], box['width'], box['height']]], [ellipse]).all()
+
+
+def test_processor_rectangle_source_keeps_every_unit_inside(load_lot):
+    processor = load_lot()
+    assert processor.calculate_inner_area(5, source='rectangle')[0]
+    area = processor.inner_area
+    assert (area['min_x'], area['max_x'], area['min_y'], area['max_y']) == pytest.approx((5, 115, 5, 55))
+    assert processor.calculate_units(6, 10, 4, 10)[0]
+    assert sum(processor.clipped_units.values()) == 0 and len(processor.units) > 0
@@ -0,0 +1,94 @@
+import time
+
+import numpy as np
+import pytest
+
+import Proyecto_Viviendas as P
+
+
+def noisy_rectangle(n=2000, width=100.0, height=60.0, noise=0.02, seed=0):
+    rng = np.random.default_rng(seed); side = n // 4; t = np.linspace(0, 1, side, endpoint=False)
+    return np.concatenate([np.column_stack((t * width, rng.uniform(-noise, noise, side))),
+                           np.column_stack((width + rng.uniform(-noise, noise, side), t * height)),
+                           np.column_stack((width - t * width, height + rng.uniform(-noise, noise, side))),
+                           np.column_stack((rng.uniform(-noise, noise, side), height - t * height))])
+
+
+def ellipse(n=2000, a=250.0, b=125.0):
+    t = np.linspace(0, 2 * np.pi, n, endpoint=False)
+    return np.column_stack((a * np.cos(t), b * np.sin(t)))
+
+
+def min_distance(points, ring, chunk=500):
+    ring = P.clean_ring(ring); ends = np.roll(ring, -1, axis=0)
+    return min(P.point_segment_distances(points[i:i + chunk], ring, ends).min() for i in range(0, len(points), chunk))
+
+
+def assert_valid_inset(rings, ring, d):
+    assert rings
+    for inner in rings:
+        assert P.signed_area(inner) > 0
+        assert min_distance(inner, ring) >= d - 1e-6
+        assert (P.winding_number(inner, P.clean_ring(ring)) != 0).all()
+
+
+@pytest.mark.parametrize("d, area", [(1, 98 * 58), (10, 80 * 40), (25, 50 * 10)])
+def test_dense_noisy_rectangle(d, area):
+    ring = noisy_rectangle()
+    rings = P.inset_polygon(ring, d)
+    assert len(rings) == 1
+    assert_valid_inset(rings, ring, d)
+    assert P.signed_area(rings[0]) == pytest.approx(area, rel=0.01)
+
+
+def test_dense_noisy_rectangle_thinner_than_setback_is_empty():
+    assert P.inset_polygon(noisy_rectangle(), 50) == []
+
+
+@pytest.mark.parametrize("d, variant", [(1, "ccw"), (10, "ccw"), (50, "ccw"), (10, "cw"), (10, "closed")])
+def test_dense_ellipse(d, variant):
+    ring = {'ccw': ellipse(), 'cw': ellipse()[::-1], 'closed': np.vstack((ellipse(), ellipse()[:1]))}[variant]
+    rings = P.inset_polygon(ring, d)
+    assert len(rings) == 1
+    assert_valid_inset(rings, ring, d)
+    # Cuerpo paralelo interior de un convexo (d menor que el menor radio de curvatura, 62.5)
+    clean = P.clean_ring(ring); perimeter = np.hypot(*(np.roll(clean, -1, axis=0) - clean).T).sum()
+    assert P.signed_area(rings[0]) == pytest.approx(P.signed_area(clean) - perimeter * d + np.pi * d * d, rel=1e-3)
+
+
+def test_narrow_neck_splits_without_degenerate_rings():
+    dumbbell = np.array([[0, 0], [40, 0], [40, 18], [60, 18], [60, 0], [100, 0], [100, 40], [60, 40], [60, 22], [40, 22], [40, 40], [0, 40]], float)
+    rings = P.inset_polygon(dumbbell, 5)
+    assert len(rings) == 2
+    assert_valid_inset(rings, dumbbell, 5)
+    assert sorted(P.signed_area(r) for r in rings) == pytest.approx([30 * 30, 30 * 30])
+
+
+def test_inner_corner_keeps_its_miter():
+    lot = np.array([[0, 0], [120, 0], [120, 60], [60, 60], [60, 90], [0, 90]], float)
+    rings = P.inset_polygon(lot, 5)
+    assert len(rings) == 1 and P.is_rectilinear(rings[0])
+    assert P.signed_area(rings[0]) == pytest.approx(110 * 50 + 50 * 30)
+
+
+def test_per_edge_distances_stay_out_of_every_strip():
+    lot = np.array([[0, 0], [80, 0], [80, 30], [50, 30], [50, 60], [0, 60]], float)
+    d = np.array([12.0, 3.0, 8.0, 3.0, 15.0, 3.0])
+    rings = P.inset_polygon(lot, d)
+    assert_valid_inset(rings, lot, d.min())
+    rng = np.random.default_rng(0); ring = rings[0]
+    points = rng.uniform(ring.min(axis=0), ring.max(axis=0), (5000, 2)); points = points[P.winding_number(points, ring) != 0]
+    starts, ends = lot, np.roll(lot, -1, axis=0); edge = ends - starts; length = np.hypot(*edge.T)
+    rel = points[:, None] - starts[None]
+    along = (rel * edge).sum(axis=2) / length ** 2; height = (rel[..., 1] * edge[:, 0] - rel[..., 0] * edge[:, 1]) / length
+    assert not ((along > 0) & (along < 1) & (height < d - 1e-9)).any()
+
+
+@pytest.mark.parametrize("ring, d, area", [(noisy_rectangle(8000), 1, 98 * 58), (ellipse(20000), 25, None)])
+def test_large_rings_inset_in_seconds(ring, d, area):
+    # Tamaños de levantamiento reales: el coste sigue a los vecinos de cada arista, no al cuadrado de los vértices
+    start = time.perf_counter(); rings = P.inset_polygon(ring, d); elapsed = time.perf_counter() - start
+    assert len(rings) == 1 and elapsed < 5.0
+    if area is None:
+        perimeter = np.hypot(*(np.roll(ring, -1, axis=0) - ring).T).sum(); area = P.signed_area(ring) - perimeter * d + np.pi * d * d
+    assert P.signed_area(rings[0]) == pytest.approx(area, rel=0.01)
@@ -0,0 +1,17 @@
+import pickle
+
+import pytest
+
+import Proyecto_Viviendas as P
+
+
+def test_layout_is_immutable_including_terrain(load_lot):
+    processor = load_lot()
+    terrain = dict(processor.original_bounding_box, width=100.0, max_x=100.0)
+    layout = processor.compute_layout(P.LayoutParams(5, 6, 10, 4, 10, terrain=terrain))
+    terrain['width'] = 1.0
+    assert layout.params.terrain['width'] == 100.0
+    for mapping in (layout.params.terrain, layout.terrain, layout.inner_area):
+        with pytest.raises(TypeError): mapping['width'] = 0
+    with pytest.raises(ValueError): layout.units.x[0] = 0
+    assert pickle.loads(pickle.dumps(layout)) == layout
@@ -0,0 +1,72 @@
+import pytest
+
+import Proyecto_Viviendas as P
+
+RECTANGLE_LOT = [(0, 0), (100, 0), (100, 60), (0, 60)]
+
+
+def box(min_x, min_y, width, height):
+    return {'min_x': min_x, 'min_y': min_y, 'max_x': min_x + width, 'max_y': min_y + height, 'width': width, 'height': height}
+
+
+@pytest.mark.parametrize("layout_type", P.LAYOUT_TYPES)
+def test_fixed_point_hits_are_identical_to_uncached_layouts(layout_type):
+    cache = P.LayoutCache()
+    for origin in ((0.0, 0.0), (12.5, 7.25), (500000.5, 4470000.75), (-81.25, 33.5)):
+        area = box(*origin, 160.0, 90.0)
+        cached = P.layout_units(area, 6, 10, 4, 10, layout_type, True, cache)
+        plain = P.layout_units(area, 6, 10, 4, 10, layout_type, True)
+        assert cached['fixed_units'] == plain['fixed_units'] and cached['units'] == plain['units']
+        assert cached['central_area'] == plain['central_area']
+    assert cache.stats()['misses'] == 1 and cache.stats()['hits'] == 3
+
+
+def test_metre_hits_stay_within_a_quantum_of_the_uncached_layout():
+    cache = P.LayoutCache(quantum=1e-3)
+    for origin in ((0.0, 0.0), (3.7, 1.2), (500000.3, 4470000.9)):
+        area = box(*origin, 160.0, 90.0)
+        cached, plain = P.layout_units(area, 6, 10, 4, 10, cache=cache)['units'], P.layout_units(area, 6, 10, 4, 10)['units']
+        assert [cached.count(kind) for kind in P.UNIT_KINDS] == [plain.count(kind) for kind in P.UNIT_KINDS]
+        assert abs(cached.rects() - plain.rects()).max() <= 1e-3
+        extent = cached.extent()
+        assert extent['min_x'] >= area['min_x'] - 1e-9 and extent['max_x'] <= area['max_x'] + 1e-6
+    assert cache.stats()['hits'] == 2
+
+
+@pytest.mark.parametrize("layout_type", P.LAYOUT_TYPES)
+@pytest.mark.parametrize("width, height", [(39.8, 122.048), (62.3, 41.7), (132.2, 54.0), (87.9, 101.3)])
+def test_metre_boxes_off_the_quantum_grid_never_gain_units_or_leave_the_box(layout_type, width, height):
+    # 39800 * 1e-3 == 39.800000000000004: la caja local no puede pasar de la real (148 unidades en vez de 144)
+    cache = P.LayoutCache()
+    reference = P.layout_units(box(0.0, 0.0, width, height), 6, 3.3, 4, 10, layout_type)['units']
+    for origin in ((0.0, 0.0), (3.7, 1.2), (500000.3, 4470000.9)):
+        area = box(*origin, width, height)
+        cached = P.layout_units(area, 6, 3.3, 4, 10, layout_type, cache=cache)['units']
+        assert [cached.count(kind) for kind in P.UNIT_KINDS] == [reference.count(kind) for kind in P.UNIT_KINDS]
+        if origin == (0.0, 0.0): assert cached == reference
+        extent = cached.extent()
+        assert extent['min_x'] >= area['min_x'] and extent['min_y'] >= area['min_y']
+        assert extent['max_x'] <= area['max_x'] and extent['max_y'] <= area['max_y']
+    assert cache.stats()['hits'] == 2
+
+
+def test_small_budget_evicts_the_least_recently_used_entry():
+    cache = P.LayoutCache(max_bytes=1)
+    for width in (100.0, 120.0, 100.0):
+        P.layout_units(box(0.0, 0.0, width, 80.0), 6, 10, 4, 10, cache=cache)
+    stats = cache.stats()
+    assert (stats['entries'], stats['hits'], stats['misses'], stats['evictions']) == (1, 0, 3, 2)
+
+
+@pytest.mark.parametrize("fixed_point", [False, True])
+def test_processor_layouts_with_a_shared_cache_match_uncached_ones(load_lot, fixed_point):
+    cache = P.LayoutCache()
+    params = P.LayoutParams(5, 6, 10, 4, 10, fixed_point=fixed_point)
+    for lot in ({}, {'ring': RECTANGLE_LOT}, {'ring': [(x + 250.5, y - 40.25) for x, y in RECTANGLE_LOT]}):
+        processor = load_lot(**lot)
+        plain = processor.compute_layout(params)
+        processor.layout_cache = cache
+        cached = processor.compute_layout(params)
+        if fixed_point: assert cached == plain
+        else: assert cached.units.rects() == pytest.approx(plain.units.rects(), abs=1e-3) and cached.clipped_units == plain.clipped_units
+    assert cache.stats()['hits'] >= 1
@@ -0,0 +1,80 @@
+import math
+import re
+
+import numpy as np
+import pytest
+
+import Proyecto_Viviendas as P
+
+LAYOUT = (6, 10, 4, 10)
+
+
+def reported(message):
+    return int(re.search(r": (\d+) unidades base", message).group(1))
+
+
+def final_base_units(processor, source='bbox'):
+    assert processor.calculate_inner_area(5, source=source)[0]
+    assert processor.calculate_units(*LAYOUT)[0]
+    return processor.unit_counts['outer_base'] + processor.unit_counts['inner_base']
+
+
+def test_best_orientation_reports_the_clipped_count(load_lot):
+    processor = load_lot()
+    success, message = processor.best_orientation(5, *LAYOUT)
+    assert success, message
+    assert reported(message) == processor.last_sweep['base_units'] == final_base_units(processor) == 23
+
+
+@pytest.mark.parametrize("source", ["bbox", "rectangle"])
+def test_best_orientation_matches_brute_force(load_lot, source):
+    angles = [0.0, 15.0, 26.0, 45.0, 60.0, 90.0, 135.0]
+    processor = load_lot()
+    counts = {}
+    for angle in angles:
+        processor.set_orientation(True, angle); counts[angle] = final_base_units(processor, source)
+    success, message = processor.best_orientation(5, *LAYOUT, angles=angles, source=source)
+    assert success, message
+    assert processor.last_sweep['base_units'] == max(counts.values()) == final_base_units(processor, source)
+    assert counts[processor.last_sweep['angle']] == max(counts.values())
+
+
+def test_rectangle_sweep_prunes_most_angles_on_the_l_lot(load_lot):
+    # La cota de los rectángulos maximales (con escaleras) descarta los giros sin calcular su rectángulo inscrito
+    processor = load_lot()
+    success, message = processor.best_orientation(5, *LAYOUT, source='rectangle')
+    assert success, message
+    assert processor.last_sweep['base_units'] == final_base_units(processor, 'rectangle') == 24
+    assert processor.last_sweep['pruned'] > 3 * processor.last_sweep['evaluated']
+
+
+def rotated_rectangle(width, height, angle, origin=(0.0, 0.0)):
+    c, s = math.cos(math.radians(angle)), math.sin(math.radians(angle))
+    corners = [(0, 0), (width, 0), (width, height), (0, height)]
+    return np.array([(origin[0] + x * c - y * s, origin[1] + x * s + y * c) for x, y in corners])
+
+
+def test_convex_hull_and_oriented_box_recover_a_rotated_rectangle():
+    ring = rotated_rectangle(100, 60, 30, (350.0, -20.0))
+    inner = ring.mean(axis=0) + np.random.default_rng(0).uniform(-20, 20, (50, 2))
+    hull = P.convex_hull(np.concatenate((ring, inner, ring[:2])))
+    assert sorted(map(tuple, hull.round(9))) == sorted(map(tuple, ring.round(9)))
+    assert P.signed_area(hull) == pytest.approx(6000)
+    box = P.oriented_bounding_box(hull)
+    assert box['area'] == pytest.approx(6000) and sorted((box['width'], box['height'])) == pytest.approx([60, 100])
+    assert box['angle'] % 90 == pytest.approx(30)
+
+
+@pytest.mark.parametrize("source", ["bbox", "rectangle"])
+def test_orientation_sweep_finds_the_rotation_of_a_rectangle(source):
+    # forma_rectangular no es simétrica: a 30° las filas van por el lado de 100 m (8 unidades), a 120° por el de 60 (4).
+    # Con 'bbox' la caja girada es mayor y una fila diagonal puede ganar unidades al recorte: allí se exige el máximo
+    ring = rotated_rectangle(100, 60, 30, (350.0, -20.0))
+    layout = (6, 9.99, 4, 10, "forma_rectangular")
+    expected = P.count_base_units({'min_x': 0, 'min_y': 0, 'max_x': 100, 'max_y': 60, 'width': 100, 'height': 60}, *layout)
+    angles = np.arange(0.0, 180.0, 1.0)
+    sweep = P.orientation_sweep([ring], layout, angles, source)
+    assert sweep['evaluated'] + sweep['pruned'] == len(angles) and sweep['pruned'] > 0
+    exhaustive = [P._evaluate_orientation((angle, [ring], P.convex_hull(ring), source, layout, 'drop', -1))[1] for angle in angles]
+    assert sweep['base_units'] == max(exhaustive) == exhaustive[int(sweep['angle'])] and (exhaustive[30], exhaustive[120]) == (expected, 4) == (8, 4)
+    if source == "rectangle": assert (sweep['angle'], sweep['base_units']) == (30.0, 8) and exhaustive.count(8) == 1
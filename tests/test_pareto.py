@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+import Proyecto_Viviendas as P
+
+RECTANGLE_LOT = [(0, 0), (100, 0), (100, 60), (0, 60)]
+AXES = ([5.0, 6.0, 7.5], [8.0, 10.0], [3.0, 4.0], [0.0, 10.0], [3.0, 5.0])
+
+
+def brute_front(points):
+    # Índices no dominados (maximizando) por comparación de todos contra todos; de los repetidos, el primero
+    points = np.asarray(points, dtype=np.float64)
+    keep = []
+    for i, p in enumerate(points):
+        dominated = ((points >= p).all(axis=1) & (points > p).any(axis=1)).any()
+        if not dominated and not (points[:i] == p).all(axis=1).any(): keep.append(i)
+    return keep
+
+
+@pytest.mark.parametrize("columns", [2, 3])
+def test_pareto_indices_match_brute_force(columns):
+    rng = np.random.default_rng(columns)
+    for size in (0, 1, 7, 60, 400):
+        points = rng.integers(0, 12, (size, columns))  # valores pequeños: muchos empates y repetidos
+        assert P.pareto_indices(points).tolist() == brute_front(points)
+
+
+@pytest.mark.parametrize("senses", [(1, -1), (1, -1, 1)])
+def test_archive_in_batches_keeps_the_front_of_everything(senses):
+    rng = np.random.default_rng(len(senses)); points = rng.integers(0, 20, (500, len(senses))).astype(float)
+    archive = P.ParetoArchive(senses)
+    for start in range(0, len(points), 37): archive.add(points[start:start + 37], list(range(start, min(start + 37, len(points)))))
+    expected = {tuple(points[i]) for i in brute_front(points * senses)}
+    assert {values for values, _ in archive.front()} == expected and len(archive) == len(expected)
+
+
+@pytest.mark.parametrize("objectives", [('base_units', 'corridor_area'), tuple(P.PARETO_OBJECTIVES)])
+def test_pareto_search_front_matches_brute_force_and_compute_layout(load_lot, objectives):
+    processor = load_lot(RECTANGLE_LOT)
+    updates = list(processor.pareto_search(*AXES, objectives=objectives, batch=7))
+    final = updates[-1]
+    assert final.evaluated == final.total == np.prod([len(values) for values in AXES]) * len(P.LAYOUT_TYPES)
+    sweep = processor.parameter_sweep(*AXES); scores = P.sweep_objectives(sweep)
+    useful = (scores['base_units'] > 0) & sweep.exact
+    points = np.stack([scores[name][useful] for name in objectives], axis=1) * [P.PARETO_OBJECTIVES[name] for name in objectives]
+    expected = sorted(tuple((point * [P.PARETO_OBJECTIVES[name] for name in objectives]).tolist()) for point in points[brute_front(points)])
+    found = sorted(tuple(float(getattr(scenario, name)) for name in objectives) for scenario in final.front)
+    assert len(found) == len(expected) and all(a == pytest.approx(b) for a, b in zip(found, expected))
+    for scenario in final.front:
+        layout = processor.compute_layout(scenario.params())
+        assert layout.base_units == scenario.base_units
+        assert layout.units.count('corridor') * scenario.base_length * scenario.corridor_width == pytest.approx(scenario.corridor_area)
@@ -0,0 +1,83 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import Proyecto_Viviendas as P
+
+KML = ('<kml xmlns="http://www.opengis.net/kml/2.2"><Document><Placemark><Polygon><outerBoundaryIs><LinearRing>'
+       '<coordinates>0,0 30,0 30,20 0,20 0,0</coordinates></LinearRing></outerBoundaryIs></Polygon></Placemark></Document></kml>')
+
+
+def _load_many(args):
+    cache_dir, path, repeats = args
+    cache = P.ParseCache(cache_dir)
+    for _ in range(repeats): P.load_parcel_catalog(path, cache)
+
+
+def test_counters_survive_concurrent_processes(tmp_path):
+    path = tmp_path / "lot.kml"; path.write_text(KML)
+    cache_dir = str(tmp_path / "cache")
+    P.load_parcel_catalog(str(path), P.ParseCache(cache_dir))
+    with ProcessPoolExecutor(max_workers=4) as pool: list(pool.map(_load_many, [(cache_dir, str(path), 25)] * 8))
+    stats = P.ParseCache(cache_dir).stats()
+    assert stats['misses'] == 1 and stats['hits'] == 200 and stats['entries'] == 1
+
+
+def test_clear_resets_counters(tmp_path):
+    path = tmp_path / "lot.kml"; path.write_text(KML)
+    cache = P.ParseCache(str(tmp_path / "cache"))
+    P.load_parcel_catalog(str(path), cache); P.load_parcel_catalog(str(path), cache)
+    assert (cache.stats()['hits'], cache.stats()['misses']) == (1, 1)
+    cache.clear()
+    assert (cache.stats()['hits'], cache.stats()['misses'], cache.stats()['entries']) == (0, 0, 0)
+
+
+def _ingest(folder, cache_dir):
+    return P.ingest_folder(str(folder), workers=8, chunksize=1, cache=P.ParseCache(cache_dir))
+
+
+def test_identical_files_ingest_concurrently(tmp_path):
+    folder = tmp_path / "lots"; folder.mkdir()
+    for i in range(40): (folder / f"lot{i:02d}.kml").write_text(KML)
+    for run in range(3):
+        cache_dir = str(tmp_path / f"cache{run}")
+        catalog, errors = _ingest(folder, cache_dir)
+        assert errors == {} and len(catalog) == 40
+        assert [name for name in os.listdir(cache_dir) if name.endswith(('.tmp', '.tmp.npz', '.claim'))] == []
+        stats = P.ParseCache(cache_dir).stats()
+        assert stats['hits'] + stats['misses'] == 40 and stats['entries'] == 1
+
+
+def test_failed_write_is_a_miss_not_an_error(tmp_path, monkeypatch):
+    path = tmp_path / "lot.kml"; path.write_text(KML)
+    cache = P.ParseCache(str(tmp_path / "cache"))
+    def full_disk(*args, **kwargs): raise OSError(28, "No space left on device")
+    monkeypatch.setattr(P.np, "savez", full_disk)
+    assert len(P.load_parcel_catalog(str(path), cache)) == 1
+    assert os.listdir(cache.cache_dir) == []
+    assert cache.stats()['misses'] == 1 and os.listdir(cache.cache_dir) == [f"stats-{os.getpid()}.json"]
+
+
+def test_lookups_count_in_memory_until_flushed(tmp_path, monkeypatch):
+    path = tmp_path / "lot.kml"; path.write_text(KML)
+    cache = P.ParseCache(str(tmp_path / "cache"))
+    P.load_parcel_catalog(str(path), cache)
+    entries = sorted(os.listdir(cache.cache_dir))
+    # Ninguna consulta reescribe el archivo de contadores
+    def no_stats_write(*args, **kwargs): raise AssertionError("get() escribió en disco")
+    monkeypatch.setattr(P, "_write_stats", no_stats_write)
+    for _ in range(50): P.load_parcel_catalog(str(path), cache)
+    assert sorted(os.listdir(cache.cache_dir)) == entries
+    monkeypatch.undo()
+    cache.close()
+    assert sorted(os.listdir(cache.cache_dir)) == sorted(entries + [f"stats-{os.getpid()}.json"])
+    assert (cache.stats()['hits'], cache.stats()['misses']) == (50, 1)
+
+
+def test_finished_processes_fold_into_one_stats_file(tmp_path):
+    path = tmp_path / "lot.kml"; path.write_text(KML)
+    cache_dir = str(tmp_path / "cache")
+    for _ in range(3):
+        with ProcessPoolExecutor(max_workers=4) as pool: list(pool.map(_load_many, [(cache_dir, str(path), 5)] * 4))
+    stats = P.ParseCache(cache_dir).stats()
+    assert stats['hits'] + stats['misses'] == 60 and stats['misses'] >= 1
+    assert [name for name in os.listdir(cache_dir) if name.startswith('stats')] == [f"stats-{os.getpid()}.json"]
@@ -0,0 +1,102 @@
+import io
+import time
+
+import numpy as np
+import pytest
+
+import Proyecto_Viviendas as P
+
+
+def test_mixed_2d_3d_tuples_keep_every_point():
+    coords = P.parse_coordinates("0,0,0 10,0 10,10,0 0,10")
+    assert coords.tolist() == [[0, 0], [10, 0], [10, 10], [0, 10]]
+
+
+def test_malformed_tuples_are_skipped_in_mixed_input():
+    coords = P.parse_coordinates("0,0 10,0,5 bad 10,10 0,10,1 3")
+    assert coords.tolist() == [[0, 0], [10, 0], [10, 10], [0, 10]]
+
+
+def test_parse_matches_python_reference():
+    text = "1.5,2.5,0 3,4 5,6,7 x,1 8,9"
+    assert np.array_equal(P.parse_coordinates(text), np.array(P.parse_coordinates_py(text)))
+
+
+@pytest.mark.parametrize("bad", ["1,2#x", "#5,6", "3,#4"])
+def test_hash_is_not_a_comment_in_bulk_parsing(bad):
+    # np.loadtxt trata '#' como comentario por defecto: '1,2#x' saldría como (1, 2) en bloque y no en Python
+    text = f"0,0 10,0 {bad} 10,10 0,10"
+    assert P.parse_coordinates(text).tolist() == [[0, 0], [10, 0], [10, 10], [0, 10]] == [list(c) for c in P.parse_coordinates_py(text)]
+    many = ' '.join(['1,1'] * 500 + [bad] + ['2,2'] * 500)
+    assert np.array_equal(P.parse_coordinates(many), np.array(P.parse_coordinates_py(many)))
+
+
+def test_mixed_placemark_is_a_parcel(tmp_path):
+    path = tmp_path / "mixed.kml"
+    path.write_text('<kml xmlns="http://www.opengis.net/kml/2.2"><Document><Placemark><Polygon><outerBoundaryIs><LinearRing>'
+                    '<coordinates>0,0,0 10,0 10,10,0 0,10 0,0,0</coordinates></LinearRing></outerBoundaryIs></Polygon></Placemark></Document></kml>')
+    with open(path, 'rb') as f: parcels = list(P.iter_kml_parcels(f))
+    assert len(parcels) == 1 and len(parcels[0]['coords']) == 5
+
+
+def _write(tmp_path, coordinates):
+    path = tmp_path / "lot.kml"
+    path.write_text('<kml xmlns="http://www.opengis.net/kml/2.2"><Document><Placemark><Polygon><outerBoundaryIs><LinearRing>'
+                    f'<coordinates>{coordinates}</coordinates></LinearRing></outerBoundaryIs></Polygon></Placemark></Document></kml>')
+    return str(path)
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_degenerate_ring_is_rejected_by_every_loader(tmp_path, streaming):
+    success, message = P.KMLProcessor().load_kml(_write(tmp_path, "0,0 10,0 20,0 0,0"), streaming=streaming)
+    assert not success and message == "Polígono inválido (sin área, 2 picos)"
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_repaired_ring_note_is_reported_by_every_loader(tmp_path, streaming):
+    success, message = P.KMLProcessor().load_kml(_write(tmp_path, "0,0 0,10 10,10 10,0 0,0"), streaming=streaming)
+    assert success and message == "KML cargado (reparada: sentido horario)"
+
+
+def _best_time(function, text, repeats=3):
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter(); function(text); best = min(best, time.perf_counter() - start)
+    return best
+
+
+def test_single_malformed_tuple_keeps_the_bulk_path():
+    rng = np.random.default_rng(0); tuples = [f'{x:.6f},{y:.6f},0' for x, y in rng.uniform(-100, 100, (200_000, 2))]
+    tuples[1234] = 'x,1'; tuples[150_000] = 'bad'; text = ' '.join(tuples)
+    coords = P.parse_coordinates(text)
+    assert np.array_equal(coords, np.array(P.parse_coordinates_py(text))) and len(coords) == 199_998
+    # La ruta de respaldo tiene que seguir siendo más rápida que el parser en Python puro
+    assert _best_time(P.parse_coordinates, text) < _best_time(P.parse_coordinates_py, text)
+
+
+def _document(ns, placemarks):
+    xmlns = f' xmlns="{ns}"' if ns else ''
+    return f'<?xml version="1.0" encoding="UTF-8"?><kml{xmlns}><Document>{placemarks}</Document></kml>'.encode('utf-8')
+
+
+SQUARE = ('<Placemark><name>Lote</name><Polygon><outerBoundaryIs><LinearRing><coordinates>0,0,0 40,0,0 40,30,0 0,30,0 0,0,0'
+          '</coordinates></LinearRing></outerBoundaryIs></Polygon></Placemark>')
+
+
+@pytest.mark.parametrize("ns", [P.KML_NAMESPACES[0], P.KML_NAMESPACES[1], ''])
+def test_namespace_is_read_from_the_root_in_one_parse(ns):
+    root, detected = P.parse_kml_document(io.BytesIO(_document(ns, SQUARE)))
+    assert detected == ns == P.kml_namespace(root)
+    polygon, coordinates = P.find_first_polygon(root, detected)
+    assert polygon is not None and P.parse_coordinates(coordinates.text).tolist() == [[0, 0], [40, 0], [40, 30], [0, 30], [0, 0]]
+    parcels = list(P.iter_kml_parcels(io.BytesIO(_document(ns, SQUARE))))
+    assert [(p['name'], p['bounding_box']['width'], p['bounding_box']['height']) for p in parcels] == [('Lote', 40, 30)]
+
+
+@pytest.mark.parametrize("ns", [P.KML_NAMESPACES[1], ''])
+def test_processor_loads_every_namespace(tmp_path, ns):
+    path = tmp_path / "lot.kml"; path.write_bytes(_document(ns, SQUARE))
+    processor = P.KMLProcessor()
+    success, message = processor.load_kml(str(path))
+    assert success, message
+    assert processor.bounding_box['width'] == 40 and processor.bounding_box['height'] == 30
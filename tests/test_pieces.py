@@ -0,0 +1,25 @@
+import numpy as np
+import pytest
+
+import Proyecto_Viviendas as P
+
+T_LOT = [(0, 0), (150, 0), (150, 40), (100, 40), (100, 90), (50, 90), (50, 40), (0, 40)]
+
+
+@pytest.mark.parametrize("lot", [{}, {'ring': T_LOT}])
+def test_pieces_tile_the_setback_and_keep_every_unit(load_lot, lot):
+    processor = load_lot(**lot)
+    layout = processor.compute_layout(P.LayoutParams(5, 6, 10, 4, 10, source='pieces'))
+    setback = sum(P.signed_area(ring) for ring in layout.inner_polygons)
+    assert len(layout.pieces) == 2 and sum(piece['width'] * piece['height'] for piece in layout.pieces) == pytest.approx(setback)
+    assert layout.base_units > 0 and P.units_in_polygon(layout.units, layout.inner_polygons).all()
+    assert sum(layout.clipped_units.values()) == 0
+    assert set(np.unique(layout.units.building)) <= {1, 2}
+    assert processor.calculate_inner_area(5, source='pieces')[0] and processor.calculate_units(6, 10, 4, 10)[0]
+    assert processor.units == layout.units
+
+
+def test_parallel_pieces_match_the_serial_layout():
+    pieces = P.rectilinear_pieces(np.array(T_LOT, dtype=float))
+    serial = P.layout_pieces(pieces, 6, 10, 4, 10, 'forma_l')
+    assert P.layout_pieces(pieces, 6, 10, 4, 10, 'forma_l', workers=2) == serial and len(serial)
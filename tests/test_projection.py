@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+import Proyecto_Viviendas as P
+
+# Punto en el meridiano central de la zona 30 (3° O): el norte es k0 por el arco de meridiano WGS84 hasta 40°
+# (4 429 529.030 m), el valor publicado para EPSG:32630
+MERIDIAN_40N = 0.9996 * 4429529.030
+
+
+def parcel(lon, lat, size=0.001):
+    coords = np.array([(lon, lat), (lon + size, lat), (lon + size, lat + size), (lon, lat + size), (lon, lat)])
+    return {'id': f"{lon},{lat}", 'name': None, 'part': 0, 'coords': coords, 'bounding_box': P.bounding_box_of(coords), 'diagnostics': {}}
+
+
+def test_is_geographic_tells_degrees_from_metres():
+    assert P.is_geographic(parcel(-3.0, 40.0)['coords'])
+    assert not P.is_geographic(np.array([(0.0, 0.0), (120.0, 0.0), (120.0, 90.0)]))
+    assert not P.is_geographic(np.array([(-3.0, 40.0), (-1.0, 41.5)]))  # 2° no es un lote
+    assert not P.is_geographic(np.array([(-200.0, 40.0), (-199.9, 40.1)]))
+    assert not P.is_geographic(np.zeros((0, 2)))
+
+
+def test_utm_matches_the_published_meridian_value():
+    (easting, northing), = P.project_utm(np.array([[-3.0, 40.0]]), 30, False)
+    assert (easting, northing) == pytest.approx((500000.0, MERIDIAN_40N), abs=1e-3)
+    (easting, northing), = P.project_utm(np.array([[-3.0, -40.0]]), 30, True)
+    assert (easting, northing) == pytest.approx((500000.0, 10_000_000.0 - MERIDIAN_40N), abs=1e-3)
+    # Simétrica respecto al meridiano central
+    west, east = P.project_utm(np.array([[-5.5, 40.0], [-0.5, 40.0]]), 30, False)
+    assert west[0] + east[0] == pytest.approx(1_000_000.0, abs=1e-6) and west[1] == pytest.approx(east[1], abs=1e-6)
+    assert P.utm_zone(-3.0, 40.0) == (30, False) and P.utm_zone(151.2, -33.9) == (56, True)
+
+
+def test_projection_keeps_lonlat_and_is_applied_once():
+    parcels = [parcel(-3.0, 40.0), parcel(2.0, 41.0)]
+    originals = [p['coords'].copy() for p in parcels]
+    P.project_parcels(parcels)
+    assert [p['crs'] for p in parcels] == ["EPSG:32630", "EPSG:32631"]
+    for p, original in zip(parcels, originals):
+        assert np.array_equal(p['lonlat'], original) and 'diagnostics' not in p
+        assert np.array_equal(p['coords'], P.project_utm(original, *P.utm_zone(*original[0])))
+        assert p['bounding_box'] == P.bounding_box_of(p['coords'])
+    projected = [p['coords'] for p in parcels]
+    P.project_parcels(parcels)
+    assert all(p['coords'] is coords for p, coords in zip(parcels, projected))
+
+
+def test_local_projection_uses_an_origin_near_each_parcel():
+    # Dos municipios a ~6° de distancia: cada parcela se proyecta alrededor de su celda, no del centro común. En el
+    # meridiano central de su zona, UTM / k0 da las medidas reales con precisión milimétrica
+    parcels = [parcel(-3.0, 40.0), parcel(3.0, 41.5)]
+    originals = [p['coords'].copy() for p in parcels]
+    P.project_parcels(parcels, 'local')
+    assert len({p['crs'] for p in parcels}) == 2
+    for p, original in zip(parcels, originals):
+        reference = P.project_utm(original, *P.utm_zone(*original[0])) / 0.9996
+        assert np.abs(np.diff(p['coords'], axis=0) - np.diff(reference, axis=0)).max() < 0.01
+        lat0, lon0 = map(float, p['crs'].split(':')[1].split(','))
+        assert np.abs(p['coords'][0]).max() < 1000 and abs(lat0 - original[0, 1]) < P.LOCAL_CELL_DEGREES
+        # De vuelta a lon/lat con el origen del crs
+        sx, sy = P._equirectangular_scale(round(lat0, 4))
+        assert np.allclose(p['coords'] / (sx, sy) + (lon0, lat0), p['lonlat'], atol=1e-6)
+    # Una parcela sola da las mismas coordenadas que dentro del catálogo
+    alone = P.project_parcels([parcel(3.0, 41.5)], 'local')[0]
+    assert np.array_equal(alone['coords'], parcels[1]['coords']) and alone['crs'] == parcels[1]['crs']
+
+
+@pytest.mark.parametrize("projection, crs", [("utm", "EPSG:32630"), ("local", "LOCAL:40.000000,-3.000000")])
+def test_processor_projects_a_geographic_kml(load_lot, projection, crs):
+    ring = [(lon, lat) for lon, lat in parcel(-3.0, 40.0)['coords'][:-1]]
+    processor = load_lot(ring, projection=projection)
+    assert processor.crs == crs
+    assert np.allclose(processor.parcel['lonlat'][:4], ring)
+    assert 80 < processor.bounding_box['width'] < 90 and 105 < processor.bounding_box['height'] < 115
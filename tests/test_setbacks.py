@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+import Proyecto_Viviendas as P
+
+RECTANGLE = [(0, 0), (100, 0), (100, 60), (0, 60)]
+
+
+def edge_on(setbacks, y):
+    # Índice de la arista horizontal a la altura y (el anillo limpio puede empezar en otro vértice)
+    ring = setbacks.ring
+    return next(i for i in range(len(ring)) if ring[i][1] == y and ring[(i + 1) % len(ring)][1] == y)
+
+
+def test_edges_are_classified_once_and_inset_per_kind():
+    setbacks = P.ParcelSetbacks(np.array(RECTANGLE, dtype=np.float64))
+    setbacks = P.ParcelSetbacks(np.array(RECTANGLE, dtype=np.float64), frontage=edge_on(setbacks, 0))
+    front, rear = edge_on(setbacks, 0), edge_on(setbacks, 60)
+    assert setbacks.frontage == (front,) and setbacks.kinds[front] == 0 and setbacks.kinds[rear] == 2
+    assert sorted(setbacks.kinds.tolist()) == [0, 1, 1, 2]
+    rings = setbacks.inset(P.SetbackRules(10, 3, 5))
+    assert len(rings) == 1
+    box = P.bounding_box_of(rings[0])
+    assert (box['min_x'], box['max_x'], box['min_y'], box['max_y']) == pytest.approx((3, 97, 10, 55))
+    assert P.signed_area(rings[0]) == pytest.approx(94 * 45)
+    # El barrido reutiliza la clasificación: cada escenario da su caja
+    boxes = [P.bounding_box_of(rings[0]) for rings in setbacks.sweep([P.SetbackRules(0, 0, 0), (2, 4, 8), (20, 1, 30)])]
+    assert [(b['width'], b['height']) for b in boxes] == pytest.approx([(100, 60), (92, 50), (98, 10)])
+
+
+def test_rules_fall_back_to_the_general_distance():
+    assert P.SetbackRules(side=3).resolved(5) == (5.0, 3.0, 5.0)
+    assert P.SetbackRules.uniform(2) == (2, 2, 2)
+
+
+def test_processor_inner_area_uses_the_rules(load_lot):
+    processor = load_lot(RECTANGLE)
+    success, message = processor.set_frontage(edge_on(processor.setbacks, 0))
+    assert success, message
+    success, message = processor.calculate_inner_area(2, P.SetbackRules(frontage=10, rear=5))
+    assert success, message
+    area = processor.inner_area
+    assert (area['min_x'], area['max_x'], area['min_y'], area['max_y']) == pytest.approx((2, 98, 10, 55))
+    assert (area['width'], area['height']) == pytest.approx((96, 45))
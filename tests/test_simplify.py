@@ -0,0 +1,32 @@
+import time
+
+import numpy as np
+import pytest
+
+import Proyecto_Viviendas as P
+
+
+def noisy_ring(n, seed=0):
+    rng = np.random.default_rng(seed); t = np.linspace(0, 2 * np.pi, n, endpoint=False)
+    r = 200 + 5 * np.sin(7 * t) + rng.normal(0, 0.3, n)
+    return np.column_stack((r * np.cos(t), 0.6 * r * np.sin(t)))
+
+
+def max_deviation(ring, simplified, chunk=1000):
+    ends = np.roll(simplified, -1, axis=0)
+    return max(P.point_segment_distances(ring[i:i + chunk], simplified, ends).min(axis=1).max() for i in range(0, len(ring), chunk))
+
+
+@pytest.mark.parametrize("method", ["douglas-peucker", "visvalingam"])
+def test_simplified_ring_stays_within_tolerance(method):
+    ring = P.clean_ring(noisy_ring(5000))
+    simplified = P.simplify_ring(ring, 0.5, method)
+    assert 3 <= len(simplified) < len(ring) / 2
+    assert max_deviation(ring, simplified) <= 0.5 + 1e-9
+    assert not len(P.segment_intersections(simplified, np.roll(simplified, -1, axis=0))[0])
+
+
+def test_visvalingam_scales_to_large_gps_rings():
+    ring = noisy_ring(100_000)
+    start = time.perf_counter(); simplified = P.simplify_ring(ring, 0.5, 'visvalingam'); elapsed = time.perf_counter() - start
+    assert len(simplified) < len(ring) / 4 and elapsed < 5.0
@@ -0,0 +1,28 @@
+import itertools
+
+import numpy as np
+import pytest
+
+import Proyecto_Viviendas as P
+
+RECTANGLE_LOT = [(0, 0), (100, 0), (100, 60), (0, 60)]
+AXES = ([5.0, 6.0], [8.0, 10.0], [3.0, 4.0], [0.0, 10.0], [3.0, 5.0, 40.0])
+
+
+@pytest.mark.parametrize("lot, source, fixed_point, clipped", [({}, 'bbox', False, True), ({}, 'rectangle', True, False), ({'ring': RECTANGLE_LOT}, 'bbox', False, False)])
+def test_sweep_counts_match_compute_layout(load_lot, lot, source, fixed_point, clipped):
+    # Donde el barrido dice que es exacto, el conteo es el de compute_layout; donde no, una cota superior (en el
+    # lote en L con la caja del retranqueo, el recorte quita unidades en todas las combinaciones)
+    processor = load_lot(**lot); processor.fixed_point = fixed_point
+    sweep = processor.parameter_sweep(*AXES, source=source)
+    assert sweep.shape == tuple(len(values) for values in AXES) + (len(P.LAYOUT_TYPES),)
+    exact = bound = 0
+    for index in itertools.product(*(range(size) for size in sweep.shape)):
+        labels = [values[i] for (_, values), i in zip(sweep.axes, index)]
+        bw, bl, cw, stair, offset, layout_type = (value.item() if isinstance(value, np.generic) else value for value in labels)
+        try: layout = processor.compute_layout(P.LayoutParams(offset, bw, bl, cw, stair, layout_type, source=source, fixed_point=fixed_point))
+        except ValueError: assert sweep.base_units[index] == 0 and sweep.inner_areas[index[4]] is None; continue
+        counts = [layout.units.count(kind) for kind in P.UNIT_KINDS]
+        if sweep.exact[index]: exact += 1; assert sweep.counts[index].tolist() == counts, labels
+        else: bound += sweep.counts[index].tolist() != counts; assert (sweep.counts[index] >= counts).all(), labels
+    assert (exact, bool(bound)) == (0, True) if clipped else exact > 0
@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+import Proyecto_Viviendas as P
+
+
+def test_columns_group_units_by_kind():
+    table = P.UnitTable([0, 1, 2, 3], [0, 0, 0, 0], [1, 1, 2, 2], [1, 1, 1, 1], [3, 0, 2, 0], tag=[0, -1, -1, -1])
+    assert table.kind.tolist() == [0, 0, 2, 3] and table.x.tolist() == [1, 3, 2, 0]
+    assert [table.count(kind) for kind in P.UNIT_KINDS] == [2, 0, 1, 1]
+    assert table.records('stair') == [{'x': 0, 'y': 0, 'width': 1, 'height': 1, 'id': P.UNIT_TAGS[0]}]
+    assert np.shares_memory(table.view('outer_base').x, table.x)
+    kept = table.take(table.x > 1)
+    assert kept.x.tolist() == [3, 2] and [kept.count(kind) for kind in P.UNIT_KINDS] == [1, 0, 1, 0]
+    flagged = table.flagged(table.x > 1)
+    assert [unit['outside'] for unit in flagged.records()] == [False, True, True, False]
+    assert P.UnitTable.concat([table, flagged]).outside.tolist() == [False, False, False, True, False, True, False, False]
+
+
+@pytest.mark.parametrize("layout_type", P.LAYOUT_TYPES)
+def test_layout_records_match_the_columns(load_lot, layout_type):
+    layout = load_lot().compute_layout(P.LayoutParams(5, 6, 10, 4, 10, layout_type))
+    for kind, records in zip(P.UNIT_KINDS, (layout.outer_base_units, layout.inner_base_units, layout.corridor_units, layout.stair_units)):
+        view = layout.units.view(kind)
+        assert len(records) == view.count(kind) and [[r['x'], r['y'], r['width'], r['height']] for r in records] == view.rects().tolist()
+
+
+def expanded(table):
+    # La misma tabla ya expandida (sin filas), para comparar con lo que se calcula desde las filas
+    return P.UnitTable(*(getattr(table, name) for name in P.UnitTable.COLUMNS[:-1]), outside=table.outside)
+
+
+@pytest.mark.parametrize("fixed_point", [False, True])
+@pytest.mark.parametrize("layout_type", P.LAYOUT_TYPES)
+def test_span_rows_agree_with_the_expanded_units(layout_type, fixed_point):
+    box = {'min_x': 3.7, 'min_y': 1.2, 'max_x': 163.7, 'max_y': 91.2, 'width': 160.0, 'height': 90.0}
+    table = P.layout_units(box, 6, 10, 4, 10, layout_type, fixed_point)['units']
+    assert table.spans is not None and len(table.spans) < len(table)
+    counts = [table.count(kind) for kind in P.UNIT_KINDS]; areas = [table.area(kind) for kind in P.UNIT_KINDS]; extent = table.extent()
+    moved = table.translated(1.5, -2.0)
+    assert table._columns is None and moved._columns is None  # contar, medir, acotar y trasladar no expande las filas
+    flat = expanded(table)
+    assert counts == [flat.count(kind) for kind in P.UNIT_KINDS] == table.spans.kind_counts().tolist()
+    assert areas == pytest.approx([flat.area(kind) for kind in P.UNIT_KINDS]) and extent == pytest.approx(flat.extent())
+    assert moved == flat.translated(1.5, -2.0)